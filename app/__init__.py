@@ -1,5 +1,19 @@
 from flask import Flask
 from .main import routes as main_routes
+from .json_provider import FastJSONProvider
+from .compression import compress
+from .static_assets import static_assets
+from .templating import templating
+from .main.services import app_status, supabase_service
+from .main.write_behind import stage_queue
+from .main.read_cache import read_cache, analytics_cache
+from .main.archive import lead_archiver
+from .main.replicas import replica_router
+from .main.local_replica import local_replica
+from .main.jobs import job_runner
+from .main.audit import audit_writer
+from .main.rollups import rollup_store
+from .main.dedup import dedup_index
 import os
 #from .config import config_by_name
 
@@ -8,9 +22,91 @@ def create_app(config_name='default'):
     """Cria e configura uma instância da aplicação Flask."""
 
     app = Flask(__name__, instance_relative_config=True)
+    # Serializador rápido para jsonify e | tojson (precisa vir antes do jinja_env ser criado)
+    app.json = FastJSONProvider(app)
     #app.config.from_object(config_by_name[config_name])
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
 
+    # Conexão com o Supabase (o .env é carregado pelo run.py / flask CLI antes do create_app)
+    app.config['SUPABASE_URL'] = os.environ.get('SUPABASE_URL')
+    app.config['SUPABASE_KEY'] = os.environ.get('SUPABASE_KEY')
+
+    # Status da aplicação (blocklist / versão), atualizado em segundo plano
+    app.config['APP_STATUS_REFRESH_INTERVAL'] = float(os.environ.get('APP_STATUS_REFRESH_INTERVAL', 300))
+    app.config['APP_STATUS_FAIL_OPEN'] = os.environ.get('APP_STATUS_FAIL_OPEN', '1') == '1'
+
+    # Write-behind das mudanças de etapa (desligado por padrão)
+    app.config['STAGE_WRITE_BEHIND'] = os.environ.get('STAGE_WRITE_BEHIND', '0') == '1'
+    app.config['STAGE_WRITE_BEHIND_WINDOW'] = float(os.environ.get('STAGE_WRITE_BEHIND_WINDOW', 2))
+    app.config['STAGE_WRITE_BEHIND_MAX_ATTEMPTS'] = int(os.environ.get('STAGE_WRITE_BEHIND_MAX_ATTEMPTS', 5))
+
+    # Cache de leitura (stale-while-revalidate) e circuit breaker do Supabase.
+    # O cache é por processo: com vários workers, uma escrita só expira o cache
+    # do worker que a recebeu, e os demais podem mostrar o dado antigo por até
+    # READ_CACHE_TTL segundos
+    app.config['READ_CACHE_TTL'] = float(os.environ.get('READ_CACHE_TTL', 15))
+    app.config['READ_CACHE_STALE_TTL'] = float(os.environ.get('READ_CACHE_STALE_TTL', 300))
+    app.config['CIRCUIT_FAILURE_THRESHOLD'] = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+    app.config['CIRCUIT_RESET_TIMEOUT'] = float(os.environ.get('CIRCUIT_RESET_TIMEOUT', 30))
+
+    # Job de arquivamento dos leads vendidos (tabelas frias, ver sql/clientes_arquivados.sql)
+    app.config['ARCHIVE_ENABLED'] = os.environ.get('ARCHIVE_ENABLED', '0') == '1'
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    app.config['ARCHIVE_INTERVAL'] = float(os.environ.get('ARCHIVE_INTERVAL', 3600))
+
+    # Réplicas de leitura (URLs separadas por vírgula; vazio = tudo no primário)
+    app.config['SUPABASE_READ_URLS'] = os.environ.get('SUPABASE_READ_URLS', '')
+    app.config['SUPABASE_READ_KEY'] = os.environ.get('SUPABASE_READ_KEY')
+    app.config['READ_YOUR_WRITES_SECONDS'] = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 10))
+
+    # Réplica local em SQLite para o modo desktop (run.py com CRM_DESKTOP=1)
+    app.config['LOCAL_REPLICA_ENABLED'] = os.environ.get('LOCAL_REPLICA_ENABLED', '0') == '1'
+    app.config['LOCAL_REPLICA_SYNC_INTERVAL'] = float(os.environ.get('LOCAL_REPLICA_SYNC_INTERVAL', 30))
+    app.config['LOCAL_REPLICA_FULL_SYNC_INTERVAL'] = float(os.environ.get('LOCAL_REPLICA_FULL_SYNC_INTERVAL', 3600))
+
+    # Templates: cache de bytecode em disco, pré-compilação na subida e tempos no Server-Timing
+    app.config['TEMPLATE_BYTECODE_CACHE'] = os.environ.get('TEMPLATE_BYTECODE_CACHE', '1') == '1'
+    app.config['TEMPLATE_PRECOMPILE'] = os.environ.get('TEMPLATE_PRECOMPILE', '0') == '1'
+    app.config['TEMPLATE_PROFILING'] = os.environ.get('TEMPLATE_PROFILING', '1') == '1'
+
+    # Compressão das respostas (gzip/brotli) acima de COMPRESS_MIN_SIZE bytes
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+    # Auditoria assíncrona (historico_acoes / historico_posvenda), gravada em lotes
+    app.config['AUDIT_ENABLED'] = os.environ.get('AUDIT_ENABLED', '1') == '1'
+    app.config['AUDIT_QUEUE_SIZE'] = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+    app.config['AUDIT_BATCH_SIZE'] = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+    app.config['AUDIT_FLUSH_INTERVAL'] = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 2))
+    app.config['AUDIT_MAX_ATTEMPTS'] = int(os.environ.get('AUDIT_MAX_ATTEMPTS', 5))
+
+    # Cache dos relatórios de /analytics (um por janela de tempo)
+    app.config['ANALYTICS_CACHE_TTL'] = float(os.environ.get('ANALYTICS_CACHE_TTL', 600))
+    app.config['ANALYTICS_MAX_EVENTS'] = int(os.environ.get('ANALYTICS_MAX_EVENTS', 300000))
+
+    # Índice de duplicados (empresa / e-mail / telefone) usado na criação de leads
+    app.config['DEDUP_ENABLED'] = os.environ.get('DEDUP_ENABLED', '1') == '1'
+    app.config['DEDUP_REFRESH_INTERVAL'] = float(os.environ.get('DEDUP_REFRESH_INTERVAL', 600))
+
+    # Jobs em segundo plano (operações em massa, ver /api/jobs)
+    app.config['JOBS_MAX_WORKERS'] = int(os.environ.get('JOBS_MAX_WORKERS', 2))
+    app.config['JOBS_MAX_PENDING'] = int(os.environ.get('JOBS_MAX_PENDING', 20))
+
     app.register_blueprint(main_routes.main_bp)
 
+    supabase_service.init_app(app)
+    app_status.init_app(app)
+    stage_queue.init_app(app)
+    read_cache.init_app(app)
+    lead_archiver.init_app(app)
+    replica_router.init_app(app)
+    local_replica.init_app(app)
+    job_runner.init_app(app)
+    audit_writer.init_app(app)
+    analytics_cache.init_app(app)
+    rollup_store.init_app(app)
+    dedup_index.init_app(app)
+    templating.init_app(app)
+    compress.init_app(app)
+    static_assets.init_app(app)
+
     return app
@@ -0,0 +1,124 @@
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só negociamos gzip
+    brotli = None
+
+# Tipos que valem a pena comprimir (imagens e fontes já vêm comprimidas)
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'text/csv',
+    'application/javascript', 'application/json', 'application/x-ndjson',
+    'image/svg+xml',
+}
+
+
+def supported_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding(accept_encodings) -> Optional[str]:
+    """ Escolhe 'br' ou 'gzip' de acordo com o Accept-Encoding (respeitando q=0). """
+    for encoding in supported_encodings():
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+class _StreamCompressor:
+    """ Compressor incremental: cada pedaço comprimido é enviado imediatamente. """
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._obj = brotli.Compressor(quality=min(level, 11))
+        else:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = cabeçalho gzip
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self._obj.process(chunk) + self._obj.flush()
+        # SYNC_FLUSH: o navegador consegue descomprimir e pintar o que já chegou
+        return self._obj.compress(chunk) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._obj.finish()
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+def compress_bytes(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level)
+
+
+class Compress:
+    """
+    Compressão das respostas do app (gzip/brotli via Accept-Encoding).
+
+    - Respostas normais só são comprimidas acima de `min_size` bytes.
+    - Respostas em streaming (stream_template, NDJSON) são comprimidas pedaço
+      a pedaço, sem esperar o corpo inteiro.
+    - Respostas que já têm Content-Encoding (estáticos pré-comprimidos), que
+      são arquivos enviados direto do disco ou partes de um Range (206: o
+      Content-Range se refere ao corpo sem compressão) ficam como estão.
+    """
+
+    def __init__(self, min_size: int = 1024, level: int = 6):
+        self.min_size = min_size
+        self.level = level
+
+    def init_app(self, app) -> None:
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.level = app.config.get('COMPRESS_LEVEL', self.level)
+        app.extensions['compress'] = self
+        if app.config.get('COMPRESS_ENABLED', True):
+            app.after_request(self.after_request)
+
+    def _stream(self, body: Iterable, compressor: _StreamCompressor) -> Iterator[bytes]:
+        try:
+            for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.finish()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    def after_request(self, response):
+        response.vary.add('Accept-Encoding')
+
+        if (response.status_code < 200 or response.status_code >= 300
+                or response.status_code in (204, 206)
+                or 'Content-Encoding' in response.headers
+                or response.direct_passthrough
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        encoding = negotiate_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            body = response.response
+            response.response = self._stream(body, _StreamCompressor(encoding, self.level))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(compress_bytes(data, encoding, self.level))
+
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+compress = Compress()
@@ -1,22 +1,49 @@
-from flask import url_for, redirect
+from flask import url_for, redirect, request, jsonify
 from app.main.services import verify_application_version, verify_blocklist
 from functools import wraps
 
+# Rotas liberadas da verificação (os próprios destinos dos redirecionamentos)
+STATUS_EXEMPT_ENDPOINTS = ('main.blocklist', 'main.version_mismatch')
 
-def verify_application_status(f):
+
+def _deny(endpoint: str, motivo: str, status_code: int):
+    # Chamadas de API recebem o motivo em JSON; páginas vão para a tela de aviso
+    if request.path.startswith('/api/'):
+        return jsonify({'success': False, 'error': motivo}), status_code
+    return redirect(url_for(endpoint))
+
+
+def application_status_response():
     """
-    Um decorator que verifica o status da aplicação antes de executar uma rota.
-    Ele checa duas coisas, nesta ordem:
+    Checa o status da aplicação, nesta ordem:
     1. Se o usuário atual está na blocklist.
     2. Se a versão da aplicação local bate com a do banco de dados.
+    Retorna a resposta de bloqueio, ou None se a requisição pode seguir.
+    """
+    if request.endpoint in STATUS_EXEMPT_ENDPOINTS:
+        return None
+
+    bloqueado, motivo = verify_blocklist()
+    if bloqueado:
+        return _deny('main.blocklist', motivo, 403)
+
+    versao_ok, motivo = verify_application_version()
+    if not versao_ok:
+        return _deny('main.version_mismatch', motivo, 426)
+    return None
+
+
+def verify_application_status(f):
+    """
+    Um decorator que verifica o status da aplicação antes de executar uma rota
+    (ver `application_status_response`). As rotas do blueprint principal já
+    passam por essa verificação no before_request.
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if verify_blocklist()[0] == True:
-            return redirect(url_for('main.blocklist'))
-
-        if verify_application_version()[0] == False:
-            return redirect(url_for('main.version_mismatch'))
+        response = application_status_response()
+        if response is not None:
+            return response
         return f(*args, **kwargs)
 
     return decorated_function
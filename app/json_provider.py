@@ -0,0 +1,86 @@
+import json
+import re
+import typing as t
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional: sem ele usamos o json da biblioteca padrão
+    orjson = None
+
+# O que o json padrão escapa com ensure_ascii=True e o orjson deixa passar
+_NON_ASCII = re.compile('[\x7f-\U0010ffff]')
+
+
+def _escape_non_ascii(match: t.Match) -> str:
+    """ \\uXXXX em minúsculas, com par substituto acima do BMP, como o json padrão. """
+    code = ord(match.group())
+    if code > 0xFFFF:
+        code -= 0x10000
+        return '\\u{:04x}\\u{:04x}'.format(0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF))
+    return '\\u{:04x}'.format(code)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Provider JSON do app baseado em orjson, com fallback para o json padrão.
+
+    É usado tanto pelo `jsonify` quanto pelo filtro `tojson` do Jinja (o Flask
+    aponta `json.dumps_function` para `app.json.dumps`). O escape HTML do
+    `tojson` (<, >, & e ') continua sendo feito pelo Jinja sobre a string
+    gerada aqui, então a saída segue segura para embutir em <script>.
+
+    Tipos que o orjson não conhece (date, Decimal, Markup...) passam pelo
+    `default` do Flask, e datetimes continuam saindo no formato HTTP, como no
+    provider padrão. Com `ensure_ascii` (o padrão do Flask) os caracteres não
+    ASCII saem escapados como no json padrão, e a resposta fica byte a byte
+    igual à do DefaultJSONProvider.
+    """
+
+    # Argumentos de json.dumps que o orjson consegue reproduzir
+    _ORJSON_KWARGS = {'sort_keys', 'indent', 'separators', 'default', 'ensure_ascii'}
+
+    def _orjson_option(self, kwargs: t.Dict[str, t.Any]) -> t.Optional[int]:
+        """ Converte os kwargs do json.dumps em flags do orjson (None = não suportado). """
+        if set(kwargs) - self._ORJSON_KWARGS:
+            return None
+        indent = kwargs.get('indent')
+        if indent not in (None, 2):
+            return None
+        # O jsonify compacto pede separators=(",", ":"), que já é o padrão do orjson
+        if kwargs.get('separators') not in (None, (',', ':')):
+            return None
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys'):
+            option |= orjson.OPT_SORT_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj: t.Any, **kwargs: t.Any) -> str:
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+
+        if orjson is not None:
+            option = self._orjson_option(kwargs)
+            if option is not None:
+                try:
+                    texto = orjson.dumps(obj, default=kwargs['default'], option=option).decode('utf-8')
+                except TypeError:
+                    # Ex.: inteiros acima de 64 bits ou chaves de tipos mistos
+                    # com sort_keys; o json padrão trata esses casos.
+                    pass
+                else:
+                    if kwargs.get('ensure_ascii', self.ensure_ascii) and (not texto.isascii() or '\x7f' in texto):
+                        texto = _NON_ASCII.sub(_escape_non_ascii, texto)
+                    return texto
+
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s: t.Union[str, bytes], **kwargs: t.Any) -> t.Any:
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
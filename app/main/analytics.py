@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+from .queries import ARCHIVED_STAGE, get_employees_map
+from .read_cache import ANALYTICS_WINDOWS
+
+# Tamanho das páginas lidas do histórico (limite padrão de linhas do PostgREST)
+HISTORY_PAGE_SIZE: int = 1000
+# Máximo de eventos de histórico lidos por relatório (a janela encolhe para caber)
+MAX_EVENTS: int = 300_000
+
+NS_PER_HOUR = 3600 * 10 ** 9
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+EVENT_COLUMNS = ['registro_id', 'data_acao', 'etapa_antes', 'etapa_depois']
+LEAD_COLUMNS = ['id', 'created_at', 'responsavel', 'etapa']
+
+
+# --- Carga em lote (colunar) ---
+
+def _frame_from_pages(build_query: Callable[[], Any], columns: List[str],
+                      page_size: int = HISTORY_PAGE_SIZE) -> pd.DataFrame:
+    """ Lê uma consulta página a página e monta um DataFrame por página (sem dicts por linha no fim). """
+    frames = []
+    start = 0
+    while True:
+        rows = build_query().range(start, start + page_size - 1).execute().data
+        if rows:
+            frames.append(pd.DataFrame.from_records(rows, columns=columns))
+        if len(rows) < page_size:
+            break
+        start += page_size
+    if not frames:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in columns})
+    return pd.concat(frames, ignore_index=True)
+
+
+def _to_utc(values: pd.Series) -> pd.Series:
+    """ Timestamps ISO do Supabase -> datetime64[ns] em UTC sem fuso (aritmética direta em NumPy). """
+    parsed = pd.to_datetime(values, utc=True, format='ISO8601', errors='coerce')
+    return parsed.dt.tz_localize(None).astype('datetime64[ns]')
+
+
+def load_stage_events(supabase: Client, historico: str, id_column: str,
+                      desde: Optional[datetime]) -> pd.DataFrame:
+    """
+    Eventos de mudança de etapa de uma tabela de histórico. Só as etapas saem
+    do JSON (dados_antes->>etapa), então o payload não traz os demais campos.
+    """
+    columns = f"registro_id:{id_column}, data_acao, " \
+              "etapa_antes:dados_antes->>etapa, etapa_depois:dados_depois->>etapa"
+
+    def build_query():
+        query = supabase.table(historico).select(columns)
+        if desde is not None:
+            query = query.gte('data_acao', desde.isoformat())
+        return query.order('id')
+
+    events = _frame_from_pages(build_query, EVENT_COLUMNS)
+    events['data_acao'] = _to_utc(events['data_acao'])
+    return events.dropna(subset=['registro_id', 'data_acao', 'etapa_depois'])
+
+
+def history_cutoff(supabase: Client, historico: str, desde: Optional[datetime],
+                   max_events: int) -> Optional[datetime]:
+    """
+    Data do `max_events`-ésimo evento mais recente da janela, ou None se a
+    janela inteira cabe no limite. Uma consulta de uma linha, pelo id.
+    """
+    query = supabase.table(historico).select('data_acao')
+    if desde is not None:
+        query = query.gte('data_acao', desde.isoformat())
+    rows = query.order('id', desc=True).range(max_events - 1, max_events - 1).execute().data
+    if not rows or not rows[0].get('data_acao'):
+        return None
+    return pd.Timestamp(rows[0]['data_acao']).tz_convert(timezone.utc).to_pydatetime()
+
+
+def load_leads(supabase: Client, tabelas: List[str], desde: Optional[datetime]) -> pd.DataFrame:
+    """ Leads (id, created_at, responsável, etapa atual) das tabelas informadas. """
+    frames = []
+    for tabela in tabelas:
+        def build_query(tabela=tabela):
+            query = supabase.table(tabela).select(', '.join(LEAD_COLUMNS))
+            if desde is not None:
+                query = query.gte('created_at', desde.isoformat())
+            return query.order('id')
+        frames.append(_frame_from_pages(build_query, LEAD_COLUMNS))
+    leads = pd.concat(frames, ignore_index=True).drop_duplicates('id', keep='last')
+    leads['created_at'] = _to_utc(leads['created_at'])
+    return leads
+
+
+# --- Métricas (vetorizadas) ---
+# As métricas trabalham sobre arrays NumPy: etapas viram códigos inteiros,
+# timestamps viram int64 (ns) e os agrupamentos são feitos com ordenação e
+# bincount, sem loops por linha.
+
+def stage_positions(values: pd.Series, stage_ids: List[str]) -> np.ndarray:
+    """
+    Posição de cada etapa em `stage_ids` (-1 para etapas desconhecidas ou vazias).
+    As rotas gravam ora o id ('em atendimento'), ora o título ('Em atendimento'),
+    então só os valores distintos são normalizados.
+    """
+    codes, uniques = pd.factorize(values)
+    ordem = {stage: posicao for posicao, stage in enumerate(stage_ids)}
+    # O último elemento atende os códigos -1 (valores nulos) do factorize
+    posicoes = np.array([ordem.get(str(u).strip().lower(), -1) for u in uniques] + [-1], dtype=np.int64)
+    return posicoes[codes]
+
+
+def _ns(values: pd.Series) -> np.ndarray:
+    return values.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def grouped_quantiles(grupos: np.ndarray, valores: np.ndarray, n_grupos: int,
+                      quantis=(0.5, 0.9)) -> np.ndarray:
+    """
+    Quantis (interpolação linear, como no pandas) de `valores` por grupo
+    0..n_grupos-1, com uma única ordenação. Devolve uma matriz
+    [n_grupos, len(quantis) + 1] com os quantis e a contagem de cada grupo.
+    """
+    ordem = np.lexsort((valores, grupos))
+    ordenados = valores[ordem]
+    contagens = np.bincount(grupos, minlength=n_grupos)
+    inicios = np.concatenate(([0], np.cumsum(contagens)[:-1]))
+
+    resultado = np.full((n_grupos, len(quantis) + 1), np.nan)
+    resultado[:, -1] = contagens
+    com_dados = contagens > 0
+    for coluna, q in enumerate(quantis):
+        posicao = inicios[com_dados] + (contagens[com_dados] - 1) * q
+        baixo = np.floor(posicao).astype(np.int64)
+        alto = np.ceil(posicao).astype(np.int64)
+        fracao = posicao - baixo
+        resultado[com_dados, coluna] = ordenados[baixo] + (ordenados[alto] - ordenados[baixo]) * fracao
+    return resultado
+
+
+def _stats_frame(matriz: np.ndarray, index) -> pd.DataFrame:
+    return pd.DataFrame({'mediana': matriz[:, 0], 'p90': matriz[:, 1], 'n': matriz[:, 2].astype(np.int64)},
+                        index=index)
+
+
+def stage_dwell(events: pd.DataFrame, created: pd.DataFrame, stage_ids: List[str]) -> pd.DataFrame:
+    """
+    Tempo de permanência em cada etapa (mediana e p90, em horas).
+
+    Cada evento abre uma estadia na `etapa_depois`; a etapa inicial de cada
+    registro começa no created_at (com a `etapa_antes` do primeiro evento).
+    A estadia termina no evento seguinte do mesmo registro; estadias ainda
+    abertas (etapa atual) não entram na conta.
+    """
+    ids = events['registro_id'].to_numpy(dtype=np.int64)
+    inicio = _ns(events['data_acao'])
+    antes = stage_positions(events['etapa_antes'], stage_ids)
+    depois = stage_positions(events['etapa_depois'], stage_ids)
+
+    ordem = np.lexsort((inicio, ids))
+    ids, inicio, antes, etapas = ids[ordem], inicio[ordem], antes[ordem], depois[ordem]
+
+    # Estadia inicial: a partir do created_at, na etapa_antes do primeiro evento.
+    # Entra logo antes do primeiro evento de cada registro, mantendo a ordenação.
+    primeiros = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1]))[:len(ids)])
+    criados = pd.Index(created['id'].to_numpy(dtype=np.int64)).get_indexer(ids[primeiros])
+    # O sentinela no fim atende os registros sem lead correspondente (-1)
+    created_ns = np.append(_ns(created['created_at']), np.iinfo(np.int64).min)[criados]
+    # Sem created_at, ou created_at depois do primeiro evento: estadia inicial desconhecida
+    validos = (created_ns != np.iinfo(np.int64).min) & (created_ns <= inicio[primeiros])
+    primeiros = primeiros[validos]
+
+    ids = np.insert(ids, primeiros, ids[primeiros])
+    etapas = np.insert(etapas, primeiros, antes[primeiros])
+    inicio = np.insert(inicio, primeiros, created_ns[validos])
+
+    # Fim de cada estadia = início da próxima do mesmo registro
+    fechada = (ids[1:] == ids[:-1]) & (etapas[:-1] >= 0)
+    horas = (inicio[1:] - inicio[:-1])[fechada] / NS_PER_HOUR
+
+    matriz = grouped_quantiles(etapas[:-1][fechada], horas, len(stage_ids))
+    return _stats_frame(matriz, stage_ids)
+
+
+def conversion_funnel(leads: pd.DataFrame, events: pd.DataFrame, stage_ids: List[str]) -> pd.DataFrame:
+    """
+    Funil de conversão dos leads da janela: quantos chegaram a cada etapa
+    (ou além) e a taxa de passagem para a etapa seguinte. A venda
+    (ARCHIVED_STAGE / Pós-Venda) conta como uma etapa depois da última.
+    """
+    etapas = stage_ids + [ARCHIVED_STAGE.lower()]
+    # Etapa mais avançada de cada lead: a atual ou qualquer uma do histórico
+    max_posicao = stage_positions(leads['etapa'], etapas)
+    lead_idx = pd.Index(leads['id'].to_numpy(dtype=np.int64)).get_indexer(
+        events['registro_id'].to_numpy(dtype=np.int64))
+    no_cohort = lead_idx >= 0
+    for coluna in ('etapa_antes', 'etapa_depois'):
+        np.maximum.at(max_posicao, lead_idx[no_cohort], stage_positions(events[coluna], etapas)[no_cohort])
+
+    por_posicao = np.bincount(max_posicao[max_posicao >= 0], minlength=len(etapas))
+    chegaram = por_posicao[::-1].cumsum()[::-1]  # chegou à etapa i = parou em i ou depois
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conversao = np.where(chegaram[:-1] > 0, chegaram[1:] / chegaram[:-1], np.nan)
+    return pd.DataFrame({'leads': chegaram[:-1], 'conversao': conversao}, index=stage_ids)
+
+
+def cycle_time_by_owner(leads: pd.DataFrame, events: pd.DataFrame) -> pd.DataFrame:
+    """ Tempo (dias) do created_at até a passagem para o Pós-Venda, por responsável. """
+    vendas = stage_positions(events['etapa_depois'], [ARCHIVED_STAGE.lower()]) == 0
+    lead_idx = pd.Index(leads['id'].to_numpy(dtype=np.int64)).get_indexer(
+        events['registro_id'].to_numpy(dtype=np.int64)[vendas])
+    data_venda = _ns(events['data_acao'])[vendas]
+
+    # Primeira venda de cada lead
+    primeira_venda = np.full(len(leads), np.iinfo(np.int64).max)
+    np.minimum.at(primeira_venda, lead_idx[lead_idx >= 0], data_venda[lead_idx >= 0])
+    created_ns = _ns(leads['created_at'])
+    vendidos = (primeira_venda != np.iinfo(np.int64).max) & (created_ns != np.iinfo(np.int64).min)
+    dias = (primeira_venda - created_ns)[vendidos] / NS_PER_DAY
+
+    responsaveis, nomes = pd.factorize(leads['responsavel'], use_na_sentinel=False)
+    grupos = responsaveis[vendidos][dias >= 0]
+    matriz = grouped_quantiles(grupos, dias[dias >= 0], len(nomes))
+    stats = _stats_frame(matriz, nomes)
+    return stats[stats['n'] > 0]
+
+
+# --- Relatório ---
+
+def _number(value) -> Optional[float]:
+    return None if pd.isna(value) else round(float(value), 1)
+
+
+def build_report(supabase: Client, janela: str, lead_stages: List[Dict[str, str]],
+                 posvenda_stages: List[Dict[str, str]], max_events: int = MAX_EVENTS) -> Dict[str, Any]:
+    """
+    Carrega histórico e leads da janela e calcula as métricas do funil.
+    Se a janela tiver mais de `max_events` eventos em historico_acoes ou em
+    historico_posvenda (ex.: 'tudo'), ela começa no evento mais antigo que
+    ainda cabe no limite dos dois, e o relatório informa esse início em
+    'limitado_desde'.
+    """
+    dias = ANALYTICS_WINDOWS[janela]
+    desde = datetime.now(timezone.utc) - timedelta(days=dias) if dias else None
+    cortes = [history_cutoff(supabase, historico, desde, max_events)
+              for historico in ('historico_acoes', 'historico_posvenda')] if max_events else []
+    corte = max((c for c in cortes if c is not None), default=None)
+    if corte is not None:
+        desde = corte
+
+    lead_ids = [stage['id'].strip().lower() for stage in lead_stages]
+    posvenda_ids = [stage['id'].strip().lower() for stage in posvenda_stages]
+
+    leads = load_leads(supabase, ['clientes', 'clientes_arquivados'], desde)
+    eventos = load_stage_events(supabase, 'historico_acoes', 'lead_id', desde)
+    clientes_posvenda = load_leads(supabase, ['clientes_posvenda'], desde)
+    eventos_posvenda = load_stage_events(supabase, 'historico_posvenda', 'cliente_id', desde)
+
+    permanencia = stage_dwell(eventos, leads, lead_ids)
+    permanencia_posvenda = stage_dwell(eventos_posvenda, clientes_posvenda, posvenda_ids)
+    funil = conversion_funnel(leads, eventos, lead_ids)
+    ciclo = cycle_time_by_owner(leads, eventos)
+    funcionarios = get_employees_map(supabase)
+
+    def dwell_rows(stats: pd.DataFrame, stages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        return [
+            {'etapa': stage['title'], 'mediana_horas': _number(row.mediana),
+             'p90_horas': _number(row.p90), 'n': 0 if pd.isna(row.n) else int(row.n)}
+            for stage, row in zip(stages, stats.itertuples())
+        ]
+
+    return {
+        'janela': janela,
+        'gerado_em': datetime.now(timezone.utc).isoformat(),
+        'limitado_desde': corte.isoformat() if corte is not None else None,
+        'total_leads': int(len(leads)),
+        'total_eventos': int(len(eventos) + len(eventos_posvenda)),
+        'permanencia': dwell_rows(permanencia, lead_stages),
+        'permanencia_posvenda': dwell_rows(permanencia_posvenda, posvenda_stages),
+        'funil': [
+            {'etapa': stage['title'], 'leads': int(row.leads),
+             'conversao': None if pd.isna(row.conversao) else round(float(row.conversao) * 100, 1)}
+            for stage, row in zip(lead_stages, funil.itertuples())
+        ],
+        'ciclo': sorted(
+            [
+                {'responsavel': funcionarios.get(responsavel, 'Sem responsável') if not pd.isna(responsavel)
+                 else 'Sem responsável',
+                 'mediana_dias': _number(row.mediana), 'p90_dias': _number(row.p90), 'n': int(row.n)}
+                for responsavel, row in zip(ciclo.index, ciclo.itertuples())
+            ],
+            key=lambda item: item['mediana_dias'],
+        ),
+    }
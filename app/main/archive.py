@@ -0,0 +1,132 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from .queries import ARCHIVED_STAGE
+from .services import create_supabase_client
+
+# Colunas copiadas da tabela quente para a fria (mesmo id)
+ARCHIVE_COLUMNS: str = "id, nome_empresa, nome_contato, email, telefone, responsavel, etapa, created_at"
+
+
+class LeadArchiver:
+    """
+    Move os leads arquivados ('Venda Concluída - ARQUIVADO') de `clientes` e
+    `clientes_areas` para as tabelas frias `clientes_arquivados` e
+    `clientes_areas_arquivadas` (ver sql/clientes_arquivados.sql).
+
+    Roda em lotes de `batch_size` leads numa thread de segundo plano a cada
+    `interval` segundos. Cada lote é copiado com upsert antes de ser apagado
+    da tabela quente, então um lote interrompido no meio é simplesmente
+    refeito na próxima passada. Só saem da tabela quente os leads que ainda
+    estão arquivados no momento do DELETE; os demais têm a cópia fria desfeita.
+    """
+
+    def __init__(self, batch_size: int = 500, interval: float = 3600.0):
+        self.enabled = False
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._run_lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config.get('ARCHIVE_ENABLED', False)
+        self.batch_size = app.config.get('ARCHIVE_BATCH_SIZE', self.batch_size)
+        self.interval = app.config.get('ARCHIVE_INTERVAL', self.interval)
+        app.extensions['lead_archiver'] = self
+        if self.enabled:
+            self.start()
+
+    def archive_batch(self, supabase) -> int:
+        """
+        Arquiva um lote de leads. Retorna quantos foram de fato removidos da
+        tabela quente (menos que o lote quando o DELETE não pegou todos).
+        """
+        leads = supabase.table('clientes').select(ARCHIVE_COLUMNS) \
+            .eq('etapa', ARCHIVED_STAGE).order('id').limit(self.batch_size).execute().data
+        if not leads:
+            return 0
+
+        ids = [lead['id'] for lead in leads]
+        areas = supabase.table('clientes_areas').select('cliente_id, area_id') \
+            .in_('cliente_id', ids).execute().data
+
+        # 1. Copia para as tabelas frias (idempotente)
+        supabase.table('clientes_arquivados').upsert(leads).execute()
+        if areas:
+            supabase.table('clientes_areas_arquivadas').upsert(areas).execute()
+
+        # 2. Remove da tabela quente só o que ainda está arquivado; as áreas
+        # saem junto pelo ON DELETE CASCADE de clientes_areas
+        removidos = supabase.table('clientes').delete().in_('id', ids) \
+            .eq('etapa', ARCHIVED_STAGE).execute().data or []
+        movidos = {lead['id'] for lead in removidos}
+
+        # 3. Leads que saíram do arquivo no meio do lote (ou que o RLS não
+        # deixou apagar) continuam na tabela quente: desfaz a cópia fria
+        nao_movidos = [lead_id for lead_id in ids if lead_id not in movidos]
+        if nao_movidos:
+            print(f"Arquivamento: {len(nao_movidos)} leads não foram removidos de clientes; "
+                  f"cópia fria desfeita.")
+            supabase.table('clientes_arquivados').delete().in_('id', nao_movidos).execute()
+        return len(movidos)
+
+    def run_once(self, supabase=None, on_batch: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Arquiva todos os leads pendentes, lote a lote. Retorna o total movido.
+        `on_batch` recebe quantos leads cada lote moveu (progresso do job
+        'arquivar_leads'); uma exceção levantada nele interrompe o arquivamento.
+        Uma execução por vez: a thread e o job não processam o mesmo lote.
+        """
+        with self._run_lock:
+            supabase = supabase or create_supabase_client()
+            if supabase is None:
+                print("Arquivamento: Supabase não configurado.")
+                return 0
+
+            total = 0
+            while True:
+                movidos = self.archive_batch(supabase)
+                total += movidos
+                if on_batch is not None:
+                    on_batch(movidos)
+                # Lote incompleto: acabou a fila ou o DELETE não removeu tudo
+                # (ex.: RLS), e repetir o mesmo lote não faria progresso
+                if movidos < self.batch_size or self._stopped:
+                    return total
+
+    def _run(self) -> None:
+        while not self._stopped:
+            try:
+                total = self.run_once()
+                if total:
+                    print(f"Arquivamento: {total} leads movidos para clientes_arquivados.")
+            except Exception as e:
+                print(f"Erro no job de arquivamento: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='lead-archiver', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+
+
+def fetch_lead_any(supabase, lead_id: int, columns: str = ARCHIVE_COLUMNS) -> Optional[Dict[str, Any]]:
+    """ Busca um lead na tabela quente e, se não estiver lá, na tabela de arquivados. """
+    for tabela in ('clientes', 'clientes_arquivados'):
+        rows: List[Dict[str, Any]] = supabase.table(tabela).select(columns) \
+            .eq('id', lead_id).limit(1).execute().data
+        if rows:
+            return rows[0]
+    return None
+
+
+lead_archiver = LeadArchiver()
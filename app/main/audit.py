@@ -0,0 +1,259 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .services import create_supabase_client, is_connection_error
+
+# Tabela de histórico (e coluna de ID) de cada tabela de clientes
+AUDIT_TABLES: Dict[str, tuple] = {
+    'clientes': ('historico_acoes', 'lead_id'),
+    'clientes_posvenda': ('historico_posvenda', 'cliente_id'),
+}
+
+# Tipos de ação exibidos pela página de histórico. Não há exclusão de leads
+# no app (vendidos vão para clientes_arquivados com o mesmo id e histórico)
+ACTION_CREATE = 'CREATE'
+ACTION_UPDATE = 'UPDATE'
+
+
+def _same_value(antes: Any, depois: Any) -> bool:
+    """
+    Compara um valor do banco com o enviado pelo formulário, que chega como
+    texto: '5' == 5 (ex.: responsavel), '' == None, ' x ' == 'x'.
+    """
+    if antes == depois:
+        return True
+    if antes in (None, '') or depois in (None, ''):
+        return antes in (None, '') and depois in (None, '')
+    if isinstance(antes, (int, float)) or isinstance(depois, (int, float)):
+        try:
+            return float(antes) == float(depois)
+        except (TypeError, ValueError):
+            return False
+    return str(antes).strip() == str(depois).strip()
+
+
+def changed_fields(antes: Optional[Dict[str, Any]], depois: Dict[str, Any]) -> Dict[str, Any]:
+    """ Campos de `depois` cujo valor difere de `antes` (para montar o 'detalhes'). """
+    antes = antes or {}
+    return {campo: valor for campo, valor in depois.items() if not _same_value(antes.get(campo), valor)}
+
+
+class AuditWriter:
+    """
+    Grava os eventos de auditoria (historico_acoes / historico_posvenda) de
+    forma assíncrona.
+
+    As rotas só enfileiram o evento (sem ida ao banco); uma thread de segundo
+    plano junta os eventos por até `flush_interval` segundos ou `batch_size`
+    eventos e faz um único INSERT em lote por tabela de histórico.
+
+    - a fila é limitada a `max_queue` eventos: se encher, quem registra espera
+      até `put_timeout` segundos e, se ainda não houver espaço, grava o próprio
+      evento de forma síncrona (backpressure);
+    - lotes que falham por queda de rede voltam para a fila; lotes recusados
+      pelo banco são regravados evento a evento, para isolar o evento com
+      problema, e cada evento recusado tenta no máximo `max_attempts` vezes;
+    - eventos que esgotaram as tentativas ou não couberam de volta na fila
+      vão para um arquivo de dead-letter (JSON por linha), em vez de sumirem;
+    - ao encerrar o processo, o que estiver na fila é gravado (atexit).
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 2.0, put_timeout: float = 0.5, max_attempts: int = 5):
+        self.enabled = True
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+        self.dead_letter_path: Optional[str] = None
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._flush_lock = threading.Lock()
+        self._dead_letter_lock = threading.Lock()
+        self._client = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config.get('AUDIT_ENABLED', self.enabled)
+        self.max_queue = app.config.get('AUDIT_QUEUE_SIZE', self.max_queue)
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', self.flush_interval)
+        self.max_attempts = app.config.get('AUDIT_MAX_ATTEMPTS', self.max_attempts)
+        self.dead_letter_path = app.config.get('AUDIT_DEAD_LETTER_PATH') or \
+            os.path.join(app.instance_path, 'audit_dead_letter.jsonl')
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        app.extensions['audit_writer'] = self
+
+        if self.enabled:
+            self.start()
+
+    # --- Registro ---
+
+    def record(self, tabela: str, registro_id: int, tipo_acao: str, detalhes: str,
+               antes: Optional[Dict[str, Any]] = None, depois: Optional[Dict[str, Any]] = None) -> None:
+        """ Enfileira um evento de auditoria para o registro `registro_id` de `tabela`. """
+        if not self.enabled:
+            return
+        historico, id_column = AUDIT_TABLES[tabela]
+        event = {
+            'tabela': historico,
+            'linha': {
+                id_column: registro_id,
+                'tipo_acao': tipo_acao,
+                'detalhes': detalhes,
+                'data_acao': datetime.now(timezone.utc).isoformat(),
+                'dados_antes': antes,
+                'dados_depois': depois,
+            },
+        }
+        try:
+            self._queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            # Backpressure: a fila está cheia, então quem escreve paga o INSERT
+            print("Auditoria: fila cheia, gravando evento de forma síncrona.")
+            self._insert([event])
+
+    # --- Flush ---
+
+    def _collect(self, timeout: Optional[float]) -> List[Dict[str, Any]]:
+        """
+        Espera o primeiro evento por até `timeout` segundos e, a partir dele,
+        junta mais eventos por até `flush_interval` segundos ou `batch_size` itens.
+        Com `timeout=None`, só drena o que já estiver na fila.
+        """
+        batch: List[Dict[str, Any]] = []
+        deadline = None if timeout is not None else time.monotonic()
+        while len(batch) < self.batch_size:
+            try:
+                if deadline is None:
+                    batch.append(self._queue.get(timeout=timeout))
+                    deadline = time.monotonic() + self.flush_interval
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _insert(self, events: List[Dict[str, Any]]) -> bool:
+        """ Um INSERT em lote por tabela de histórico. Retorna False se algum lote falhou. """
+        if self._client is None:
+            self._client = create_supabase_client()
+        if self._client is None:
+            print(f"Auditoria: Supabase não configurado; {len(events)} eventos descartados.")
+            return True
+
+        por_tabela: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for event in events:
+            por_tabela[event['tabela']].append(event)
+
+        ok = True
+        for historico, itens in por_tabela.items():
+            try:
+                self._client.table(historico).insert([event['linha'] for event in itens]).execute()
+            except Exception as e:
+                print(f"Auditoria: erro ao gravar {len(itens)} eventos em {historico}: {e}")
+                ok = False
+                if is_connection_error(e):
+                    # Banco fora: o lote volta inteiro, sem contar tentativa
+                    self._retry(itens, str(e), count_attempt=False)
+                elif len(itens) > 1:
+                    self._insert_one_by_one(historico, itens)
+                else:
+                    self._retry(itens, str(e))
+        return ok
+
+    def _insert_one_by_one(self, historico: str, itens: List[Dict[str, Any]]) -> None:
+        """ Regrava um lote recusado evento a evento: só os eventos com problema voltam para a fila. """
+        for posicao, event in enumerate(itens):
+            try:
+                self._client.table(historico).insert(event['linha']).execute()
+            except Exception as e:
+                if is_connection_error(e):
+                    self._retry(itens[posicao:], str(e), count_attempt=False)
+                    return
+                self._retry([event], str(e))
+
+    def _retry(self, events: List[Dict[str, Any]], erro: str, count_attempt: bool = True) -> None:
+        """ Devolve os eventos à fila; os que esgotaram as tentativas (ou não cabem) vão para o dead-letter. """
+        mortos = []
+        for event in events:
+            if count_attempt:
+                event['tentativas'] = event.get('tentativas', 0) + 1
+                if event['tentativas'] >= self.max_attempts:
+                    mortos.append(event)
+                    continue
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                mortos.append(event)
+        if mortos:
+            self._dead_letter(mortos, erro)
+
+    def _dead_letter(self, events: List[Dict[str, Any]], erro: str) -> None:
+        print(f"Auditoria: {len(events)} eventos não gravados movidos para {self.dead_letter_path}: {erro}")
+        linhas = [json.dumps({'tabela': event['tabela'], 'linha': event['linha'], 'erro': erro}, default=str)
+                  for event in events]
+        if self.dead_letter_path is None:
+            print('\n'.join(linhas))
+            return
+        try:
+            with self._dead_letter_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.dead_letter_path)), exist_ok=True)
+                with open(self.dead_letter_path, 'a', encoding='utf-8') as arquivo:
+                    arquivo.write('\n'.join(linhas) + '\n')
+        except OSError as e:
+            print(f"Auditoria: erro ao gravar o dead-letter ({e}); eventos: {linhas}")
+
+    def flush(self) -> int:
+        """ Grava tudo o que está na fila agora. Retorna quantos eventos foram enviados. """
+        enviados = 0
+        with self._flush_lock:
+            while True:
+                batch = self._collect(None)
+                if not batch:
+                    break
+                enviados += len(batch)
+                if not self._insert(batch):
+                    break  # banco fora: o restante fica para a próxima passada
+        return enviados
+
+    def _run(self) -> None:
+        while not self._stopped:
+            batch = self._collect(self.flush_interval)
+            if not batch:
+                continue
+            with self._flush_lock:
+                failed = not self._insert(batch)
+            if failed:
+                time.sleep(self.flush_interval)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """ Para a thread e grava o que estiver pendente na fila. """
+        self._stopped = True
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2)
+        self.flush()
+
+
+audit_writer = AuditWriter()
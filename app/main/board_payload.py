@@ -0,0 +1,90 @@
+from typing import Any, Dict, List
+
+# Versão do formato compacto do payload do Kanban (lido por static/js/board_payload.js).
+# A versão 1 é a lista simples de leads, ainda disponível com ?formato=1.
+BOARD_PAYLOAD_VERSION: int = 2
+
+# Campos enviados como estão, um array por campo
+BOARD_PLAIN_FIELDS = ('id', 'nome_empresa', 'nome_contato', 'created_at')
+
+
+def encode_board_payload(leads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Converte a lista de leads do Kanban no formato compacto (v2).
+
+    Funcionários, áreas e etapas se repetem em milhares de cards, então são
+    enviados uma única vez em tabelas de consulta e os leads passam a
+    referenciá-los por índice. Os leads vão em colunas (um array por campo):
+
+        {
+            "v": 2, "n": 3,
+            "responsaveis": [{"id": 7, "nome": "Ana"}],
+            "areas": ["TI", "RH"],
+            "etapas": ["em proposta"],
+            "colunas": {
+                "id": [...], "nome_empresa": [...], "nome_contato": [...], "created_at": [...],
+                "etapa": [0, 0, 0],          # índice em "etapas"
+                "responsavel": [0, -1, 0],   # índice em "responsaveis" (-1 = sem responsável)
+                "areas": [[0, 1], [], [1]]   # índices em "areas"
+            }
+        }
+    """
+    responsaveis: List[Dict[str, Any]] = []
+    responsavel_idx: Dict[Any, int] = {}
+    areas: List[str] = []
+    area_idx: Dict[str, int] = {}
+    etapas: List[str] = []
+    etapa_idx: Dict[Any, int] = {}
+
+    colunas: Dict[str, List[Any]] = {campo: [] for campo in BOARD_PLAIN_FIELDS}
+    col_etapa: List[int] = []
+    col_responsavel: List[int] = []
+    col_areas: List[List[int]] = []
+
+    for lead in leads:
+        for campo in BOARD_PLAIN_FIELDS:
+            colunas[campo].append(lead.get(campo))
+
+        etapa = lead.get('etapa')
+        if etapa not in etapa_idx:
+            etapa_idx[etapa] = len(etapas)
+            etapas.append(etapa)
+        col_etapa.append(etapa_idx[etapa])
+
+        responsavel = lead.get('responsavel')
+        if responsavel:
+            chave = responsavel.get('id')
+            if chave not in responsavel_idx:
+                responsavel_idx[chave] = len(responsaveis)
+                responsaveis.append({'id': chave, 'nome': responsavel.get('nome')})
+            col_responsavel.append(responsavel_idx[chave])
+        else:
+            col_responsavel.append(-1)
+
+        indices = []
+        for area in lead.get('areas') or []:
+            if area not in area_idx:
+                area_idx[area] = len(areas)
+                areas.append(area)
+            indices.append(area_idx[area])
+        col_areas.append(indices)
+
+    colunas['etapa'] = col_etapa
+    colunas['responsavel'] = col_responsavel
+    colunas['areas'] = col_areas
+
+    return {
+        'v': BOARD_PAYLOAD_VERSION,
+        'n': len(leads),
+        'responsaveis': responsaveis,
+        'areas': areas,
+        'etapas': etapas,
+        'colunas': colunas,
+    }
+
+
+def board_payload(leads: List[Dict[str, Any]], formato: str = None) -> Any:
+    """ Payload do Kanban no formato pedido (?formato=1 mantém a lista antiga). """
+    if formato == '1':
+        return leads
+    return encode_board_payload(leads)
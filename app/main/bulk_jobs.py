@@ -0,0 +1,186 @@
+import csv
+from typing import Any, Dict, List
+
+from .archive import lead_archiver
+from .dedup import DuplicateLeadError, dedup_index
+from .jobs import JobContext, job_runner
+from .operations import create_lead, move_lead_to_post_sale, update_stages
+from .queries import iter_client_list
+from .read_cache import read_cache
+from .rollups import backfill_rollups, rollup_store
+from .services import create_supabase_client
+
+# Quantos leads vão em cada UPDATE ... IN (...) do re-estagiamento em massa
+RESTAGE_BATCH_SIZE: int = 200
+EXPORT_COLUMNS = ('tipo', 'id', 'nome_empresa', 'nome_contato', 'email', 'telefone',
+                  'responsavel_nome', 'etapa', 'areas', 'created_at')
+
+
+# --- Jobs de operações em massa (executados pelo job_runner) ---
+# Cada handler recebe o JobContext, registra o resultado de cada item e devolve
+# um resumo que fica salvo no job.
+
+def _supabase():
+    supabase = create_supabase_client()
+    if supabase is None:
+        raise RuntimeError("Variáveis SUPABASE_URL ou SUPABASE_KEY não encontradas.")
+    return supabase
+
+
+def _require_list(params: Dict[str, Any], name: str) -> List[Any]:
+    values = params.get(name)
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"Parâmetro '{name}' deve ser uma lista não vazia.")
+    return values
+
+
+@job_runner.register('mover_pos_venda')
+def bulk_move_to_post_sale(ctx: JobContext) -> Dict[str, Any]:
+    """ Transição de vários leads para o Pós-Venda. params: {lead_ids: [...]} """
+    lead_ids = _require_list(ctx.params, 'lead_ids')
+    supabase = _supabase()
+    ctx.set_total(len(lead_ids))
+
+    movidos = 0
+    try:
+        for lead_id in lead_ids:
+            ctx.check_cancelled()
+            try:
+                new_client_id = move_lead_to_post_sale(supabase, lead_id)
+                ctx.item_done(lead_id, True, {'new_client_id': new_client_id})
+                movidos += 1
+            except Exception as e:
+                ctx.item_done(lead_id, False, {'error': str(e)})
+    finally:
+        read_cache.expire()
+    return {'movidos': movidos}
+
+
+@job_runner.register('atualizar_etapas')
+def bulk_update_stages(ctx: JobContext) -> Dict[str, Any]:
+    """ Mudança de etapa em massa. params: {tabela, etapa, lead_ids: [...]} """
+    lead_ids = _require_list(ctx.params, 'lead_ids')
+    tabela = ctx.params.get('tabela', 'clientes')
+    etapa = ctx.params.get('etapa')
+    if not etapa:
+        raise ValueError("Parâmetro 'etapa' é obrigatório.")
+    supabase = _supabase()
+    ctx.set_total(len(lead_ids))
+
+    atualizados = 0
+    try:
+        for start in range(0, len(lead_ids), RESTAGE_BATCH_SIZE):
+            ctx.check_cancelled()
+            lote = []
+            for lead_id in lead_ids[start:start + RESTAGE_BATCH_SIZE]:
+                try:
+                    lote.append(int(lead_id))
+                except (TypeError, ValueError):
+                    # Um ID inválido falha só o próprio item
+                    ctx.item_done(lead_id, False, {'error': 'ID de lead inválido'})
+            if not lote:
+                continue
+            try:
+                ok = set(update_stages(supabase, tabela, lote, etapa))
+            except Exception as e:
+                for lead_id in lote:
+                    ctx.item_done(lead_id, False, {'error': str(e)})
+                continue
+            for lead_id in lote:
+                sucesso = lead_id in ok
+                ctx.item_done(lead_id, sucesso, None if sucesso else {'error': 'Lead não encontrado'})
+            atualizados += len(ok)
+    finally:
+        read_cache.expire()
+    return {'atualizados': atualizados}
+
+
+@job_runner.register('importar_leads')
+def import_leads(ctx: JobContext) -> Dict[str, Any]:
+    """
+    Importação de leads. params: {leads: [{nome_empresa, nome_contato, email, ...}],
+    ignorar_duplicados: false}. Leads que coincidem com cadastros existentes
+    falham com a lista de possíveis duplicados, a menos que ignorar_duplicados seja true.
+    """
+    leads = _require_list(ctx.params, 'leads')
+    check_duplicates = not ctx.params.get('ignorar_duplicados')
+    supabase = _supabase()
+    ctx.set_total(len(leads))
+
+    criados = 0
+    try:
+        for posicao, data in enumerate(leads, start=1):
+            ctx.check_cancelled()
+            try:
+                new_lead = create_lead(supabase, data, check_duplicates)
+                ctx.item_done(posicao, True, {'lead_id': new_lead['id']})
+                criados += 1
+            except DuplicateLeadError as e:
+                ctx.item_done(posicao, False, {'error': str(e), 'duplicates': e.matches})
+            except Exception as e:
+                ctx.item_done(posicao, False, {'error': str(e)})
+    finally:
+        read_cache.expire()
+    return {'criados': criados}
+
+
+@job_runner.register('exportar_clientes')
+def export_clients(ctx: JobContext) -> Dict[str, Any]:
+    """ Exporta a lista unificada de clientes para CSV (um item por página lida). """
+    supabase = _supabase()
+    path = ctx.file_path('csv')
+    page_size = 500
+
+    linhas = 0
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        for cliente in iter_client_list(supabase, page_size):
+            if linhas % page_size == 0:
+                ctx.check_cancelled()
+            writer.writerow({**cliente, 'areas': ', '.join(cliente['areas'])})
+            linhas += 1
+            if linhas % page_size == 0:
+                ctx.item_done(f"linhas {linhas - page_size + 1}-{linhas}")
+    if linhas % page_size:
+        ctx.item_done(f"linhas {linhas - linhas % page_size + 1}-{linhas}")
+    return {'linhas': linhas, 'arquivo': f"{ctx.job_id}.csv"}
+
+
+@job_runner.register('arquivar_leads')
+def archive_leads(ctx: JobContext) -> Dict[str, Any]:
+    """ Executa o arquivamento dos leads vendidos agora, lote a lote (espera a passada da thread, se houver). """
+    supabase = _supabase()
+    lotes = []
+
+    def batch_done(movidos: int) -> None:
+        lotes.append(movidos)
+        ctx.item_done(f"lote {len(lotes)}", True, {'movidos': movidos})
+        if movidos >= lead_archiver.batch_size:  # ainda há outro lote
+            ctx.check_cancelled()
+
+    ctx.check_cancelled()
+    total = lead_archiver.run_once(supabase, on_batch=batch_done)
+    read_cache.expire()
+    return {'movidos': total}
+
+
+@job_runner.register('recalcular_rollups')
+def rebuild_rollups(ctx: JobContext) -> Dict[str, Any]:
+    """ Refaz as séries de /negocios a partir das tabelas de clientes e do histórico. """
+    supabase = _supabase()
+    return backfill_rollups(supabase, rollup_store,
+                            progress=lambda tabela, lidos: ctx.item_done(tabela, True, {'linhas': lidos}))
+
+
+@job_runner.register('encontrar_duplicados')
+def find_duplicates(ctx: JobContext) -> Dict[str, Any]:
+    """ Recarrega o índice de duplicados e registra cada grupo encontrado (um item por grupo). """
+    supabase = _supabase()
+    total = dedup_index.load(supabase)
+    grupos = dedup_index.clusters()
+    ctx.set_total(len(grupos))
+    for grupo in grupos:
+        ctx.check_cancelled()
+        ctx.item_done(grupo)
+    return {'registros': total, 'grupos': len(grupos), 'duplicados': sum(len(grupo) for grupo in grupos)}
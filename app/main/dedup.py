@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+from .queries import ARCHIVED_STAGE, iter_pages
+from .services import create_supabase_client
+
+# Colunas lidas para montar o índice
+DEDUP_COLUMNS: str = "id, nome_empresa, email, telefone"
+DEDUP_TABLES = ('clientes', 'clientes_posvenda')
+
+# Palavras que não distinguem empresas ("Acme Ltda" = "ACME")
+COMPANY_STOPWORDS = frozenset({'ltda', 'me', 'epp', 'eireli', 'sa', 's', 'a', 'cia', 'mei'})
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_NON_DIGIT_RE = re.compile(r'\D')
+
+Ref = Tuple[str, int]          # (tabela, id)
+BlockKey = Tuple[str, str]     # (campo, valor normalizado)
+
+
+# --- Normalização ---
+
+def strip_accents(text: str) -> str:
+    """ 'Ação' -> 'Acao'. Os acentos viram caracteres combinantes (NFKD) e são descartados no encode. """
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+
+def normalize_company(nome: Optional[str]) -> Optional[str]:
+    """ 'Ação & Cia. LTDA' -> 'acao'. Sem acentos, caixa e pontuação, e sem sufixos societários. """
+    if not nome:
+        return None
+    tokens = _TOKEN_RE.findall(strip_accents(nome).lower())
+    tokens = [t for t in tokens if t not in COMPANY_STOPWORDS] or tokens
+    return ' '.join(tokens) or None
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    if not email:
+        return None
+    email = email.strip().lower()
+    return email if '@' in email else None
+
+
+def normalize_phone(telefone: Optional[str]) -> Optional[str]:
+    """ Só os dígitos, sem o +55 e sem zeros de discagem: '+55 (11) 99999-0001' -> '11999990001'. """
+    if not telefone:
+        return None
+    digits = _NON_DIGIT_RE.sub('', str(telefone))
+    if len(digits) > 11 and digits.startswith('55'):
+        digits = digits[2:]
+    digits = digits.lstrip('0')
+    return digits if len(digits) >= 8 else None
+
+
+def blocking_keys(record: Dict[str, Any]) -> List[BlockKey]:
+    """ Chaves de bloqueio de um registro: dois registros com uma chave em comum são candidatos a duplicado. """
+    keys = []
+    for campo, normalize in (('empresa', normalize_company), ('email', normalize_email),
+                             ('telefone', normalize_phone)):
+        source = 'nome_empresa' if campo == 'empresa' else campo
+        value = normalize(record.get(source))
+        if value:
+            keys.append((campo, value))
+    return keys
+
+
+class DuplicateLeadError(Exception):
+    """ Levantada ao criar um lead que coincide com leads/clientes já cadastrados. """
+
+    def __init__(self, matches: List[Dict[str, Any]]):
+        super().__init__("Possível duplicado de: " + ', '.join(
+            f"{match['nome_empresa'] or 'sem nome'} ({', '.join(match['motivos'])})" for match in matches))
+        self.matches = matches
+
+
+# Espera antes de tentar de novo uma carga que falhou
+LOAD_RETRY_SECONDS: float = 30.0
+
+
+# --- Índice ---
+
+class DedupIndex:
+    """
+    Índice em memória (hash) das chaves de bloqueio dos leads e clientes de
+    Pós-Venda. Verificar um lead novo custa uma consulta a dicionário por
+    chave (nome da empresa, e-mail, telefone), sem comparar pares.
+
+    O índice só é carregado quando alguém precisa dele (formulário / criação
+    de lead, ver `ensure_loaded`): a carga roda numa thread de segundo plano e
+    é refeita no próximo uso depois de `refresh_interval` segundos. Workers
+    que não criam leads nunca leem as tabelas. Entre as recargas, as rotas de
+    escrita mantêm o índice atualizado. As alterações feitas durante uma recarga também são
+    guardadas e reaplicadas no índice novo antes da troca, já que a leitura
+    das tabelas pode ter passado por aqueles registros antes delas.
+    Enquanto não houver carga, a verificação é pulada.
+
+    Blocos com mais de `max_block_size` registros (ex.: um telefone genérico
+    usado em vários cadastros) não servem como evidência e são ignorados.
+    """
+
+    def __init__(self, refresh_interval: float = 600.0, max_block_size: int = 50):
+        self.enabled = True
+        self.refresh_interval = refresh_interval
+        self.max_block_size = max_block_size
+        self.loaded = False
+
+        self._lock = threading.Lock()
+        self._buckets: Dict[BlockKey, Set[Ref]] = defaultdict(set)
+        self._keys: Dict[Ref, List[BlockKey]] = {}
+        self._names: Dict[Ref, Optional[str]] = {}
+        # Alterações recebidas durante um build: (ref, registro ou None para remoção)
+        self._pending: Optional[List[Tuple[Ref, Optional[Dict[str, Any]]]]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loading = False
+        self._attempted_at: Optional[float] = None
+
+    def init_app(self, app) -> None:
+        # Nada é carregado aqui: a primeira carga acontece no primeiro uso
+        self.enabled = app.config.get('DEDUP_ENABLED', self.enabled)
+        self.refresh_interval = app.config.get('DEDUP_REFRESH_INTERVAL', self.refresh_interval)
+        app.extensions['dedup_index'] = self
+
+    # --- Manutenção ---
+
+    def _add(self, ref: Ref, record: Dict[str, Any]) -> None:
+        keys = blocking_keys(record)
+        for key in keys:
+            self._buckets[key].add(ref)
+        self._keys[ref] = keys
+        self._names[ref] = record.get('nome_empresa')
+
+    def _remove(self, ref: Ref) -> None:
+        for key in self._keys.pop(ref, ()):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(ref)
+                if not bucket:
+                    del self._buckets[key]
+        self._names.pop(ref, None)
+
+    def add(self, tabela: str, record: Dict[str, Any]) -> None:
+        """ Inclui (ou atualiza) um registro com 'id', 'nome_empresa', 'email' e 'telefone'. """
+        ref = (tabela, int(record['id']))
+        with self._lock:
+            self._remove(ref)
+            self._add(ref, record)
+            if self._pending is not None:
+                self._pending.append((ref, dict(record)))
+
+    def remove(self, tabela: str, registro_id: int) -> None:
+        ref = (tabela, int(registro_id))
+        with self._lock:
+            self._remove(ref)
+            if self._pending is not None:
+                self._pending.append((ref, None))
+
+    def build(self, records: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Recria o índice inteiro a partir de (tabela, registro) e troca o atual,
+        reaplicando antes as chamadas a add() / remove() feitas durante a leitura.
+        """
+        novo = DedupIndex(max_block_size=self.max_block_size)
+        total = 0
+        with self._lock:
+            self._pending = []
+        try:
+            # Índice novo e ids únicos por tabela: não há chaves antigas a remover
+            for tabela, record in records:
+                novo._add((tabela, int(record['id'])), record)
+                total += 1
+            with self._lock:
+                for ref, record in self._pending:
+                    novo._remove(ref)
+                    if record is not None:
+                        novo._add(ref, record)
+                self._buckets, self._keys, self._names = novo._buckets, novo._keys, novo._names
+                self.loaded = True
+                self._attempted_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending = None
+        return total
+
+    def load(self, supabase: Client, page_size: int = 1000) -> int:
+        """ Lê clientes (sem os arquivados) e clientes_posvenda e recria o índice. """
+        def records():
+            yield from (('clientes', row) for row in iter_pages(
+                lambda: supabase.table('clientes').select(DEDUP_COLUMNS)
+                    .neq('etapa', ARCHIVED_STAGE).order('id'), page_size))
+            yield from (('clientes_posvenda', row) for row in iter_pages(
+                lambda: supabase.table('clientes_posvenda').select(DEDUP_COLUMNS).order('id'), page_size))
+        return self.build(records())
+
+    # --- Consultas ---
+
+    def find_matches(self, record: Dict[str, Any], limit: int = 5) -> List[Dict[str, Any]]:
+        """ Registros que compartilham alguma chave com `record`, com os campos que coincidiram. """
+        motivos: Dict[Ref, List[str]] = defaultdict(list)
+        with self._lock:
+            for key in blocking_keys(record):
+                bucket = self._buckets.get(key, ())
+                if len(bucket) > self.max_block_size:
+                    continue
+                for ref in bucket:
+                    motivos[ref].append(key[0])
+            names = {ref: self._names.get(ref) for ref in motivos}
+
+        # Mais campos em comum primeiro
+        refs = sorted(motivos, key=lambda ref: len(motivos[ref]), reverse=True)[:limit]
+        return [
+            {'tabela': ref[0], 'id': ref[1], 'nome_empresa': names[ref], 'motivos': motivos[ref]}
+            for ref in refs
+        ]
+
+    def clusters(self) -> List[List[Dict[str, Any]]]:
+        """
+        Grupos de duplicados entre as duas tabelas (componentes conexos ligados
+        por chaves em comum), via union-find: O(n α(n)) sobre os blocos.
+        """
+        with self._lock:
+            buckets = [list(bucket) for bucket in self._buckets.values()
+                       if 1 < len(bucket) <= self.max_block_size]
+            names = dict(self._names)
+
+        parent: Dict[Ref, Ref] = {}
+
+        def find(ref: Ref) -> Ref:
+            root = ref
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while ref != root:  # compressão de caminho
+                parent[ref], ref = root, parent[ref]
+            return root
+
+        for bucket in buckets:
+            root = find(bucket[0])
+            for ref in bucket[1:]:
+                other = find(ref)
+                if other != root:
+                    parent[other] = root
+
+        grupos: Dict[Ref, List[Ref]] = defaultdict(list)
+        for ref in parent.keys() | {root for root in parent.values()}:
+            grupos[find(ref)].append(ref)
+        return [
+            [{'tabela': tabela, 'id': registro_id, 'nome_empresa': names.get((tabela, registro_id))}
+             for tabela, registro_id in sorted(membros)]
+            for membros in grupos.values()
+        ]
+
+    # --- Carga sob demanda ---
+
+    def ensure_loaded(self) -> None:
+        """
+        Agenda uma carga em segundo plano se o índice nunca foi carregado ou
+        se a última carga passou de `refresh_interval` segundos. Não bloqueia.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            espera = self.refresh_interval if self.loaded else LOAD_RETRY_SECONDS
+            if self._loading or (self._attempted_at is not None
+                                 and time.monotonic() - self._attempted_at < espera):
+                return
+            self._loading = True
+            self._attempted_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='dedup-index', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            supabase = create_supabase_client()
+            if supabase is not None:
+                self.load(supabase)
+        except Exception as e:
+            print(f"Erro ao carregar o índice de duplicados: {e}")
+        finally:
+            with self._lock:
+                self._loading = False
+
+
+dedup_index = DedupIndex()
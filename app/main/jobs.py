@@ -0,0 +1,367 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Estados possíveis de um job
+JOB_QUEUED = 'na_fila'
+JOB_RUNNING = 'executando'
+JOB_DONE = 'concluido'
+JOB_FAILED = 'falhou'
+JOB_CANCELLED = 'cancelado'
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            TEXT PRIMARY KEY,
+    tipo          TEXT NOT NULL,
+    status        TEXT NOT NULL,
+    parametros    TEXT,
+    total         INTEGER,
+    processados   INTEGER NOT NULL DEFAULT 0,
+    erros         INTEGER NOT NULL DEFAULT 0,
+    cancelar      INTEGER NOT NULL DEFAULT 0,
+    erro          TEXT,
+    resultado     TEXT,
+    criado_em     REAL NOT NULL,
+    iniciado_em   REAL,
+    finalizado_em REAL,
+    dono          TEXT,
+    heartbeat     REAL
+);
+CREATE TABLE IF NOT EXISTS job_itens (
+    job_id     TEXT    NOT NULL,
+    seq        INTEGER NOT NULL,
+    item       TEXT,
+    sucesso    INTEGER NOT NULL,
+    resultado  TEXT,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+# Colunas acrescentadas depois da primeira versão da tabela
+JOBS_MIGRATIONS = {'dono': 'TEXT', 'heartbeat': 'REAL'}
+
+
+def process_owner() -> str:
+    """
+    Identifica o processo dono de um job ("host:pid:token"). O token evita
+    confundir o processo com um anterior de mesmo pid (ex.: contêiner reiniciado).
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # No Windows os.kill(pid, 0) encerraria o processo: vale só o heartbeat
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def owner_alive(dono: Optional[str]) -> bool:
+    """ Falso se o dono é um processo desta máquina que já terminou. Donos em outras máquinas valem pelo heartbeat. """
+    if not dono:
+        return False
+    partes = dono.rsplit(':', 2)
+    if len(partes) != 3 or partes[0] != socket.gethostname() or not partes[1].isdigit():
+        return True
+    pid = partes[1]
+    if pid == str(os.getpid()):
+        # Mesmo pid com outro token: um processo anterior a este
+        return False
+    return _pid_alive(int(pid))
+
+
+class JobCancelled(Exception):
+    """ Levantada dentro de um job quando o cancelamento foi pedido. """
+
+
+class JobQueueFull(Exception):
+    """ Levantada ao enfileirar um job quando a fila está no limite. """
+
+
+class JobStore:
+    """ Tabela de jobs e resultados por item, persistida em SQLite. """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(JOBS_SCHEMA)
+        colunas = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for coluna, tipo in JOBS_MIGRATIONS.items():
+            if coluna not in colunas:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {coluna} {tipo}")
+        self._lock = threading.Lock()
+
+    def execute(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def create(self, job_id: str, tipo: str, parametros: Dict[str, Any], dono: str) -> None:
+        agora = time.time()
+        self.execute(
+            "INSERT INTO jobs (id, tipo, status, parametros, criado_em, dono, heartbeat) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, tipo, JOB_QUEUED, json.dumps(parametros), agora, dono, agora),
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        job['parametros'] = json.loads(job['parametros'] or '{}')
+        job['resultado'] = json.loads(job['resultado']) if job['resultado'] else None
+        job['cancelar'] = bool(job['cancelar'])
+        return job
+
+    def items(self, job_id: str, desde: int = 0, limite: int = 1000) -> List[Dict[str, Any]]:
+        rows = self.execute(
+            "SELECT seq, item, sucesso, resultado FROM job_itens "
+            "WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (job_id, desde, limite),
+        )
+        return [
+            {
+                'seq': row['seq'],
+                'item': json.loads(row['item']) if row['item'] else None,
+                'sucesso': bool(row['sucesso']),
+                'resultado': json.loads(row['resultado']) if row['resultado'] else None,
+            }
+            for row in rows
+        ]
+
+    def add_item(self, job_id: str, seq: int, item: Any, sucesso: bool, resultado: Any) -> None:
+        """ Grava o resultado de um item e atualiza os contadores do job na mesma transação. """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO job_itens (job_id, seq, item, sucesso, resultado) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, seq, json.dumps(item), int(sucesso), json.dumps(resultado)),
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET processados = processados + 1, erros = erros + ? WHERE id = ?",
+                    (0 if sucesso else 1, job_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                # Sem o ROLLBACK a conexão compartilhada ficaria presa na transação aberta
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def count_pending(self) -> int:
+        return self.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (JOB_QUEUED, JOB_RUNNING)
+        )[0][0]
+
+    def heartbeat(self, dono: str) -> None:
+        self.execute(
+            "UPDATE jobs SET heartbeat = ? WHERE dono = ? AND status IN (?, ?)",
+            (time.time(), dono, JOB_QUEUED, JOB_RUNNING),
+        )
+
+    def reclaim_orphans(self, dono: str, stale_after: float) -> int:
+        """
+        Marca como falhos os jobs pendentes cujo processo dono morreu: processo
+        desta máquina que não existe mais, ou heartbeat parado há mais de
+        `stale_after` segundos. Jobs de outros workers vivos não são tocados.
+        """
+        limite = time.time() - stale_after
+        rows = self.execute(
+            "SELECT id, dono, heartbeat FROM jobs WHERE status IN (?, ?) AND (dono IS NULL OR dono != ?)",
+            (JOB_QUEUED, JOB_RUNNING, dono),
+        )
+        orfaos = [row['id'] for row in rows
+                  if not owner_alive(row['dono']) or (row['heartbeat'] or 0) < limite]
+        for job_id in orfaos:
+            self.execute(
+                "UPDATE jobs SET status = ?, erro = ?, finalizado_em = ? WHERE id = ? AND status IN (?, ?)",
+                (JOB_FAILED, 'Interrompido: o processo que executava o job terminou.', time.time(),
+                 job_id, JOB_QUEUED, JOB_RUNNING),
+            )
+        return len(orfaos)
+
+
+class JobContext:
+    """ Interface entregue ao handler do job: progresso, resultados e cancelamento. """
+
+    def __init__(self, store: JobStore, job_id: str, parametros: Dict[str, Any], files_dir: str):
+        self.store = store
+        self.job_id = job_id
+        self.params = parametros
+        self.files_dir = files_dir
+        self._seq = 0
+
+    def file_path(self, extension: str) -> str:
+        """ Caminho do arquivo gerado pelo job (ex.: exportação), baixado via /api/jobs/<id>/arquivo. """
+        os.makedirs(self.files_dir, exist_ok=True)
+        return os.path.join(self.files_dir, f"{self.job_id}.{extension}")
+
+    def set_total(self, total: int) -> None:
+        self.store.execute("UPDATE jobs SET total = ? WHERE id = ?", (total, self.job_id))
+
+    @property
+    def cancelled(self) -> bool:
+        return bool(self.store.execute("SELECT cancelar FROM jobs WHERE id = ?", (self.job_id,))[0][0])
+
+    def check_cancelled(self) -> None:
+        if self.cancelled:
+            raise JobCancelled()
+
+    def item_done(self, item: Any, sucesso: bool = True, resultado: Any = None) -> None:
+        """ Registra o resultado de um item e avança o progresso. """
+        self._seq += 1
+        self.store.add_item(self.job_id, self._seq, item, sucesso, resultado)
+
+
+class JobRunner:
+    """
+    Executor de jobs em segundo plano para operações em massa (transições para
+    Pós-Venda, mudança de etapas, importação, exportação, arquivamento).
+
+    Os jobs rodam num pool limitado de `max_workers` threads, fora das threads
+    das requisições; o estado e os resultados por item ficam numa tabela SQLite
+    consultada pela API /api/jobs/<id>. No máximo `max_pending` jobs podem estar
+    na fila ou executando ao mesmo tempo.
+
+    Cada job guarda o processo dono ("host:pid"), que renova um heartbeat a
+    cada `heartbeat_interval` segundos enquanto tiver jobs pendentes. Jobs cujo
+    dono morreu (ex.: worker reiniciado) não são retomados, pois podem ter feito
+    parte do trabalho: ficam marcados como falhos com os itens já registrados.
+    Os jobs de outros workers vivos (e de comandos `flask` que abrem o app) não
+    são afetados.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 20, heartbeat_interval: float = 15.0):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.heartbeat_interval = heartbeat_interval
+        self.store: Optional[JobStore] = None
+        self.files_dir: Optional[str] = None
+        self.handlers: Dict[str, Callable[[JobContext], Any]] = {}
+        self.owner = process_owner()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._submit_lock = threading.Lock()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+
+    def init_app(self, app) -> None:
+        self.max_workers = app.config.get('JOBS_MAX_WORKERS', self.max_workers)
+        self.max_pending = app.config.get('JOBS_MAX_PENDING', self.max_pending)
+        path = app.config.get('JOBS_DB_PATH') or os.path.join(app.instance_path, 'jobs.sqlite3')
+        self.store = JobStore(path)
+        self.files_dir = os.path.join(app.instance_path, 'job_files')
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        app.extensions['job_runner'] = self
+        self.store.reclaim_orphans(self.owner, self._stale_after)
+
+    @property
+    def _stale_after(self) -> float:
+        return self.heartbeat_interval * 4
+
+    def _heartbeat(self) -> None:
+        # Roda enquanto este processo tiver jobs pendentes e recolhe os órfãos de outros processos
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.store.heartbeat(self.owner)
+                self.store.reclaim_orphans(self.owner, self._stale_after)
+                with self._submit_lock:
+                    pendentes = self.store.execute(
+                        "SELECT COUNT(*) FROM jobs WHERE dono = ? AND status IN (?, ?)",
+                        (self.owner, JOB_QUEUED, JOB_RUNNING),
+                    )[0][0]
+                    if not pendentes:
+                        self._heartbeat_thread = None
+                        return
+            except Exception as e:
+                print(f"Erro ao renovar o heartbeat dos jobs: {e}")
+
+    def register(self, tipo: str):
+        """ Decorator que registra a função que executa um tipo de job. """
+        def decorator(fn: Callable[[JobContext], Any]):
+            self.handlers[tipo] = fn
+            return fn
+        return decorator
+
+    def submit(self, tipo: str, parametros: Dict[str, Any]) -> str:
+        if tipo not in self.handlers:
+            raise KeyError(f"Tipo de job desconhecido: {tipo}")
+        with self._submit_lock:
+            if self.store.count_pending() >= self.max_pending:
+                raise JobQueueFull("Muitos jobs em andamento; tente novamente em instantes.")
+            job_id = uuid.uuid4().hex
+            self.store.create(job_id, tipo, parametros, self.owner)
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+                self._heartbeat_thread.start()
+        self._executor.submit(self._run, job_id, tipo, parametros)
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """ Pede o cancelamento; o job para no próximo item. Devolve False se já terminou. """
+        job = self.store.get(job_id)
+        if job is None or job['status'] in FINISHED_STATES:
+            return False
+        self.store.execute("UPDATE jobs SET cancelar = 1 WHERE id = ?", (job_id,))
+        return True
+
+    def _finish(self, job_id: str, status: str, erro: Optional[str] = None, resultado: Any = None) -> None:
+        self.store.execute(
+            "UPDATE jobs SET status = ?, erro = ?, resultado = ?, finalizado_em = ? WHERE id = ?",
+            (status, erro, json.dumps(resultado) if resultado is not None else None, time.time(), job_id),
+        )
+
+    def _run(self, job_id: str, tipo: str, parametros: Dict[str, Any]) -> None:
+        ctx = JobContext(self.store, job_id, parametros, self.files_dir)
+        if ctx.cancelled:
+            self._finish(job_id, JOB_CANCELLED)
+            return
+        self.store.execute(
+            "UPDATE jobs SET status = ?, iniciado_em = ? WHERE id = ?", (JOB_RUNNING, time.time(), job_id)
+        )
+        try:
+            resultado = self.handlers[tipo](ctx)
+        except JobCancelled:
+            self._finish(job_id, JOB_CANCELLED)
+        except Exception as e:
+            print(f"Erro no job {tipo} ({job_id}): {e}")
+            self._finish(job_id, JOB_FAILED, erro=str(e))
+        else:
+            self._finish(job_id, JOB_DONE, resultado=resultado)
+
+    def follow_items(self, job_id: str, desde: int = 0, timeout: float = 60.0,
+                     poll_interval: float = 0.5) -> Iterator[Dict[str, Any]]:
+        """
+        Gera os resultados por item à medida que são registrados, até o job
+        terminar ou `timeout` segundos se passarem (o cliente pode retomar com ?desde=).
+        """
+        limite = time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            itens = self.store.items(job_id, desde)
+            for item in itens:
+                desde = item['seq']
+                yield item
+            if itens:
+                continue
+            if job is None or job['status'] in FINISHED_STATES or time.monotonic() > limite:
+                return
+            time.sleep(poll_interval)
+
+
+job_runner = JobRunner()
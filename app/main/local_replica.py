@@ -0,0 +1,595 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+from .queries import iter_pages
+from .services import create_supabase_client, is_connection_error
+
+# Tabelas espelhadas no SQLite local -> colunas da chave primária
+MIRRORED_TABLES: Dict[str, Tuple[str, ...]] = {
+    'clientes': ('id',),
+    'clientes_posvenda': ('id',),
+    'clientes_areas': ('cliente_id', 'area_id'),
+    'clientes_posvenda_areas': ('cliente_posvenda_id', 'area_id'),
+    'areas': ('id',),
+    'funcionarios': ('id',),
+}
+# Coluna de cada junção de áreas que aponta para o cliente
+AREA_JUNCTIONS: Dict[str, str] = {
+    'clientes_areas': 'cliente_id',
+    'clientes_posvenda_areas': 'cliente_posvenda_id',
+}
+# Tabelas com updated_at (sincronização incremental, ver sql/replica_local.sql) e a junção de áreas de cada uma
+INCREMENTAL_TABLES: Dict[str, str] = {
+    'clientes': 'clientes_areas',
+    'clientes_posvenda': 'clientes_posvenda_areas',
+}
+# Tabelas pequenas, recarregadas inteiras a cada sincronização
+REFERENCE_TABLES = ('areas', 'funcionarios')
+
+# Relações embutidas nos selects: (tabela, relação) -> (tabela embutida, coluna FK, tabela de junção)
+EMBEDS: Dict[Tuple[str, str], Tuple[str, Optional[str], Optional[str]]] = {
+    ('clientes', 'responsavel'): ('funcionarios', 'responsavel', None),
+    ('clientes_posvenda', 'responsavel'): ('funcionarios', 'responsavel', None),
+    ('clientes', 'areas'): ('areas', None, 'clientes_areas'),
+    ('clientes_posvenda', 'areas'): ('areas', None, 'clientes_posvenda_areas'),
+}
+
+FILTER_OPERATORS: Dict[str, str] = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+WRITE_METHODS = ('insert', 'update', 'upsert', 'delete')
+
+_COLUMN_RE = re.compile(r'[a-z_][a-z0-9_]*')
+_EMBED_RE = re.compile(r'([a-z_][a-z0-9_]*)\s*\(([a-z0-9_,\s*]*)\)')
+
+Call = Tuple[str, tuple, dict]
+
+
+class UnsupportedQuery(Exception):
+    """ A consulta não pode ser respondida pela réplica local (vai para o Supabase). """
+
+
+def parse_select(colunas: str) -> Tuple[List[str], Dict[str, List[str]]]:
+    """ "*, responsavel(id, nome), areas(nome)" -> (['*'], {'responsavel': ['id', 'nome'], 'areas': ['nome']}) """
+    itens, atual, nivel = [], '', 0
+    for ch in colunas:
+        nivel += (ch == '(') - (ch == ')')
+        if ch == ',' and nivel == 0:
+            itens.append(atual)
+            atual = ''
+        else:
+            atual += ch
+
+    campos: List[str] = []
+    embeds: Dict[str, List[str]] = {}
+    for item in itens + [atual]:
+        item = item.strip()
+        if not item:
+            continue
+        embed = _EMBED_RE.fullmatch(item)
+        if embed:
+            embeds[embed.group(1)] = [c.strip() for c in embed.group(2).split(',') if c.strip()]
+        elif item == '*' or _COLUMN_RE.fullmatch(item):
+            campos.append(item)
+        else:
+            # Aliases, caminhos JSON etc. ficam com o Supabase
+            raise UnsupportedQuery(item)
+    # Como no postgrest, "areas(nome)" sozinho devolve só a relação
+    return (campos or ([] if embeds else ['*'])), embeds
+
+
+def _project(row: Dict[str, Any], campos: List[str]) -> Dict[str, Any]:
+    if '*' in campos:
+        return dict(row)
+    return {campo: row.get(campo) for campo in campos}
+
+
+def replay_calls(query, calls: Iterable[Call]):
+    """ Reaplica as chamadas gravadas num builder do postgrest. """
+    for metodo, args, kwargs in calls:
+        query = getattr(query, metodo)(*args, **kwargs)
+    return query
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+class LocalResponse:
+    """ Mesmo formato da resposta do postgrest (`.data`, `.count`). """
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class LocalQuery:
+    """
+    Grava as chamadas do builder (select, eq, order, range, update...) e, no
+    execute(), responde as leituras pelo SQLite local e envia as escritas ao
+    Supabase. O que a réplica não sabe responder é repassado ao Supabase.
+    """
+
+    def __init__(self, replica: 'LocalReplica', tabela: str):
+        self._replica = replica
+        self._tabela = tabela
+        self._calls: List[Call] = []
+
+    def __getattr__(self, metodo: str):
+        if metodo.startswith('_'):
+            raise AttributeError(metodo)
+
+        def record(*args, **kwargs):
+            self._calls.append((metodo, args, kwargs))
+            return self
+        return record
+
+    def execute(self):
+        if any(metodo in WRITE_METHODS for metodo, _, _ in self._calls):
+            return self._replica.execute_write(self._tabela, self._calls)
+        try:
+            return self._replica.execute_read(self._tabela, self._calls)
+        except UnsupportedQuery:
+            return replay_calls(self._replica.remote().table(self._tabela), self._calls).execute()
+
+
+class LocalClient:
+    """ Substitui o cliente Supabase nas rotas: tabelas espelhadas vão para a réplica local, o resto para o Supabase. """
+
+    def __init__(self, replica: 'LocalReplica'):
+        self._replica = replica
+
+    def table(self, tabela: str):
+        if tabela in MIRRORED_TABLES:
+            return LocalQuery(self._replica, tabela)
+        return self._replica.remote().table(tabela)
+
+    def __getattr__(self, name: str):
+        return getattr(self._replica.remote(), name)
+
+
+class LocalReplica:
+    """
+    Réplica local (SQLite) das tabelas do CRM para o modo desktop (pywebview),
+    para que as telas não esperem uma ida e volta ao Supabase a cada clique.
+
+    - na primeira execução, copia clientes, clientes_posvenda, as junções de
+      áreas, areas e funcionarios para o arquivo local;
+    - a cada `sync_interval` segundos, envia as escritas pendentes (outbox) e
+      busca só as linhas com updated_at >= última marca (menos `overlap`
+      segundos, para pegar transações que confirmaram atrasadas); as áreas
+      dos clientes alterados são buscadas de novo;
+    - a cada `full_sync_interval` segundos, recarrega tudo (remove localmente
+      o que foi apagado no banco, ex.: leads arquivados);
+    - as leituras das rotas são respondidas pelo SQLite; as escritas vão ao
+      Supabase e o resultado é aplicado na réplica na hora. Sem conexão, as
+      atualizações / exclusões (e inserções com chave, como as áreas) são
+      aplicadas localmente e ficam na outbox até a próxima sincronização.
+      Novos leads precisam do id gerado pelo banco, então exigem conexão.
+
+    Sem a coluna updated_at no banco, toda sincronização é completa.
+    """
+
+    def __init__(self, sync_interval: float = 30.0, full_sync_interval: float = 3600.0,
+                 overlap: float = 60.0, page_size: int = 1000):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self.overlap = overlap
+        self.page_size = page_size
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._remote: Optional[Client] = None
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config.get('LOCAL_REPLICA_ENABLED', self.enabled)
+        self.sync_interval = app.config.get('LOCAL_REPLICA_SYNC_INTERVAL', self.sync_interval)
+        self.full_sync_interval = app.config.get('LOCAL_REPLICA_FULL_SYNC_INTERVAL', self.full_sync_interval)
+        self.path = app.config.get('LOCAL_REPLICA_PATH') or os.path.join(app.instance_path, 'replica_local.sqlite3')
+        app.extensions['local_replica'] = self
+        if self.enabled:
+            self.open()
+            self.start()
+
+    def open(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sincronizacao (
+                tabela         TEXT PRIMARY KEY,
+                marca          TEXT,
+                completa_em    REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+                tabela     TEXT NOT NULL,
+                chamadas   TEXT NOT NULL,
+                criado_em  REAL NOT NULL
+            );
+        """)
+        for tabela, chave in MIRRORED_TABLES.items():
+            existentes = {row[1] for row in conn.execute(f'PRAGMA table_info("{tabela}")')}
+            if existentes and not set(chave) <= existentes:
+                # Cópia de uma versão anterior com outra chave: descarta e força a sincronização completa
+                conn.execute(f'DROP TABLE "{tabela}"')
+                conn.execute("DELETE FROM sincronizacao WHERE tabela IN "
+                             f"({', '.join('?' * len(INCREMENTAL_TABLES))})", tuple(INCREMENTAL_TABLES))
+            colunas = ', '.join(f'{coluna} INTEGER NOT NULL' for coluna in chave)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{tabela}" ({colunas}, dados TEXT NOT NULL, '
+                         f'PRIMARY KEY ({", ".join(chave)}))')
+        self._conn = conn
+
+    @property
+    def ready(self) -> bool:
+        """ Já existe uma cópia completa no disco (de uma execução anterior ou da primeira sincronização). """
+        if not self.enabled or self._conn is None:
+            return False
+        with self._lock:
+            sincronizadas = self._conn.execute("SELECT COUNT(*) FROM sincronizacao").fetchone()[0]
+        return sincronizadas >= len(INCREMENTAL_TABLES)
+
+    def client(self) -> LocalClient:
+        return LocalClient(self)
+
+    def remote(self) -> Client:
+        if self._remote is None:
+            self._remote = create_supabase_client()
+            if self._remote is None:
+                raise RuntimeError("SUPABASE_URL / SUPABASE_KEY não configurados.")
+        return self._remote
+
+    # --- Leitura local ---
+
+    def _expr(self, tabela: str, coluna: str) -> str:
+        if not _COLUMN_RE.fullmatch(coluna):
+            raise UnsupportedQuery(coluna)
+        if coluna in MIRRORED_TABLES[tabela]:
+            return coluna
+        return f"json_extract(dados, '$.{coluna}')"
+
+    def _compile(self, tabela: str, calls: Iterable[Call]) -> Tuple[str, List[Any], bool]:
+        """ Traduz as chamadas do builder em SQL. Retorna (sql, parâmetros, single). """
+        where, params, order = [], [], []
+        limit, offset, single = -1, 0, False
+        for metodo, args, kwargs in calls:
+            if metodo in WRITE_METHODS:
+                continue
+            if metodo == 'select':
+                if kwargs:
+                    raise UnsupportedQuery(f"select({kwargs})")
+            elif metodo in FILTER_OPERATORS and not kwargs:
+                coluna, valor = args
+                where.append(f"{self._expr(tabela, coluna)} {FILTER_OPERATORS[metodo]} ?")
+                params.append(valor)
+            elif metodo == 'in_' and not kwargs:
+                coluna, valores = args
+                valores = list(valores)
+                where.append(f"{self._expr(tabela, coluna)} IN ({', '.join('?' * len(valores))})"
+                             if valores else "0")
+                params.extend(valores)
+            elif metodo == 'order' and set(kwargs) <= {'desc'}:
+                # Mesma ordem de nulos do Postgres: por último no ASC, primeiro no DESC
+                expr = self._expr(tabela, args[0])
+                direcao = 'DESC' if kwargs.get('desc') else 'ASC'
+                order.append(f"({expr} IS NULL) {direcao}, {expr} {direcao}")
+            elif metodo == 'range':
+                offset, limit = args[0], args[1] - args[0] + 1
+            elif metodo == 'limit':
+                limit = args[0]
+            elif metodo == 'single':
+                single = True
+            else:
+                raise UnsupportedQuery(metodo)
+
+        sql = f'SELECT dados FROM "{tabela}"'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY ' + ', '.join(order + list(MIRRORED_TABLES[tabela]))
+        sql += f' LIMIT {int(limit)} OFFSET {int(offset)}'
+        return sql, params, single
+
+    def _where_in(self, tabela: str, colunas: str, coluna: str, valores: Iterable[Any]) -> List[tuple]:
+        valores = list(valores)
+        rows = []
+        for inicio in range(0, len(valores), 500):
+            lote = valores[inicio:inicio + 500]
+            rows.extend(self._conn.execute(
+                f'SELECT {colunas} FROM "{tabela}" WHERE {coluna} IN ({", ".join("?" * len(lote))})', lote))
+        return rows
+
+    def _projected_by_id(self, tabela: str, ids: Iterable[Any], colunas: List[str]) -> Dict[int, Dict[str, Any]]:
+        return {row_id: _project(json.loads(dados), colunas)
+                for row_id, dados in self._where_in(tabela, 'id, dados', 'id', ids)}
+
+    def _embed(self, tabela: str, raw: List[Dict[str, Any]], embeds: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        """
+        Resolve responsavel(...) (FK) e areas(...) (M:N) como o postgrest faria.
+        Cada funcionário / área é projetado uma vez e o mesmo dict é usado em
+        todas as linhas (como no cache de leitura, quem consome não altera).
+        """
+        valores: List[Dict[str, Any]] = [{} for _ in raw]
+        for nome, colunas in embeds.items():
+            if (tabela, nome) not in EMBEDS:
+                raise UnsupportedQuery(nome)
+            destino, fk, juncao = EMBEDS[(tabela, nome)]
+            if juncao is None:
+                alvo = self._projected_by_id(destino, {row.get(fk) for row in raw if row.get(fk) is not None}, colunas)
+                for row, extra in zip(raw, valores):
+                    extra[nome] = alvo.get(row.get(fk))
+            else:
+                fk_cliente = AREA_JUNCTIONS[juncao]
+                ligacoes = self._where_in(juncao, f'{fk_cliente}, area_id', fk_cliente, {row['id'] for row in raw})
+                alvo = self._projected_by_id(destino, {area_id for _, area_id in ligacoes}, colunas)
+                por_cliente = defaultdict(list)
+                for cliente_id, area_id in ligacoes:
+                    if area_id in alvo:
+                        por_cliente[cliente_id].append(alvo[area_id])
+                for row, extra in zip(raw, valores):
+                    extra[nome] = por_cliente.get(row.get('id'), [])
+        return valores
+
+    def execute_read(self, tabela: str, calls: List[Call]) -> LocalResponse:
+        select = next((args for metodo, args, _ in calls if metodo == 'select'), ())
+        campos, embeds = parse_select(','.join(select) or '*')
+        sql, params, single = self._compile(tabela, calls)
+
+        with self._lock:
+            raw = [json.loads(dados) for (dados,) in self._conn.execute(sql, params)]
+            extras = self._embed(tabela, raw, embeds) if embeds else [{} for _ in raw]
+        data = [{**_project(row, campos), **extra} for row, extra in zip(raw, extras)]
+
+        if single:
+            if len(data) != 1:
+                # Pode ter sido criado depois da última sincronização: o Supabase responde (ou dá o erro)
+                raise UnsupportedQuery('single')
+            return LocalResponse(data[0])
+        return LocalResponse(data)
+
+    # --- Escrita ---
+
+    def _key(self, tabela: str, row: Dict[str, Any]) -> Optional[Tuple[int, ...]]:
+        try:
+            return tuple(int(row[coluna]) for coluna in MIRRORED_TABLES[tabela])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _upsert_rows(self, tabela: str, rows: Iterable[Dict[str, Any]], merge: bool = False) -> None:
+        chave = MIRRORED_TABLES[tabela]
+        sql = (f'INSERT OR REPLACE INTO "{tabela}" ({", ".join(chave)}, dados) '
+               f'VALUES ({", ".join("?" * (len(chave) + 1))})')
+        for row in rows:
+            key = self._key(tabela, row)
+            if key is None:
+                continue
+            if merge:
+                atual = self._conn.execute(
+                    f'SELECT dados FROM "{tabela}" WHERE ' + ' AND '.join(f'{c} = ?' for c in chave), key).fetchone()
+                row = {**(json.loads(atual[0]) if atual else {}), **row}
+            self._conn.execute(sql, (*key, json.dumps(row, default=str)))
+
+    def _delete_rows(self, tabela: str, rows: Iterable[Dict[str, Any]]) -> None:
+        chave = MIRRORED_TABLES[tabela]
+        sql = f'DELETE FROM "{tabela}" WHERE ' + ' AND '.join(f'{c} = ?' for c in chave)
+        for row in rows:
+            key = self._key(tabela, row)
+            if key is not None:
+                self._conn.execute(sql, key)
+
+    def _apply(self, tabela: str, metodo: str, rows: List[Dict[str, Any]], merge: bool = False) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if metodo == 'delete':
+                    self._delete_rows(tabela, rows)
+                else:
+                    self._upsert_rows(tabela, rows, merge)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _apply_offline(self, tabela: str, metodo: str, payload: Any, calls: List[Call]) -> List[Dict[str, Any]]:
+        """ Aplica localmente uma escrita que não chegou ao Supabase. """
+        if metodo in ('insert', 'upsert'):
+            rows = payload if isinstance(payload, list) else [payload]
+            self._apply(tabela, metodo, rows, merge=True)
+            return rows
+        sql, params, _ = self._compile(tabela, calls)
+        with self._lock:
+            rows = [json.loads(dados) for (dados,) in self._conn.execute(sql, params)]
+        if metodo == 'update':
+            rows = [{**row, **payload} for row in rows]
+        self._apply(tabela, metodo, rows)
+        return rows
+
+    def _queueable(self, tabela: str, metodo: str, payload: Any) -> bool:
+        if tabela not in MIRRORED_TABLES:
+            return False
+        if metodo in ('update', 'delete'):
+            return True
+        # Inserções só com a chave completa (o id de um lead novo vem do banco)
+        rows = payload if isinstance(payload, list) else [payload]
+        return all(self._key(tabela, row) is not None for row in rows)
+
+    def execute_write(self, tabela: str, calls: List[Call]):
+        metodo, args, _ = next(call for call in calls if call[0] in WRITE_METHODS)
+        payload = args[0] if args else None
+        try:
+            response = replay_calls(self.remote().table(tabela), calls).execute()
+        except Exception as e:
+            if not is_connection_error(e) or not self._queueable(tabela, metodo, payload):
+                raise
+            rows = self._apply_offline(tabela, metodo, payload, calls)
+            self._enqueue(tabela, calls)
+            print(f"Sem conexão com o Supabase: escrita em {tabela} guardada para envio ({e})")
+            return LocalResponse(rows)
+
+        self._apply(tabela, metodo, [row for row in response.data or [] if isinstance(row, dict)])
+        return response
+
+    # --- Outbox ---
+
+    def _enqueue(self, tabela: str, calls: List[Call]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (tabela, chamadas, criado_em) VALUES (?, ?, ?)",
+                (tabela, json.dumps([[metodo, list(args), kwargs] for metodo, args, kwargs in calls], default=str),
+                 time.time()),
+            )
+
+    def pending_writes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def push(self, supabase: Client) -> int:
+        """ Envia as escritas feitas sem conexão, na ordem. Para na primeira falha de rede. """
+        with self._lock:
+            pendentes = self._conn.execute("SELECT seq, tabela, chamadas FROM outbox ORDER BY seq").fetchall()
+        enviados = 0
+        for seq, tabela, chamadas in pendentes:
+            try:
+                replay_calls(supabase.table(tabela), json.loads(chamadas)).execute()
+                enviados += 1
+            except Exception as e:
+                if is_connection_error(e):
+                    raise
+                # Rejeitada pelo banco (ex.: registro apagado por outro usuário): não adianta reenviar
+                print(f"Escrita local em {tabela} descartada: {e}")
+            with self._lock:
+                self._conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+        return enviados
+
+    # --- Sincronização ---
+
+    def _state(self, tabela: str) -> Tuple[Optional[str], float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT marca, completa_em FROM sincronizacao WHERE tabela = ?", (tabela,)).fetchone()
+        return row if row else (None, 0.0)
+
+    def _replace(self, tabela: str, rows: List[Dict[str, Any]],
+                 clientes: Optional[List[int]] = None) -> None:
+        """ Troca o conteúdo da tabela (ou só as linhas dos `clientes` informados, nas junções). """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if clientes is None:
+                    self._conn.execute(f'DELETE FROM "{tabela}"')
+                else:
+                    for inicio in range(0, len(clientes), 500):
+                        lote = clientes[inicio:inicio + 500]
+                        self._conn.execute(
+                            f'DELETE FROM "{tabela}" WHERE {AREA_JUNCTIONS[tabela]} IN ({", ".join("?" * len(lote))})',
+                            lote)
+                self._upsert_rows(tabela, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _save_state(self, tabela: str, marca: Optional[str], completa_em: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sincronizacao (tabela, marca, completa_em) VALUES (?, ?, ?)",
+                (tabela, marca, completa_em))
+
+    def pull(self, supabase: Client) -> int:
+        """ Busca as mudanças do Supabase. Retorna o número de clientes recebidos. """
+        recebidas = 0
+        for tabela in REFERENCE_TABLES:
+            rows = list(iter_pages(lambda: supabase.table(tabela).select('*').order('id'), self.page_size))
+            self._replace(tabela, rows)
+
+        for tabela, juncao in INCREMENTAL_TABLES.items():
+            marca, completa_em = self._state(tabela)
+            desde = _parse_timestamp(marca)
+            completa = desde is None or time.time() - completa_em >= self.full_sync_interval
+
+            if completa:
+                rows = list(iter_pages(lambda: supabase.table(tabela).select('*').order('id'), self.page_size))
+                areas = list(iter_pages(
+                    lambda: supabase.table(juncao).select('*').order(AREA_JUNCTIONS[juncao]).order('area_id'),
+                    self.page_size))
+                self._replace(tabela, rows)
+                self._replace(juncao, areas)
+            else:
+                inicio = (desde - timedelta(seconds=self.overlap)).isoformat()
+                rows = list(iter_pages(
+                    lambda: supabase.table(tabela).select('*').gte('updated_at', inicio)
+                        .order('updated_at').order('id'), self.page_size))
+                ids = [int(row['id']) for row in rows]
+                areas = []
+                for lote in range(0, len(ids), 200):
+                    areas.extend(supabase.table(juncao).select('*')
+                                 .in_(AREA_JUNCTIONS[juncao], ids[lote:lote + 200]).execute().data)
+                self._apply(tabela, 'upsert', rows)
+                self._replace(juncao, areas, clientes=ids)
+
+            marcas = [m for m in (_parse_timestamp(row.get('updated_at')) for row in rows) if m is not None]
+            if desde is not None:
+                marcas.append(desde)
+            nova_marca = max(marcas).isoformat() if marcas else None
+            self._save_state(tabela, nova_marca, time.time() if completa else completa_em)
+            recebidas += len(rows)
+        return recebidas
+
+    def sync(self) -> Tuple[int, int]:
+        """ Envia a outbox e busca as mudanças. Retorna (escritas enviadas, clientes recebidos). """
+        supabase = self.remote()
+        enviadas = self.push(supabase)
+        return enviadas, self.pull(supabase)
+
+    def request_sync(self) -> None:
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            try:
+                inicio = time.monotonic()
+                enviadas, recebidas = self.sync()
+                if enviadas or recebidas:
+                    print(f"Réplica local: {enviadas} escritas enviadas, {recebidas} clientes recebidos "
+                          f"em {time.monotonic() - inicio:.1f}s")
+            except Exception as e:
+                if is_connection_error(e):
+                    print(f"Réplica local sem conexão com o Supabase: {e}")
+                else:
+                    print(f"Erro ao sincronizar a réplica local: {e}")
+            self._wakeup.wait(self.sync_interval)
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='local-replica', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+
+
+local_replica = LocalReplica()
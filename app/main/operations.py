@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+from .audit import ACTION_CREATE, ACTION_UPDATE, audit_writer
+from .dedup import DuplicateLeadError, dedup_index
+from .queries import ARCHIVED_STAGE
+from .rollups import METRIC_NEW_LEADS, METRIC_POST_SALE, METRIC_TRANSITIONS, rollup_store
+from .write_behind import stage_queue
+
+# Primeira etapa do funil de Pós-Venda
+POST_SALE_FIRST_STAGE: str = 'Entrega Realizada'
+
+# Tabelas de cliente e suas tabelas de junção com 'areas'
+STAGE_TABLES = ('clientes', 'clientes_posvenda')
+
+
+# --- Operações de escrita compartilhadas pelas rotas e pelos jobs em segundo plano ---
+
+def create_lead(supabase: Client, data: Dict[str, Any], check_duplicates: bool = True) -> Dict[str, Any]:
+    """
+    Cria um lead com suas áreas (M:N) e devolve o registro criado, com
+    'areas' (nomes) e 'responsavel_nome'. Levanta ValueError para dados inválidos
+    e DuplicateLeadError se empresa, e-mail ou telefone já estiverem cadastrados
+    (a menos que `check_duplicates` seja False).
+    """
+    area_names = data.get('areas', [])
+    responsavel_id = data.get('responsavel')
+
+    # --- Verifica duplicados (índice em memória, sem ida ao banco) ---
+    dedup_index.ensure_loaded()
+    if check_duplicates and dedup_index.enabled and dedup_index.loaded:
+        matches = dedup_index.find_matches(data)
+        if matches:
+            raise DuplicateLeadError(matches)
+
+    # --- Valida o funcionário ---
+    if responsavel_id:
+        resp_func = supabase.table('funcionarios').select('id, nome').eq('id', responsavel_id).single().execute()
+        if not resp_func.data:
+            raise ValueError('Funcionário responsável não encontrado.')
+        responsavel_nome = resp_func.data['nome']
+    else:
+        responsavel_nome = None
+
+    # --- Prepara dados do cliente ---
+    new_lead_data = {
+        'nome_contato': data.get('nome_contato'),
+        'nome_empresa': data.get('nome_empresa'),
+        'email': data.get('email'),
+        'telefone': data.get('telefone'),
+        'responsavel': responsavel_id,
+        'etapa': data.get('etapa', 'Aguardando retorno'),
+    }
+
+    # --- Insere o cliente ---
+    response_cliente = supabase.table('clientes').insert(new_lead_data).execute()
+    if not response_cliente.data:
+        raise RuntimeError('Falha ao criar cliente.')
+
+    new_lead = response_cliente.data[0]
+    new_lead_id = new_lead['id']
+
+    # --- Processa as Áreas (M:N) ---
+    area_ids = []
+    if area_names:
+        response_areas = supabase.table('areas').select('id, nome').in_('nome', area_names).execute()
+        area_id_map = {area['nome']: area['id'] for area in response_areas.data}
+        area_ids = [area_id_map[name] for name in area_names if name in area_id_map]
+
+        junction_data_to_insert = [
+            {'cliente_id': new_lead_id, 'area_id': area_id} for area_id in area_ids
+        ]
+
+        if junction_data_to_insert:
+            supabase.table('clientes_areas').insert(junction_data_to_insert).execute()
+
+    dedup_index.add('clientes', new_lead)
+    rollup_store.remember('clientes', new_lead_id, responsavel_id, area_ids)
+    rollup_store.record(METRIC_NEW_LEADS, responsavel_id, area_ids)
+
+    new_lead['areas'] = area_names
+    new_lead['responsavel_nome'] = responsavel_nome  # retorna também o nome do funcionário
+
+    depois = {**new_lead_data, 'areas': area_names}
+    audit_writer.record(
+        'clientes', new_lead_id, ACTION_CREATE, f"Lead criado na etapa '{new_lead_data['etapa']}'",
+        # Campos vazios no 'antes': a página de histórico lista os valores iniciais
+        antes={campo: None for campo in depois}, depois=depois,
+    )
+    return new_lead
+
+
+def move_lead_to_post_sale(supabase: Client, lead_id: int) -> int:
+    """
+    Copia um lead (e suas áreas) para 'clientes_posvenda' e arquiva o original.
+    Devolve o id do novo cliente de Pós-Venda. Levanta LookupError se o lead não existir.
+    """
+    # 1. BUSCAR lead original (Tabela: clientes)
+    # Selecionamos todas as colunas que coincidem com clientes_posvenda
+    lead_response = supabase.table('clientes').select('nome_empresa, nome_contato, email, telefone, responsavel, created_at, etapa').eq('id', lead_id).single().execute()
+    area_response = supabase.table('clientes_areas').select('area_id').eq('cliente_id', lead_id).execute()
+    lead_data = lead_response.data
+
+    if not lead_data:
+        raise LookupError("Lead não encontrado para transição")
+
+    # 2. PREPARAR DADOS para Inserção (Tabela: clientes_posvenda)
+    # Como as colunas são as mesmas (etapa, nome_empresa, etc.),
+    # podemos reutilizar a maioria dos dados e apenas ajustar o essencial.
+    new_client_data = {
+        'nome_empresa': lead_data.get('nome_empresa'),
+        'nome_contato': lead_data.get('nome_contato'),
+        'email': lead_data.get('email'),
+        'telefone': lead_data.get('telefone'),
+        'responsavel': lead_data.get('responsavel'), # Assumindo que este é o ID do responsável
+
+        # ATENÇÃO: Define a primeira etapa do Pós-Venda
+        'etapa': POST_SALE_FIRST_STAGE,
+
+        # Opcional: Manter o created_at original ou adicionar uma data_transicao
+        # 'created_at': lead_data.get('created_at')
+    }
+
+    # 3. INSERIR na tabela clientes_posvenda
+    result = supabase.table('clientes_posvenda').insert(new_client_data).execute()
+    new_client_id = result.data[0]['id']
+
+    # 4. AÇÃO NO LEAD ORIGINAL (Tabela: clientes)
+    # Atualiza a etapa para "Arquivado"; o job de arquivamento o move para a tabela fria.
+    stage_queue.discard('clientes', lead_id)
+    supabase.table('clientes').update({'etapa': ARCHIVED_STAGE}).eq('id', lead_id).execute()
+
+    areas_to_insert = [
+        {
+            'cliente_posvenda_id': new_client_id,
+            'area_id': area['area_id']
+        }
+        # Percorre os IDs de área do lead original (area_response.data)
+        for area in area_response.data
+    ]
+    if areas_to_insert:
+        supabase.table('clientes_posvenda_areas').insert(areas_to_insert).execute()
+
+    dedup_index.remove('clientes', lead_id)
+    dedup_index.add('clientes_posvenda', {'id': new_client_id, **new_client_data})
+
+    area_ids = [area['area_id'] for area in area_response.data]
+    rollup_store.remember('clientes_posvenda', new_client_id, lead_data.get('responsavel'), area_ids)
+    rollup_store.record(METRIC_POST_SALE, lead_data.get('responsavel'), area_ids)
+
+    audit_writer.record(
+        'clientes', lead_id, ACTION_UPDATE,
+        f"Lead movido para o Pós-Venda (cliente #{new_client_id})",
+        antes={'etapa': lead_data.get('etapa')}, depois={'etapa': ARCHIVED_STAGE},
+    )
+    audit_writer.record(
+        'clientes_posvenda', new_client_id, ACTION_CREATE, f"Cliente criado a partir do lead #{lead_id}",
+        antes={campo: None for campo in new_client_data}, depois=new_client_data,
+    )
+    return new_client_id
+
+
+def update_stages(supabase: Client, tabela: str, lead_ids: List[int], etapa: str) -> List[int]:
+    """ Move vários leads para a mesma etapa com um único UPDATE. Devolve os IDs atualizados. """
+    if tabela not in STAGE_TABLES:
+        raise ValueError(f"Tabela inválida: {tabela}")
+    for lead_id in lead_ids:
+        stage_queue.discard(tabela, lead_id)
+    # Etapas anteriores, para o histórico (só roda nos jobs, fora das requisições)
+    antes = supabase.table(tabela).select('id, etapa').in_('id', lead_ids).execute()
+    etapas_antes = {row['id']: row['etapa'] for row in antes.data}
+
+    response = supabase.table(tabela).update({'etapa': etapa}).in_('id', lead_ids).execute()
+    atualizados = [row['id'] for row in response.data]
+    for lead_id in atualizados:
+        record_stage_change(tabela, lead_id, etapas_antes.get(lead_id), etapa)
+    return atualizados
+
+
+def record_stage_change(tabela: str, lead_id: int, etapa_antes: Optional[str], etapa: str) -> None:
+    """ Registra no histórico (e nos rollups) uma mudança de etapa (drag-and-drop ou em massa). """
+    if etapa_antes:
+        detalhes = f"Etapa alterada de '{etapa_antes}' para '{etapa}'"
+    else:
+        detalhes = f"Etapa alterada para '{etapa}'"
+    audit_writer.record(tabela, lead_id, ACTION_UPDATE, detalhes,
+                        antes={'etapa': etapa_antes}, depois={'etapa': etapa})
+    rollup_store.record_for(METRIC_TRANSITIONS, tabela, lead_id)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Etapa usada para leads que já viraram clientes de Pós-Venda
+ARCHIVED_STAGE: str = 'Venda Concluída - ARQUIVADO'
+
+BOARD_COLUMNS: str = "id, nome_empresa, nome_contato, etapa, responsavel(id, nome), created_at, areas(nome)"
+CLIENT_LIST_COLUMNS: str = "id, nome_empresa, nome_contato, email, telefone, responsavel, etapa, created_at, areas(nome)"
+DASHBOARD_COLUMNS: str = "id, nome_empresa, responsavel, etapa, created_at"
+
+
+# --- Helpers ---
+
+def get_employees_map(supabase: Client) -> Dict[int, str]:
+    """ Busca todos os funcionários e retorna um mapa {id: nome} """
+    try:
+        response = supabase.table('funcionarios').select("id, nome").execute()
+        return {emp['id']: emp['nome'] for emp in response.data}
+    except Exception as e:
+        print(f"Erro ao buscar mapa de funcionários: {e}")
+        return {}
+
+
+def flatten_areas(row: Dict[str, Any]) -> Dict[str, Any]:
+    """ Converte areas=[{'nome': ...}] (junção M:N) em uma lista de nomes. """
+    if row.get('areas') and isinstance(row['areas'], list):
+        row['areas'] = [area['nome'] for area in row['areas'] if 'nome' in area]
+    else:
+        row['areas'] = []
+    return row
+
+
+def iter_pages(build_query: Callable[[], Any], page_size: int = 500,
+               call: Optional[Callable[[Callable[[], Any]], Any]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Percorre uma consulta página a página com .range(), devolvendo uma linha
+    por vez. `build_query` deve montar uma consulta nova a cada chamada (os
+    builders do postgrest são mutáveis); `call` permite passar cada página pelo
+    circuit breaker / retries.
+    """
+    start = 0
+    while True:
+        fetch = lambda: build_query().range(start, start + page_size - 1).execute().data
+        rows = call(fetch) if call else fetch()
+        yield from rows
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+
+# --- Consultas de leitura (usadas pelas views e pelo cache de leitura) ---
+# Cada função recebe o cliente Supabase, faz as consultas e devolve os dados
+# já no formato do template. Os resultados podem ser compartilhados entre
+# requisições pelo cache, então as views não devem alterá-los.
+
+def load_leads_board(supabase: Client) -> List[Dict[str, Any]]:
+    """ Leads do Kanban de vendas (M:N de áreas já achatado). """
+    # Leads já vendidos ficam fora do quadro (e saem da tabela com o job de arquivamento)
+    response = supabase.table('clientes').select(BOARD_COLUMNS) \
+        .neq('etapa', ARCHIVED_STAGE).order('created_at', desc=True).execute()
+    return [flatten_areas(lead) for lead in response.data]
+
+
+def load_posvenda_board(supabase: Client) -> List[Dict[str, Any]]:
+    """ Clientes do Kanban de Pós-Venda. """
+    response = supabase.table('clientes_posvenda').select(BOARD_COLUMNS) \
+        .order('created_at', desc=True).execute()
+    return [flatten_areas(lead) for lead in response.data]
+
+
+def iter_client_list(supabase: Client, page_size: int = 500,
+                     call: Optional[Callable] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Lista unificada de Leads ativos e clientes de Pós-Venda, com o nome do
+    responsável, lida em páginas (usada pelo streaming de /clientes).
+    """
+    employee_map = get_employees_map(supabase)
+
+    # Note que aqui não podemos usar responsavel(id, nome), por isso usamos o employee_map
+    sources = (
+        ('Lead', lambda: supabase.table('clientes').select(CLIENT_LIST_COLUMNS)
+            .neq('etapa', ARCHIVED_STAGE).order('nome_empresa', desc=False).order('id')),
+        ('Pós-Venda', lambda: supabase.table('clientes_posvenda').select(CLIENT_LIST_COLUMNS)
+            .order('nome_empresa', desc=False).order('id')),
+    )
+    for tipo, build_query in sources:
+        for cliente in iter_pages(build_query, page_size, call):
+            cliente['tipo'] = tipo
+            flatten_areas(cliente)
+            responsavel_id = cliente.get('responsavel')
+            cliente['responsavel_nome'] = employee_map.get(responsavel_id) if responsavel_id else 'N/A'
+            yield cliente
+
+
+def load_dashboard(supabase: Client) -> Dict[str, Any]:
+    """ Métricas da Central de Negócios (Leads ativos + Pós-Venda). """
+    # Necessário para converter o ID do responsável para o nome (na lista de recentes e contagem)
+    employee_map = get_employees_map(supabase)
+
+    # Busca leads ativos (excluindo os arquivados) com os campos mínimos necessários
+    leads_raw = supabase.table('clientes').select(DASHBOARD_COLUMNS) \
+        .order('created_at', desc=True).neq('etapa', ARCHIVED_STAGE).execute().data
+    posvenda_raw = supabase.table('clientes_posvenda').select(DASHBOARD_COLUMNS) \
+        .order('created_at', desc=True).execute().data
+
+    clientes_unificados = []
+    for lead in leads_raw:
+        lead['tipo'] = 'Lead'
+        clientes_unificados.append(lead)
+    for client in posvenda_raw:
+        client['tipo'] = 'Pós-Venda'
+        # Renomeia o ID para 'posvenda_id' para evitar conflito no template
+        client['posvenda_id'] = client.pop('id')
+        clientes_unificados.append(client)
+
+    # Mais recente primeiro: garante que os 'recentes_leads' sejam os mais atuais
+    clientes_unificados.sort(key=lambda x: x.get('created_at') or '', reverse=True)
+
+    dashboard_data = {
+        'total_leads': len(clientes_unificados),
+        'contagem_etapas': Counter(c.get('etapa') for c in clientes_unificados if c.get('etapa')),
+        'contagem_responsaveis': [],
+        'recentes_leads': [],
+    }
+
+    contagem_id = Counter(
+        c.get('responsavel') for c in clientes_unificados if c.get('responsavel')
+    ).most_common(5)
+    dashboard_data['contagem_responsaveis'] = [
+        (employee_map.get(responsavel_id, f"ID {responsavel_id} Desconhecido"), contagem)
+        for responsavel_id, contagem in contagem_id
+    ]
+
+    for lead in clientes_unificados[:5]:
+        lead['responsavel_nome'] = employee_map.get(lead.get('responsavel'), 'N/A')
+        dashboard_data['recentes_leads'].append(lead)
+
+    return dashboard_data
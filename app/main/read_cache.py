@@ -0,0 +1,256 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class CircuitOpenError(Exception):
+    """ Levantada quando o circuito está aberto e a chamada nem é tentada. """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker simples para as chamadas ao Supabase.
+
+    - fechado: as chamadas passam normalmente;
+    - aberto: depois de `failure_threshold` falhas seguidas, as chamadas falham
+      na hora (CircuitOpenError) durante `reset_timeout` segundos;
+    - meio-aberto: passado esse tempo, uma única chamada de teste é liberada;
+      se der certo o circuito fecha, se falhar abre de novo.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'fechado'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'meio-aberto'
+            return 'aberto'
+
+    def _before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                raise CircuitOpenError("Supabase indisponível (circuito aberto).")
+            self._probing = True
+
+    def _on_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def _on_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        self._before_call()
+        try:
+            result = fn()
+        except Exception:
+            self._on_failure()
+            raise
+        self._on_success()
+        return result
+
+
+def call_with_retry(fn: Callable[[], Any], breaker: Optional[CircuitBreaker] = None,
+                    attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0) -> Any:
+    """
+    Executa `fn` com até `attempts` tentativas, esperando entre elas um
+    backoff exponencial com jitter completo. Não tenta de novo quando o
+    circuito está aberto: nesse caso o erro sobe imediatamente.
+    """
+    for attempt in range(attempts):
+        try:
+            return breaker.call(fn) if breaker else fn()
+        except CircuitOpenError:
+            raise
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base_delay * (2 ** attempt))))
+
+
+class ReadThroughCache:
+    """
+    Cache de leitura com semântica stale-while-revalidate.
+
+    `get(key, loader)` devolve (dados, is_stale):
+    - até `ttl` segundos: dado fresco, sem ir ao banco;
+    - até `stale_ttl` segundos: devolve o dado antigo na hora e recarrega em
+      segundo plano (uma recarga por chave). Se a última recarga falhou ou o
+      circuito está aberto, o dado antigo já volta marcado como stale;
+    - depois disso, ou sem dado: carrega de forma síncrona. Se o banco falhar
+      e houver um último valor válido, ele é devolvido marcado como stale.
+
+    Todas as cargas passam pelo circuit breaker e por `call_with_retry`.
+    """
+
+    def __init__(self, ttl: float = 15.0, stale_ttl: float = 300.0,
+                 breaker: Optional[CircuitBreaker] = None, retry_attempts: int = 3):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.retry_attempts = retry_attempts
+        self.breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[Any, float]] = {}
+        self._refreshing: set = set()
+        self._failed: set = set()
+
+    def init_app(self, app) -> None:
+        self.ttl = app.config.get('READ_CACHE_TTL', self.ttl)
+        self.stale_ttl = app.config.get('READ_CACHE_STALE_TTL', self.stale_ttl)
+        self.retry_attempts = app.config.get('READ_CACHE_RETRY_ATTEMPTS', self.retry_attempts)
+        self.breaker.failure_threshold = app.config.get('CIRCUIT_FAILURE_THRESHOLD', self.breaker.failure_threshold)
+        self.breaker.reset_timeout = app.config.get('CIRCUIT_RESET_TIMEOUT', self.breaker.reset_timeout)
+        app.extensions['read_cache'] = self
+
+    def _load(self, key: str, loader: Callable[[], Any]) -> Any:
+        value = call_with_retry(loader, self.breaker, attempts=self.retry_attempts)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._failed.discard(key)
+        return value
+
+    def _revalidate(self, key: str, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._load(key, loader)
+            except Exception as e:
+                with self._lock:
+                    self._failed.add(key)
+                print(f"Erro ao revalidar cache '{key}': {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f'revalidate-{key}', daemon=True).start()
+
+    def get(self, key: str, loader: Callable[[], Any],
+            background_loader: Optional[Callable[[], Any]] = None) -> Tuple[Any, bool]:
+        """
+        `loader` roda na thread da requisição; `background_loader` (se
+        informado) é usado na revalidação em segundo plano, onde não há
+        contexto de requisição.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age <= self.ttl:
+                return value, False
+            if age <= self.stale_ttl:
+                self._revalidate(key, background_loader or loader)
+                with self._lock:
+                    failed = key in self._failed
+                return value, failed or self.breaker.state != 'fechado'
+
+        try:
+            return self._load(key, loader), False
+        except Exception:
+            if entry is not None:
+                return entry[0], True
+            raise
+
+    def peek(self, key: str) -> Optional[Tuple[Any, float]]:
+        """ Devolve (dados, idade em segundos) sem ir ao banco, ou None se não houver entrada. """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[0], time.monotonic() - entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        """ Grava um valor carregado por fora do `get` (ex.: ao final de um streaming). """
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._failed.discard(key)
+
+    def expire(self, prefix: str = '') -> None:
+        """
+        Força a próxima leitura a ir ao banco, mas mantém o valor como
+        último dado válido caso o banco esteja fora. Só afeta o cache deste
+        processo.
+        """
+        with self._lock:
+            for key, (value, _) in list(self._entries.items()):
+                if key.startswith(prefix):
+                    self._entries[key] = (value, float('-inf'))
+
+
+read_cache = ReadThroughCache()
+
+
+# --- Relatórios de /analytics ---
+# Ficam aqui, e não em analytics.py, para que o numpy / pandas só sejam
+# importados quando o primeiro relatório for calculado.
+
+# Janelas de tempo disponíveis na página de análises (dias; None = todo o histórico)
+ANALYTICS_WINDOWS: Dict[str, Optional[int]] = {'30d': 30, '90d': 90, '365d': 365, 'tudo': None}
+DEFAULT_WINDOW: str = '90d'
+
+
+class AnalyticsCache(ReadThroughCache):
+    """
+    Cache dos relatórios de análise, um por janela. Tem TTL próprio (o cálculo
+    lê o histórico inteiro da janela) e não é expirado pelas escritas, mas usa
+    o mesmo circuit breaker das demais leituras. A página usa `get_nowait`:
+    os relatórios são sempre calculados em segundo plano.
+    """
+
+    def init_app(self, app) -> None:
+        self.ttl = app.config.get('ANALYTICS_CACHE_TTL', self.ttl)
+        self.stale_ttl = max(self.stale_ttl, self.ttl)
+        self.retry_attempts = app.config.get('READ_CACHE_RETRY_ATTEMPTS', self.retry_attempts)
+        app.extensions['analytics_cache'] = self
+
+    def get_nowait(self, key: str, loader: Callable[[], Any]) -> Tuple[Optional[Any], bool]:
+        """
+        Como `get`, mas o cálculo nunca roda na requisição: sem relatório
+        fresco, agenda `loader` em segundo plano (um por chave) e devolve o
+        último relatório marcado como stale, ou (None, True) se ainda não há
+        nenhum — a página mostra "em preparação".
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+            return entry[0], False
+
+        self._revalidate(key, loader)
+        if entry is None:
+            return None, True
+        if time.monotonic() - entry[1] <= self.stale_ttl:
+            with self._lock:
+                failed = key in self._failed
+            return entry[0], failed or self.breaker.state != 'fechado'
+        return entry[0], True
+
+    def failed(self, key: str) -> bool:
+        """ Se a última carga em segundo plano de `key` falhou. """
+        with self._lock:
+            return key in self._failed
+
+
+analytics_cache = AnalyticsCache(ttl=600.0, stale_ttl=86400.0, breaker=read_cache.breaker)
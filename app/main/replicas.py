@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from flask import session
+
+from .local_replica import Call, replay_calls
+from .read_cache import CircuitBreaker, CircuitOpenError
+from .services import is_connection_error, supabase_service
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Chave da sessão com o instante até o qual o usuário lê do primário
+PIN_SESSION_KEY: str = 'primario_ate'
+
+
+class FailoverQuery:
+    """
+    Grava as chamadas do builder e, no execute(), consulta a réplica; se ela
+    falhar, a mesma consulta é refeita uma vez no primário.
+    """
+
+    def __init__(self, router: 'ReplicaRouter', replica_url: str, tabela: str):
+        self._router = router
+        self._replica_url = replica_url
+        self._tabela = tabela
+        self._calls: List[Call] = []
+
+    def __getattr__(self, metodo: str):
+        if metodo.startswith('_'):
+            raise AttributeError(metodo)
+
+        def record(*args, **kwargs):
+            self._calls.append((metodo, args, kwargs))
+            return self
+        return record
+
+    def execute(self):
+        return self._router.execute(self._replica_url, self._tabela, self._calls)
+
+
+class FailoverClient:
+    """ Cliente de leitura entregue às rotas: tabelas via FailoverQuery, o resto direto na réplica. """
+
+    def __init__(self, router: 'ReplicaRouter', replica_url: str):
+        self._router = router
+        self._replica_url = replica_url
+
+    def table(self, tabela: str) -> FailoverQuery:
+        return FailoverQuery(self._router, self._replica_url, tabela)
+
+    from_ = table
+
+    def __getattr__(self, name: str):
+        return getattr(self._router._client_for(self._replica_url), name)
+
+
+class ReplicaRouter:
+    """
+    Direciona as leituras (views GET) para réplicas de leitura do Supabase e as
+    escritas para o primário (SUPABASE_URL).
+
+    - SUPABASE_READ_URLS: URLs das réplicas, separadas por vírgula
+      (SUPABASE_READ_KEY opcional; por padrão usa SUPABASE_KEY);
+    - read-your-writes: depois de uma escrita bem-sucedida, a sessão do usuário
+      fica presa ao primário por `pin_seconds`;
+    - uma thread verifica a saúde das réplicas a cada `health_interval`
+      segundos; sem réplica saudável, as leituras vão para o primário;
+    - cada réplica tem o próprio circuit breaker. Se uma consulta falhar na
+      réplica, ela é refeita uma vez no primário, e a réplica sai do rodízio
+      (em queda de rede ou com o circuito aberto) até a próxima verificação.
+      Assim as falhas de uma réplica não abrem o circuito do primário
+      (read_cache.breaker), que só conta as consultas feitas nele.
+
+    Os clientes das réplicas são criados uma vez e reaproveitados entre requisições.
+    """
+
+    def __init__(self, pin_seconds: float = 10.0, health_interval: float = 15.0):
+        self.pin_seconds = pin_seconds
+        self.health_interval = health_interval
+        self.replica_urls: List[str] = []
+        self.replica_key: Optional[str] = None
+
+        self._clients: Dict[str, Client] = {}
+        self._healthy: Dict[str, bool] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._cycle = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replica_urls)
+
+    def init_app(self, app) -> None:
+        urls = app.config.get('SUPABASE_READ_URLS') or ''
+        self.replica_urls = [u.strip() for u in urls.split(',') if u.strip()]
+        self.replica_key = app.config.get('SUPABASE_READ_KEY') or os.environ.get("SUPABASE_KEY")
+        self.pin_seconds = app.config.get('READ_YOUR_WRITES_SECONDS', self.pin_seconds)
+        self.health_interval = app.config.get('REPLICA_HEALTH_INTERVAL', self.health_interval)
+        app.extensions['replica_router'] = self
+
+        if self.enabled:
+            # Até a primeira verificação, as réplicas são consideradas saudáveis
+            self._healthy = {u: True for u in self.replica_urls}
+            self._breakers = {u: CircuitBreaker() for u in self.replica_urls}
+            self._cycle = itertools.cycle(self.replica_urls)
+            self.start()
+
+    # --- Pool de clientes ---
+
+    def _client_for(self, replica_url: str) -> Client:
+        with self._lock:
+            client = self._clients.get(replica_url)
+            if client is None:
+                client = supabase_service.create_client(replica_url, self.replica_key)
+                self._clients[replica_url] = client
+            return client
+
+    def read_client(self) -> Optional[FailoverClient]:
+        """ Próxima réplica saudável (round-robin), ou None para usar o primário. """
+        if not self.enabled:
+            return None
+        with self._lock:
+            for _ in range(len(self.replica_urls)):
+                replica_url = next(self._cycle)
+                if self._healthy.get(replica_url) and self._breakers[replica_url].state != 'aberto':
+                    break
+            else:
+                return None
+        return FailoverClient(self, replica_url)
+
+    def mark_down(self, replica_url: str) -> None:
+        """ Tira a réplica do rodízio até a próxima verificação de saúde. """
+        with self._lock:
+            self._healthy[replica_url] = False
+
+    def execute(self, replica_url: str, tabela: str, calls: List[Call]) -> Any:
+        """ Executa a consulta na réplica; se ela falhar, refaz uma vez no primário. """
+        try:
+            return self._breakers[replica_url].call(
+                lambda: replay_calls(self._client_for(replica_url).table(tabela), calls).execute())
+        except Exception as e:
+            if isinstance(e, CircuitOpenError) or is_connection_error(e):
+                self.mark_down(replica_url)
+            print(f"Réplica {replica_url} falhou ({e}); consultando o primário.")
+            primario = supabase_service.client()
+            if primario is None:
+                raise
+            return replay_calls(primario.table(tabela), calls).execute()
+
+    # --- Read-your-writes ---
+
+    def pin_to_primary(self) -> None:
+        """ Chamado após uma escrita: as próximas leituras deste usuário vão ao primário. """
+        if self.enabled:
+            session[PIN_SESSION_KEY] = time.time() + self.pin_seconds
+
+    def is_pinned(self) -> bool:
+        return self.enabled and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+    # --- Verificação de saúde ---
+
+    def check_health(self) -> None:
+        for replica_url in self.replica_urls:
+            try:
+                self._client_for(replica_url).table('funcionarios').select('id').limit(1).execute()
+                healthy = True
+            except Exception as e:
+                print(f"Réplica {replica_url} indisponível: {e}")
+                healthy = False
+            with self._lock:
+                self._healthy[replica_url] = healthy
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self.check_health()
+            self._wakeup.wait(self.health_interval)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._wakeup.clear()
+        self._thread = threading.Thread(target=self._run, name='replica-health', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+from .queries import ARCHIVED_STAGE, iter_pages
+
+# Métricas agregadas
+METRIC_NEW_LEADS = 'novos_leads'
+METRIC_TRANSITIONS = 'transicoes'
+METRIC_POST_SALE = 'pos_venda'
+METRICS = (METRIC_NEW_LEADS, METRIC_TRANSITIONS, METRIC_POST_SALE)
+
+# Granularidades (o período é a data de início do bucket: segunda-feira ou dia 1º)
+GRANULARITIES = ('semana', 'mes')
+# Dimensões: 'total' tem valor '', as demais guardam o id do funcionário / da área
+DIMENSIONS = ('total', 'responsavel', 'area')
+
+ROLLUPS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    granularidade  TEXT    NOT NULL,
+    periodo        TEXT    NOT NULL,
+    metrica        TEXT    NOT NULL,
+    dimensao       TEXT    NOT NULL,
+    valor          TEXT    NOT NULL,
+    quantidade     INTEGER NOT NULL,
+    PRIMARY KEY (metrica, granularidade, dimensao, periodo, valor)
+);
+CREATE TABLE IF NOT EXISTS rollup_registros (
+    tabela       TEXT    NOT NULL,
+    registro_id  INTEGER NOT NULL,
+    responsavel  TEXT    NOT NULL,
+    areas        TEXT    NOT NULL,
+    PRIMARY KEY (tabela, registro_id)
+);
+-- Recálculo em andamento (no máximo uma linha) e os incrementos feitos
+-- durante ele, por qualquer processo que use este arquivo
+CREATE TABLE IF NOT EXISTS rollup_recalculo (
+    id      INTEGER PRIMARY KEY CHECK (id = 1),
+    inicio  TEXT    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_pendentes (
+    quando         TEXT    NOT NULL,
+    granularidade  TEXT    NOT NULL,
+    periodo        TEXT    NOT NULL,
+    metrica        TEXT    NOT NULL,
+    dimensao       TEXT    NOT NULL,
+    valor          TEXT    NOT NULL
+);
+"""
+
+UPSERT_SQL = (
+    "INSERT INTO rollups (granularidade, periodo, metrica, dimensao, valor, quantidade) "
+    "VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (metrica, granularidade, dimensao, periodo, valor) "
+    "DO UPDATE SET quantidade = quantidade + excluded.quantidade"
+)
+
+RollupKey = Tuple[str, str, str, str, str]
+
+
+def _timestamp(quando: datetime) -> str:
+    # Sempre em UTC e com microssegundos, para comparar como texto no SQLite
+    return quando.astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+
+def bucket_start(quando: datetime, granularidade: str) -> date:
+    """ Início do bucket (UTC) que contém `quando`. """
+    dia = quando.astimezone(timezone.utc).date()
+    if granularidade == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    return dia.replace(day=1)
+
+
+def previous_bucket(inicio: date, granularidade: str) -> date:
+    if granularidade == 'semana':
+        return inicio - timedelta(days=7)
+    return (inicio - timedelta(days=1)).replace(day=1)
+
+
+def rollup_keys(metrica: str, quando: datetime, responsavel: Any,
+                area_ids: Iterable[Any]) -> List[RollupKey]:
+    """ Chaves incrementadas por um evento: total, responsável e cada área, nas duas granularidades. """
+    keys = []
+    for granularidade in GRANULARITIES:
+        periodo = bucket_start(quando, granularidade).isoformat()
+        keys.append((granularidade, periodo, metrica, 'total', ''))
+        keys.append((granularidade, periodo, metrica, 'responsavel', '' if responsavel is None else str(responsavel)))
+        for area_id in area_ids:
+            keys.append((granularidade, periodo, metrica, 'area', str(area_id)))
+    return keys
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class RollupStore:
+    """
+    Séries por semana / mês de novos leads, mudanças de etapa e conversões
+    para o Pós-Venda, por responsável e por área, num SQLite local.
+
+    - as rotas de escrita incrementam os contadores na hora (UPSERT);
+    - para não consultar o Supabase a cada mudança de etapa, o responsável e
+      as áreas de cada lead ficam guardados em `rollup_registros`;
+    - o job 'recalcular_rollups' refaz tudo a partir das tabelas; os
+      incrementos que chegam durante o recálculo (de qualquer worker) ficam
+      em `rollup_pendentes` e são reaplicados no fim;
+    - os rollups são secundários: um erro aqui é registrado e não derruba a
+      escrita no Supabase que o originou.
+
+    Os gráficos leem O(buckets) linhas, independente do número de clientes.
+    """
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self.path = app.config.get('ROLLUPS_DB_PATH') or os.path.join(app.instance_path, 'rollups.sqlite3')
+        self.open()
+        app.extensions['rollup_store'] = self
+
+    def open(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(ROLLUPS_SCHEMA)
+        self._conn = conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """ Transação de escrita na conexão compartilhada (chamar com o lock). """
+        # IMMEDIATE: pega o lock de escrita já no início, sem disputa de upgrade entre workers
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+            self._conn.execute("COMMIT")
+        except Exception:
+            # Sem o ROLLBACK a conexão compartilhada ficaria presa na transação aberta
+            self._conn.execute("ROLLBACK")
+            raise
+
+    # --- Escrita incremental ---
+
+    def remember(self, tabela: str, registro_id: int, responsavel: Any, area_ids: Iterable[Any]) -> None:
+        """ Guarda o responsável e as áreas de um registro (usados nas mudanças de etapa). """
+        if self._conn is None:
+            return
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rollup_registros (tabela, registro_id, responsavel, areas) VALUES (?, ?, ?, ?)",
+                    (tabela, int(registro_id), '' if responsavel is None else str(responsavel),
+                     json.dumps([str(area_id) for area_id in area_ids])),
+                )
+        except Exception as e:
+            print(f"Rollups: erro ao guardar o registro {tabela} #{registro_id}: {e}")
+
+    def record(self, metrica: str, responsavel: Any, area_ids: Iterable[Any],
+               quando: Optional[datetime] = None) -> None:
+        """ Conta um evento da métrica agora (ou em `quando`). """
+        if self._conn is None:
+            return
+        quando = quando or datetime.now(timezone.utc)
+        try:
+            keys = rollup_keys(metrica, quando, responsavel, area_ids)
+            with self._lock, self._transaction() as conn:
+                conn.executemany(UPSERT_SQL, [key + (1,) for key in keys])
+                if conn.execute("SELECT 1 FROM rollup_recalculo").fetchone():
+                    conn.executemany(
+                        "INSERT INTO rollup_pendentes (quando, granularidade, periodo, metrica, dimensao, valor) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [(_timestamp(quando),) + key for key in keys],
+                    )
+        except Exception as e:
+            print(f"Rollups: erro ao contar '{metrica}': {e}")
+
+    def record_for(self, metrica: str, tabela: str, registro_id: int, quando: Optional[datetime] = None) -> None:
+        """ Conta um evento de um registro já conhecido, com o responsável e as áreas guardados. """
+        if self._conn is None:
+            return
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT responsavel, areas FROM rollup_registros WHERE tabela = ? AND registro_id = ?",
+                    (tabela, int(registro_id)),
+                ).fetchone()
+        except Exception as e:
+            print(f"Rollups: erro ao ler o registro {tabela} #{registro_id}: {e}")
+            row = None
+        responsavel, area_ids = (row[0] or None, json.loads(row[1])) if row else (None, [])
+        self.record(metrica, responsavel, area_ids, quando)
+
+    # --- Leitura ---
+
+    def series(self, metrica: str, granularidade: str, dimensao: str,
+               periodos: int = 12) -> Dict[str, Any]:
+        """
+        Os últimos `periodos` buckets da métrica: {'periodos': [...], 'series': {valor: [contagens]}}.
+        Buckets sem eventos saem com zero.
+        """
+        fim = bucket_start(datetime.now(timezone.utc), granularidade)
+        inicios = [fim]
+        for _ in range(periodos - 1):
+            inicios.append(previous_bucket(inicios[-1], granularidade))
+        inicios = [inicio.isoformat() for inicio in reversed(inicios)]
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT periodo, valor, quantidade FROM rollups "
+                "WHERE metrica = ? AND granularidade = ? AND dimensao = ? AND periodo >= ?",
+                (metrica, granularidade, dimensao, inicios[0]),
+            ).fetchall()
+
+        posicao = {periodo: i for i, periodo in enumerate(inicios)}
+        series: Dict[str, List[int]] = {}
+        for periodo, valor, quantidade in rows:
+            if periodo in posicao:
+                series.setdefault(valor, [0] * len(inicios))[posicao[periodo]] = quantidade
+        return {'periodos': inicios, 'series': series}
+
+    # --- Recálculo completo ---
+
+    def begin_backfill(self) -> datetime:
+        """
+        Marca o início do recálculo: os eventos até aqui vêm das tabelas, os
+        seguintes dos incrementos. A marca fica no SQLite, então os outros
+        workers passam a guardar os seus incrementos também.
+        """
+        with self._lock, self._transaction() as conn:
+            # Dentro da transação: nenhum incremento fica entre o início e a marca
+            since = datetime.now(timezone.utc)
+            conn.execute("DELETE FROM rollup_pendentes")
+            conn.execute("INSERT OR REPLACE INTO rollup_recalculo (id, inicio) VALUES (1, ?)", (_timestamp(since),))
+        return since
+
+    def finish_backfill(self, counts: Counter, registros: Dict[Tuple[str, int], Tuple[Any, List[Any]]]) -> None:
+        """ Troca o conteúdo pelo recálculo e reaplica os incrementos feitos depois do início dele. """
+        with self._lock, self._transaction() as conn:
+            marca = conn.execute("SELECT inicio FROM rollup_recalculo").fetchone()
+            if marca:
+                pendentes = conn.execute(
+                    "SELECT granularidade, periodo, metrica, dimensao, valor, COUNT(*) FROM rollup_pendentes "
+                    "WHERE quando > ? GROUP BY granularidade, periodo, metrica, dimensao, valor",
+                    (marca[0],),
+                ).fetchall()
+                for row in pendentes:
+                    counts[tuple(row[:5])] += row[5]
+            conn.execute("DELETE FROM rollups")
+            conn.executemany(UPSERT_SQL, [key + (quantidade,) for key, quantidade in counts.items()])
+            conn.executemany(
+                "INSERT OR IGNORE INTO rollup_registros (tabela, registro_id, responsavel, areas) VALUES (?, ?, ?, ?)",
+                [
+                    (tabela, registro_id, '' if responsavel is None else str(responsavel),
+                     json.dumps([str(area_id) for area_id in area_ids]))
+                    for (tabela, registro_id), (responsavel, area_ids) in registros.items()
+                ],
+            )
+            conn.execute("DELETE FROM rollup_pendentes")
+            conn.execute("DELETE FROM rollup_recalculo")
+
+    def abort_backfill(self) -> None:
+        with self._lock, self._transaction() as conn:
+            conn.execute("DELETE FROM rollup_pendentes")
+            conn.execute("DELETE FROM rollup_recalculo")
+
+
+def backfill_rollups(supabase: Client, store: RollupStore, page_size: int = 1000,
+                     progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+    """
+    Recalcula os rollups a partir de clientes (+ arquivados), clientes_posvenda
+    e das mudanças de etapa do histórico. Eventos posteriores ao início do
+    recálculo ficam de fora da leitura e entram pelos incrementos.
+    """
+    since = store.begin_backfill()
+    try:
+        counts: Counter = Counter()
+        registros: Dict[Tuple[str, int], Tuple[Any, List[Any]]] = {}
+        totais: Dict[str, int] = {}
+
+        def count_rows(tabela: str, metrica: Optional[str], registro_tabela: str) -> None:
+            lidos = 0
+            for row in iter_pages(
+                lambda: supabase.table(tabela).select('id, created_at, responsavel, areas(id)').order('id'),
+                page_size,
+            ):
+                area_ids = [area['id'] for area in row.get('areas') or []]
+                registros[(registro_tabela, row['id'])] = (row.get('responsavel'), area_ids)
+                quando = _parse_timestamp(row.get('created_at'))
+                if metrica and quando and quando <= since:
+                    counts.update(rollup_keys(metrica, quando, row.get('responsavel'), area_ids))
+                lidos += 1
+            totais[tabela] = lidos
+            if progress:
+                progress(tabela, lidos)
+
+        count_rows('clientes', METRIC_NEW_LEADS, 'clientes')
+        count_rows('clientes_arquivados', METRIC_NEW_LEADS, 'clientes')
+        count_rows('clientes_posvenda', METRIC_POST_SALE, 'clientes_posvenda')
+
+        # Mudanças de etapa (drag-and-drop, edição, jobs); a passagem para o Pós-Venda já conta em 'pos_venda'
+        for historico, id_column, tabela in (('historico_acoes', 'lead_id', 'clientes'),
+                                             ('historico_posvenda', 'cliente_id', 'clientes_posvenda')):
+            lidos = 0
+            for row in iter_pages(
+                lambda: supabase.table(historico)
+                    .select(f"registro_id:{id_column}, data_acao, etapa:dados_depois->>etapa")
+                    .eq('tipo_acao', 'UPDATE').order('id'),
+                page_size,
+            ):
+                quando = _parse_timestamp(row.get('data_acao'))
+                if not row.get('etapa') or row['etapa'] == ARCHIVED_STAGE or not quando or quando > since:
+                    continue
+                responsavel, area_ids = registros.get((tabela, row['registro_id']), (None, []))
+                counts.update(rollup_keys(METRIC_TRANSITIONS, quando, responsavel, area_ids))
+                lidos += 1
+            totais[historico] = lidos
+            if progress:
+                progress(historico, lidos)
+    except Exception:
+        store.abort_backfill()
+        raise
+
+    store.finish_backfill(counts, registros)
+    return totais
+
+
+rollup_store = RollupStore()
@@ -1,30 +1,44 @@
-import os
+from __future__ import annotations
+
 from flask import (
     render_template, Blueprint, request, redirect, url_for, 
-    jsonify, session, abort, g
+    jsonify, session, abort, g, current_app, Response, stream_with_context,
+    send_from_directory
 )
-from supabase import create_client, Client
-from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Optional, Tuple
 from collections import Counter # Para o dashboard
+from .write_behind import stage_queue
+from .read_cache import ANALYTICS_WINDOWS, DEFAULT_WINDOW, analytics_cache, read_cache, call_with_retry
+from .replicas import replica_router
+from .local_replica import local_replica
+from ..templating import templating
+from ..decorators import application_status_response
+from .services import supabase_service
+from .board_payload import board_payload
+from .archive import fetch_lead_any
+from .dedup import DuplicateLeadError, dedup_index
+from .operations import create_lead, move_lead_to_post_sale, record_stage_change
+from .audit import ACTION_UPDATE, audit_writer, changed_fields
+from .rollups import DIMENSIONS, GRANULARITIES, METRICS, METRIC_TRANSITIONS, rollup_store
+from .jobs import job_runner, JobQueueFull, JOB_DONE
+from . import bulk_jobs  # registra os handlers no job_runner
+from .queries import (
+    iter_pages, iter_client_list, get_employees_map,
+    load_leads_board, load_posvenda_board, load_dashboard
+)
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 # --- Configuração do Blueprint ---
 main_bp = Blueprint('main', __name__, template_folder='templates')
 
-# --- Carregar .env e Conectar ao Supabase ---
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
-if os.path.exists(dotenv_path):
-    load_dotenv(dotenv_path)
-
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_KEY")
-
-if not url or not key:
-    print("Erro Crítico: Variáveis SUPABASE_URL ou SUPABASE_KEY não encontradas.")
-    # Em um app real, você pode querer lançar uma exceção aqui
-
 # --- Constantes de Configuração ---
 
+# Tamanho das páginas lidas do Supabase nas views em streaming
+STREAM_PAGE_SIZE: int = 500
+CLIENT_LIST_CACHE_KEY: str = 'clientes:lista'
+
 # Configuração das Etapas do Funil
 STAGES_CONFIG: List[Dict[str, str]] = [
     {'id': 'aguardando retorno', 'title': 'Aguardando retorno', 'color': 'bg-blue-500'},
@@ -55,27 +69,104 @@ AREAS_COLOR_MAP: Dict[str, str] = {
 }
 
 # --- Helpers de Blueprint ---
-def get_employees_map(supabase: Client) -> Dict[int, str]:
-    """ Busca todos os funcionários e retorna um mapa {id: nome} """
-    try:
-        response = supabase.table('funcionarios').select("id, nome").execute()
-        return {emp['id']: emp['nome'] for emp in response.data}
-    except Exception as e:
-        print(f"Erro ao buscar mapa de funcionários: {e}")
-        return {}
-
-
 def get_supabase() -> Client:
     """
     Cria ou recupera o cliente Supabase para a requisição atual.
     Armazena no objeto 'g' do Flask.
+
+    Requisições GET (views de leitura) usam uma réplica de leitura, se houver;
+    escritas e usuários que acabaram de escrever usam o primário. No modo
+    desktop, tudo passa pela réplica local (leituras no SQLite, escritas no
+    Supabase e aplicadas localmente).
     """
     if 'supabase' not in g:
-        if not url or not key:
+        if not supabase_service.configured:
             abort(503, "A conexão com o banco de dados (Supabase) não foi inicializada.")
-        g.supabase = create_client(url, key)
+        if local_replica.ready:
+            g.supabase = local_replica.client()
+            return g.supabase
+        replica = None
+        if request.method in ('GET', 'HEAD') and not replica_router.is_pinned():
+            replica = replica_router.read_client()
+        g.supabase = replica or supabase_service.client()
     return g.supabase
 
+def cached_read(cache_key: str, loader):
+    """
+    Executa uma consulta de leitura através do cache stale-while-revalidate
+    (com circuit breaker e retries). Retorna (dados, is_stale).
+    """
+    supabase = get_supabase()
+    if local_replica.ready:
+        # Réplica local: a consulta já é local, o cache só atrasaria a sincronização
+        return loader(supabase), False
+    if replica_router.is_pinned():
+        # Read-your-writes: o cache pode ter sido preenchido por uma réplica
+        # atrasada, então quem acabou de escrever lê do primário e atualiza o cache
+        data = resilient_call(lambda: loader(supabase))
+        read_cache.put(cache_key, data)
+        return data, False
+    return read_cache.get(
+        cache_key,
+        lambda: loader(supabase),
+        # A revalidação roda fora da requisição: não usa o cliente guardado no g
+        lambda: loader(replica_router.read_client() or supabase_service.client()),
+    )
+
+def stream_page(template_name: str, buffer_size: int = 50, **context) -> Response:
+    """
+    Renderiza um template em streaming: o cabeçalho e as primeiras linhas
+    saem enquanto o restante ainda está sendo buscado/renderizado. As listas
+    do contexto podem ser geradores (ex.: páginas do Supabase).
+    `buffer_size` agrupa os pedaços do Jinja para não enviar um por linha.
+    """
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(buffer_size)
+    return Response(stream_with_context(templating.timed_stream(template_name, stream)), mimetype='text/html')
+
+def resilient_call(fetch):
+    """ Passa uma consulta pelo circuit breaker e pelos retries do cache de leitura. """
+    return call_with_retry(fetch, read_cache.breaker, attempts=read_cache.retry_attempts)
+
+def record_edit(tabela: str, registro_id: int, antes: Optional[Dict[str, Any]], depois: Dict[str, Any],
+                area_ids: List[Any]) -> None:
+    """ Registra no histórico (e nos rollups) a edição de um cliente pelo formulário (só os campos alterados). """
+    rollup_store.remember(tabela, registro_id, depois.get('responsavel'), area_ids)
+    dedup_index.add(tabela, {'id': registro_id, **depois})
+    alterados = changed_fields(antes, depois)
+    if not alterados:
+        return
+    if 'etapa' in alterados:
+        rollup_store.record_for(METRIC_TRANSITIONS, tabela, registro_id)
+    detalhes = "Campos alterados: " + ', '.join(campo.replace('_', ' ') for campo in alterados)
+    audit_writer.record(tabela, registro_id, ACTION_UPDATE, detalhes,
+                        antes={campo: (antes or {}).get(campo) for campo in alterados}, depois=alterados)
+
+@main_bp.after_request
+def after_successful_write(response):
+    """
+    Após uma escrita bem-sucedida, a próxima leitura volta a consultar o banco
+    e o usuário passa a ler do primário por alguns segundos (read-your-writes).
+
+    Vale só para este processo: os outros workers (gunicorn com -w > 1) não
+    ficam sabendo da escrita e servem o que têm em cache por até
+    READ_CACHE_TTL segundos. No modo desktop há um único processo.
+    """
+    if request.method == 'POST' and response.status_code < 400:
+        read_cache.expire()
+        replica_router.pin_to_primary()
+    return response
+
+@main_bp.before_request
+def check_application_status():
+    """
+    Blocklist e versão da aplicação, antes de cada rota do blueprint (mesma
+    verificação do decorator verify_application_status, em memória).
+    """
+    return application_status_response()
+
 @main_bp.before_request
 def check_supabase_connection():
     """
@@ -96,35 +187,32 @@ def home():
 @main_bp.route('/leads')
 def kanban_board():
     """ Renderiza o quadro Kanban. (ATUALIZADO PARA M:N) """
-    supabase = get_supabase()
     leads_final = []
     error_msg = None
+    stale = False
     
     try:
-        # 1. A "JUNÇÃO" (JOIN)
-        response = supabase.table('clientes').select(
-            "id, nome_empresa, nome_contato, etapa, responsavel(id, nome), created_at, areas(nome)"
-        ).order('created_at', desc=True).execute()
-        
-        leads_raw = response.data
-
-        # 2. A TRANSFORMAÇÃO
-        for lead in leads_raw:
-            if lead.get('areas') and isinstance(lead['areas'], list):
-                lead['areas'] = [area['nome'] for area in lead['areas'] if 'nome' in area]
-            else:
-                lead['areas'] = []
-            leads_final.append(lead)
+        leads_cached, stale = cached_read('board:leads', load_leads_board)
+        # Etapas ainda no journal do write-behind (movimentações não enviadas)
+        pending_stages = stage_queue.pending_stages('clientes')
+
+        # Cópia rasa só dos leads alterados: a lista do cache é compartilhada
+        leads_final = [
+            {**lead, 'etapa': pending_stages[lead['id']]} if lead['id'] in pending_stages else lead
+            for lead in leads_cached
+        ]
             
     except Exception as e:
         error_msg = f"Erro ao buscar leads: {e}"
 
     return render_template(
         "kanban_crm.html", 
-        all_leads_json=leads_final, # Passa a lista formatada
+        # Formato compacto (v2) por padrão; ?formato=1 envia a lista simples
+        all_leads_json=board_payload(leads_final, request.args.get('formato')),
         all_stages_json=STAGES_CONFIG,
         areas_colors_json=AREAS_COLOR_MAP, 
         error=error_msg,
+        stale=stale,
         base_template_name=get_layout_template() 
     )
 
@@ -132,6 +220,8 @@ def kanban_board():
 def create_lead_page():
     """Mostra a página com o formulário para criar um novo lead."""
     supabase = get_supabase()
+    # Começa a carregar o índice de duplicados enquanto o formulário é preenchido
+    dedup_index.ensure_loaded()
     
     # Busca todas as áreas para o formulário
     all_areas = []
@@ -212,55 +302,15 @@ def create_lead_action():
     if not data:
         return jsonify({'success': False, 'error': 'Nenhum dado JSON recebido.'}), 400
 
-    area_names = data.get('areas', [])
-    responsavel_id = data.get('responsavel')
-
     try:
-        # --- Valida o funcionário ---
-        if responsavel_id:
-            resp_func = supabase.table('funcionarios').select('id, nome').eq('id', responsavel_id).single().execute()
-            if not resp_func.data:
-                return jsonify({'success': False, 'error': 'Funcionário responsável não encontrado.'}), 400
-            responsavel_nome = resp_func.data['nome']
-        else:
-            responsavel_nome = None
-
-        # --- Prepara dados do cliente ---
-        new_lead_data = {
-            'nome_contato': data.get('nome_contato'),
-            'nome_empresa': data.get('nome_empresa'),
-            'email': data.get('email'),
-            'telefone': data.get('telefone'),
-            'responsavel': responsavel_id,
-            'etapa': data.get('etapa', 'Aguardando retorno'),
-        }
-
-        # --- Insere o cliente ---
-        response_cliente = supabase.table('clientes').insert(new_lead_data).execute()
-        if not response_cliente.data:
-            return jsonify({'success': False, 'error': 'Falha ao criar cliente.'}), 500
-
-        new_lead = response_cliente.data[0]
-        new_lead_id = new_lead['id']
-
-        # --- Processa as Áreas (M:N) ---
-        if area_names:
-            response_areas = supabase.table('areas').select('id, nome').in_('nome', area_names).execute()
-            area_id_map = {area['nome']: area['id'] for area in response_areas.data}
-
-            junction_data_to_insert = [
-                {'cliente_id': new_lead_id, 'area_id': area_id_map[name]}
-                for name in area_names if name in area_id_map
-            ]
-
-            if junction_data_to_insert:
-                supabase.table('clientes_areas').insert(junction_data_to_insert).execute()
-
-        new_lead['areas'] = area_names
-        new_lead['responsavel_nome'] = responsavel_nome  # retorna também o nome do funcionário
-
+        # 'forcar': o usuário viu os possíveis duplicados e confirmou a criação
+        new_lead = create_lead(supabase, data, check_duplicates=not data.get('forcar'))
         return jsonify({'success': True, 'lead': new_lead}), 201
 
+    except DuplicateLeadError as e:
+        return jsonify({'success': False, 'error': str(e), 'duplicates': e.matches}), 409
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -271,9 +321,21 @@ def update_lead_stage():
     data = request.get_json()
     lead_id = data.get('lead_id')
     new_stage = data.get('new_stage')
+    # Etapa de origem informada pelo Kanban, só para o histórico (evita um SELECT extra)
+    old_stage = data.get('old_stage')
     
     if not lead_id or not new_stage:
         return jsonify({'success': False, 'error': 'ID do lead ou nova etapa ausentes'}), 400
+
+    if stage_queue.enabled:
+        # Modo write-behind: confirma assim que a mudança está no journal local
+        try:
+            # O histórico e os rollups são gravados pelo flush, quando o UPDATE confirmar
+            stage_queue.enqueue('clientes', lead_id, new_stage)
+            return jsonify({'success': True, 'queued': True})
+        except Exception as e:
+            print(f"Erro ao enfileirar etapa do lead {lead_id}: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
         
     try:
         response = supabase.table('clientes') \
@@ -282,6 +344,7 @@ def update_lead_stage():
             .execute()
             
         if response.data:
+            record_stage_change('clientes', lead_id, old_stage, new_stage)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'Nenhum dado atualizado (verifique o ID e RLS)'}), 404
@@ -312,7 +375,12 @@ def update_lead_action(lead_id):
     }
 
     try:
+        # Valores atuais, para o histórico
+        before = supabase.table('clientes').select(', '.join(lead_update_data)).eq('id', lead_id).execute()
+
         # 2. Atualiza os dados principais na tabela 'clientes'
+        # (a etapa do formulário vence qualquer movimentação ainda pendente no write-behind)
+        stage_queue.discard('clientes', lead_id)
         supabase.table('clientes').update(lead_update_data).eq('id', lead_id).execute()
         
         # 3. Sincroniza as ÁREAS (a parte M:N)
@@ -326,6 +394,7 @@ def update_lead_action(lead_id):
             ]
             supabase.table('clientes_areas').insert(junction_data_to_insert).execute()
 
+        record_edit('clientes', lead_id, before.data[0] if before.data else None, lead_update_data, area_ids)
         return jsonify({'success': True}), 200
             
     except Exception as e:
@@ -342,59 +411,15 @@ def move_to_post_sale():
         return jsonify({"success": False, "error": "ID do lead não fornecido"}), 400
 
     try:
-        # 1. BUSCAR lead original (Tabela: clientes)
-        # Selecionamos todas as colunas que coincidem com clientes_posvenda
-        lead_response = supabase.table('clientes').select('nome_empresa, nome_contato, email, telefone, responsavel, created_at, etapa').eq('id', lead_id).single().execute()
-        area_response = supabase.table('clientes_areas').select('area_id').eq('cliente_id', lead_id).execute()
-        lead_data = lead_response.data
-        
-        if not lead_data:
-             return jsonify({"success": False, "error": "Lead não encontrado para transição"}), 404
-
-        # 2. PREPARAR DADOS para Inserção (Tabela: clientes_posvenda)
-        
-        # Como as colunas são as mesmas (etapa, nome_empresa, etc.), 
-        # podemos reutilizar a maioria dos dados e apenas ajustar o essencial.
-        new_client_data = {
-            'nome_empresa': lead_data.get('nome_empresa'),
-            'nome_contato': lead_data.get('nome_contato'),
-            'email': lead_data.get('email'),
-            'telefone': lead_data.get('telefone'),
-            'responsavel': lead_data.get('responsavel'), # Assumindo que este é o ID do responsável
-            
-            # ATENÇÃO: Define a primeira etapa do Pós-Venda
-            'etapa': 'Entrega Realizada', 
-            
-            # Opcional: Manter o created_at original ou adicionar uma data_transicao
-            # 'created_at': lead_data.get('created_at') 
-        }
-
-        
-        # 3. INSERIR na tabela clientes_posvenda
-        result = supabase.table('clientes_posvenda').insert(new_client_data).execute()
-        new_client_id = result.data[0]['id'] 
-        
-        # 4. AÇÃO NO LEAD ORIGINAL (Tabela: clientes)
-        # Apenas atualiza a etapa para "Arquivado" para que o backend possa filtrar futuramente.
-        # Por enquanto, o front-end já o remove.
-        supabase.table('clientes').update({'etapa': 'Venda Concluída - ARQUIVADO'}).eq('id', lead_id).execute()
-
-        areas_to_insert = [
-            {
-                'cliente_posvenda_id': new_client_id,
-                'area_id': area['area_id']
-            }
-            # Percorre os IDs de área do lead original (area_response.data)
-            for area in area_response.data 
-        ]
-
-        supabase.table('clientes_posvenda_areas').insert(areas_to_insert).execute()
+        new_client_id = move_lead_to_post_sale(supabase, lead_id)
 
         # Não se preocupe com o filtro do /leads por enquanto, apenas garanta que o cliente
         # saiba que o lead não está mais no Kanban ativo.
         
         return jsonify({"success": True, "new_client_id": new_client_id})
 
+    except LookupError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
     except Exception as e:
         print(f"Erro ao mover para Pós-Venda: {e}")
         return jsonify({"success": False, "error": f"Falha na transição: {str(e)}"}), 500
@@ -402,33 +427,18 @@ def move_to_post_sale():
 # ----------------------------------------------------------------------------------------------------------------------------------------------------- #
 @main_bp.route('/posvenda')
 def kanban_board_posvenda():
-    supabase = get_supabase()
     leads_final = []
     error_msg = None
+    stale = False
     
     try:
-        # 1. CORREÇÃO: Usar o nome da coluna correto da tabela 'clientes_posvenda'
-        response = supabase.table('clientes_posvenda').select(
-            "id, nome_empresa, nome_contato, etapa, responsavel(id, nome), created_at, areas(nome)"
-        ).order('created_at', desc=True).execute()
-        
-        leads_raw = response.data
+        leads_cached, stale = cached_read('board:posvenda', load_posvenda_board)
+        pending_stages = stage_queue.pending_stages('clientes_posvenda')
 
-        # 2. TRANSFORMAÇÃO E RENOMEAÇÃO para compatibilidade com o JS
-        for lead in leads_raw:
-            
-            # Renomeia 'etapa' para 'etapa' no objeto final para o Kanban JS
-            if 'etapa' in lead:
-                # Usa .pop() para mover o valor e remover a chave antiga
-                lead['etapa'] = lead.pop('etapa')
-            
-            # Formatação das áreas (como já estava)
-            if lead.get('areas') and isinstance(lead['areas'], list):
-                lead['areas'] = [area['nome'] for area in lead['areas'] if 'nome' in area]
-            else:
-                lead['areas'] = []
-            
-            leads_final.append(lead)
+        leads_final = [
+            {**lead, 'etapa': pending_stages[lead['id']]} if lead['id'] in pending_stages else lead
+            for lead in leads_cached
+        ]
             
     except Exception as e:
         error_msg = f"Erro ao buscar clientes de Pós-Venda: {e}"
@@ -437,11 +447,12 @@ def kanban_board_posvenda():
     # 3. PASSAGEM SEGURA de variáveis de contexto
     return render_template(
         "kanban_crm_pos_venda.html", 
-        all_leads_json=leads_final, 
+        all_leads_json=board_payload(leads_final, request.args.get('formato')), 
         # Garante que as constantes globais sejam passadas, usando um valor padrão se não existirem
         all_stages_json=globals().get('STAGES_CONFIG_POS_TRANSACTION', []),
         areas_colors_json=globals().get('AREAS_COLOR_MAP', {}), 
         error=error_msg,
+        stale=stale,
         base_template_name=globals().get('get_layout_template', lambda: "layout_sidebar.html")()
     )
 
@@ -451,12 +462,22 @@ def update_post_sale_stage():
     data = request.get_json()
     lead_id = data.get('client_id')
     new_stage = data.get('new_stage')
+    old_stage = data.get('old_stage')
 
     print(f"Recebida requisição para atualizar etapa Pós-Venda {data} ")
     print(f"Atualizando lead Pós-Venda {lead_id} para etapa {new_stage}")
     
     if not lead_id or not new_stage:
         return jsonify({'success': False, 'error': 'ID do lead ou nova etapa ausentes'}), 400
+
+    if stage_queue.enabled:
+        try:
+            # O histórico e os rollups são gravados pelo flush, quando o UPDATE confirmar
+            stage_queue.enqueue('clientes_posvenda', lead_id, new_stage)
+            return jsonify({'success': True, 'queued': True})
+        except Exception as e:
+            print(f"Erro ao enfileirar etapa do cliente Pós-Venda {lead_id}: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
         
     try:
         response = supabase.table('clientes_posvenda') \
@@ -465,6 +486,7 @@ def update_post_sale_stage():
             .execute()
             
         if response.data:
+            record_stage_change('clientes_posvenda', lead_id, old_stage, new_stage)
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'Nenhum dado atualizado (verifique o ID e RLS)'}), 404
@@ -541,38 +563,42 @@ def update_posvenda_action(lead_id):
     }
 
     try:
+        before = supabase.table('clientes_posvenda').select(', '.join(lead_update_data)).eq('id', lead_id).execute()
+
         # 2. Atualiza os dados principais na tabela 'clientes'
+        stage_queue.discard('clientes_posvenda', lead_id)
         supabase.table('clientes_posvenda').update(lead_update_data).eq('id', lead_id).execute()
         
         # 3. Sincroniza as ÁREAS (a parte M:N)
         # 3a. Deleta TODAS as associações antigas deste cliente
-        supabase.table('clientes_posvenda_areas').delete().eq('cliente_id', lead_id).execute()
+        supabase.table('clientes_posvenda_areas').delete().eq('cliente_posvenda_id', lead_id).execute()
 
         # 3b. Insere as novas associações (se houver)
         if area_ids:
             junction_data_to_insert = [
-                {'cliente_id': lead_id, 'area_id': area_id} for area_id in area_ids
+                {'cliente_posvenda_id': lead_id, 'area_id': area_id} for area_id in area_ids
             ]
             supabase.table('clientes_posvenda_areas').insert(junction_data_to_insert).execute()
 
+        record_edit('clientes_posvenda', lead_id, before.data[0] if before.data else None, lead_update_data, area_ids)
         return jsonify({'success': True}), 200
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-def fetch_history_data(supabase: Client, table_name: str, id_column: str, cliente_id: int) -> List[Dict[str, Any]]:
-    """ Busca os registros de histórico em uma tabela específica para um dado cliente. """
+def fetch_history_data(supabase: Client, table_name: str, id_column: str, cliente_id: int) -> Iterator[Dict[str, Any]]:
+    """ Busca os registros de histórico em uma tabela específica para um dado cliente, página a página. """
     try:
         # Busca ordenando pela data da ação mais recente primeiro
-        response = supabase.table(table_name).select(
-           "*"
-        ).eq(id_column, cliente_id).execute()
-        
-        return response.data
+        yield from iter_pages(
+            lambda: supabase.table(table_name).select("*").eq(id_column, cliente_id)
+                .order('data_acao', desc=True).order('id', desc=True),
+            STREAM_PAGE_SIZE,
+            resilient_call,
+        )
     except Exception as e:
         print(f"Erro ao buscar histórico em {table_name}: {e}")
-        return []
 
 @main_bp.route('/historico/<string:tipo_cliente>/<int:cliente_id>')
 def view_history(tipo_cliente: str, cliente_id: int):
@@ -588,7 +614,14 @@ def view_history(tipo_cliente: str, cliente_id: int):
     if tipo_cliente == 'lead':
         # ID do Lead na tabela 'clientes' e 'historico_acoes' é 'lead_id'
         history_data = fetch_history_data(supabase, 'historico_acoes', 'lead_id', cliente_id)
-        
+        # O lead pode já ter sido movido para clientes_arquivados
+        try:
+            lead = fetch_lead_any(supabase, cliente_id, 'id, nome_empresa')
+        except Exception as e:
+            print(f"Erro ao buscar lead {cliente_id} para o histórico: {e}")
+            lead = None
+        if lead:
+            page_title = f"Histórico de Ações: {lead.get('nome_empresa')}"
 
     elif tipo_cliente == 'posvenda':
         # ID do Cliente na tabela 'clientes_posvenda' e 'historico_posvenda' é 'cliente_id'
@@ -598,7 +631,8 @@ def view_history(tipo_cliente: str, cliente_id: int):
     else:
         abort(404, "Tipo de cliente inválido. Use 'lead' ou 'posvenda'.")
 
-    return render_template(
+    # Streaming: a timeline é enviada conforme as páginas do histórico chegam
+    return stream_page(
         'history_view.html',
         page_title=page_title,
         history_data=history_data, # ESTA VARIÁVEL PRECISA CONTER OS DADOS
@@ -607,68 +641,46 @@ def view_history(tipo_cliente: str, cliente_id: int):
 
 # ----------------------------------------------------------------------------------------------------------------------------------------------------- #
 
+def stream_client_rows(supabase: Client, status: Dict[str, Any],
+                       fallback: Optional[Tuple[List[Dict[str, Any]], float]]) -> Iterator[Dict[str, Any]]:
+    """
+    Gera as linhas da lista de clientes conforme as páginas chegam do Supabase.
+    Ao terminar, a lista completa alimenta o cache de leitura; se o banco falhar
+    antes da primeira linha, usa o último dado válido (`fallback`) marcado como
+    desatualizado. Erros no meio do streaming ficam em `status` para o template.
+    """
+    rows = []
+    try:
+        for cliente in iter_client_list(supabase, STREAM_PAGE_SIZE, resilient_call):
+            rows.append(cliente)
+            yield cliente
+    except Exception as e:
+        if not rows and fallback is not None:
+            status['stale'] = True
+            yield from fallback[0]
+        else:
+            status['error'] = f"Erro ao buscar clientes: {e}"
+        return
+    read_cache.put(CLIENT_LIST_CACHE_KEY, rows)
+
 @main_bp.route('/clientes')
 def client_list_page():
     """ 
     Renderiza uma lista tabular unificada de Leads (clientes) e Clientes de Pós-Venda.
+    A página é enviada em streaming, página a página do banco.
     """
-    supabase = get_supabase()
-    clientes_final = []
-    error_msg = None
-    
-    # 1. Obter mapa de funcionários (para mostrar o nome ao invés do ID)
-    employee_map = get_employees_map(supabase)
-
-    try:
-        # --- BUSCA 1: LEADS (Tabela 'clientes') ---
-        # Note que aqui não podemos usar responsavel(id, nome), por isso usamos o employee_map
-        response_leads = supabase.table('clientes').select(
-            "id, nome_empresa, nome_contato, email, telefone, responsavel, etapa, created_at, areas(nome)"
-        ).order('nome_empresa', desc=False).neq('etapa', 'Venda Concluída - ARQUIVADO').execute()
-        
-        leads_raw = response_leads.data
-
-        # --- BUSCA 2: CLIENTES PÓS-VENDA (Tabela 'clientes_posvenda') ---
-        response_posvenda = supabase.table('clientes_posvenda').select(
-            "id, nome_empresa, nome_contato, email, telefone, responsavel, etapa, created_at, areas(nome)"
-        ).order('nome_empresa', desc=False).execute()
-        
-        posvenda_raw = response_posvenda.data
-
-        # 2. TRANSFORMAÇÃO E UNIFICAÇÃO
-        clientes_unificados_raw = []
-        
-        # Processa Leads
-        for cliente in leads_raw:
-            cliente['tipo'] = 'Lead'
-            clientes_unificados_raw.append(cliente)
-            
-        # Processa Pós-Venda
-        for cliente in posvenda_raw:
-            cliente['tipo'] = 'Pós-Venda'
-            clientes_unificados_raw.append(cliente)
-            
-        # Formata os dados unificados
-        for cliente in clientes_unificados_raw:
-            # Formata áreas
-            if cliente.get('areas') and isinstance(cliente['areas'], list):
-                cliente['areas'] = [area['nome'] for area in cliente['areas'] if 'nome' in area]
-            else:
-                cliente['areas'] = []
-            
-            # Adiciona o nome do responsável
-            responsavel_id = cliente.get('responsavel')
-            cliente['responsavel_nome'] = employee_map.get(responsavel_id) if responsavel_id else 'N/A'
+    stream_status = {'error': None, 'stale': False}
 
-            clientes_final.append(cliente)
-
-    except Exception as e:
-        error_msg = f"Erro ao buscar clientes: {e}"
+    cached = read_cache.peek(CLIENT_LIST_CACHE_KEY)
+    if cached is not None and cached[1] <= read_cache.ttl:
+        clientes = cached[0]
+    else:
+        clientes = stream_client_rows(get_supabase(), stream_status, cached)
 
-    return render_template(
+    return stream_page(
         "clientes_lista.html",
-        clientes=clientes_final, 
-        error=error_msg,
+        clientes=clientes, 
+        stream_status=stream_status,
         # É ESSENCIAL passar o mapa de cores para o template formatar as tags
         areas_colors_json=globals().get('AREAS_COLOR_MAP', {}),
         base_template_name=get_layout_template()
@@ -680,95 +692,25 @@ def client_list_page():
 @main_bp.route('/negocios')
 def negocios_page():
     """Renderiza a página Central de Negócios (Dashboard) com métricas de Leads e Pós-Venda."""
-    supabase = get_supabase()
-    clientes_unificados = []
     error_msg = None
-    
-    # 1. BUSCAR MAPA DE FUNCIONÁRIOS
-    # Necessário para converter o ID do responsável para o nome (na lista de recentes e contagem)
-    employee_map = get_employees_map(supabase)
-
-    try:
-        # --- BUSCA 1: LEADS (clientes - Pré-Venda) ---
-        # Busca leads ativos (excluindo os arquivados) com os campos mínimos necessários
-        response_leads = supabase.table('clientes').select(
-            "id, nome_empresa, responsavel, etapa, created_at"
-        ).order('created_at', desc=True).neq('etapa', 'Venda Concluída - ARQUIVADO').execute()
-        
-        leads_raw = response_leads.data
-        
-        # --- BUSCA 2: CLIENTES PÓS-VENDA (clientes_posvenda) ---
-        # Busca clientes de pós-venda com os campos mínimos necessários
-        response_posvenda = supabase.table('clientes_posvenda').select(
-            "id, nome_empresa, responsavel, etapa, created_at"
-        ).order('created_at', desc=True).execute()
-
-        posvenda_raw = response_posvenda.data
-
-        # 2. UNIFICAÇÃO, TIPO E Mapeamento de ID
-        
-        # Processa Leads (Pré-Venda)
-        for lead in leads_raw:
-            lead['tipo'] = 'Lead'
-            # Mantém o 'id' padrão
-            clientes_unificados.append(lead)
-            
-        # Processa Clientes (Pós-Venda)
-        for client in posvenda_raw:
-            client['tipo'] = 'Pós-Venda'
-            # Renomeia o ID para 'posvenda_id' para evitar conflito no template
-            client['posvenda_id'] = client['id'] 
-            del client['id'] # Remove o 'id' original para evitar erros
-            clientes_unificados.append(client)
-        
-        # 2.5. ORDENAÇÃO POR DATA DE CRIAÇÃO (Mais recente primeiro)
-        # Essencial para garantir que os 'recentes_leads' sejam os mais atuais
-        clientes_unificados.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        
-    except Exception as e:
-        error_msg = f"Erro ao buscar dados do dashboard: {e}"
-        clientes_unificados = [] 
-
-    # --- INICIALIZAÇÃO E CÁLCULOS ---
+    stale = False
     dashboard_data = {
-        'total_leads': len(clientes_unificados),
+        'total_leads': 0,
         'contagem_etapas': Counter(),
         'contagem_responsaveis': [],
         'recentes_leads': [],
     }
-    
-    if clientes_unificados:
-        # 3. CONTAGEM DOS STAGES (ETAPAS)
-        
-        # Agrega TODAS as etapas (Vendas e Pós-Venda) em um único Counter
-        etapas_dos_clientes = [c.get('etapa') for c in clientes_unificados if c.get('etapa')]
-        dashboard_data['contagem_etapas'] = Counter(etapas_dos_clientes)
-        
-        # Agrega por Responsável
-        responsaveis_dos_clientes_id = [c.get('responsavel') for c in clientes_unificados if c.get('responsavel')]
-        contagem_id = Counter(responsaveis_dos_clientes_id).most_common(5)
-        contagem_nome = []
-        for responsavel_id, contagem in contagem_id:
-            nome = employee_map.get(responsavel_id, f"ID {responsavel_id} Desconhecido")
-            contagem_nome.append((nome, contagem))
-            
-        dashboard_data['contagem_responsaveis'] = contagem_nome
-        
-        # 4. Formatação Final dos Leads Recentes (Top 5 da lista já ordenada)
-        recentes_formatados = []
-        for lead in clientes_unificados[:5]: 
-            responsavel_id = lead.get('responsavel')
-            nome = employee_map.get(responsavel_id, 'N/A')
-            lead['responsavel_nome'] = nome
-            recentes_formatados.append(lead)
-            
-        dashboard_data['recentes_leads'] = recentes_formatados
 
-    # 5. RENDERIZAÇÃO
+    try:
+        dashboard_data, stale = cached_read('negocios:dashboard', load_dashboard)
+    except Exception as e:
+        error_msg = f"Erro ao buscar dados do dashboard: {e}"
+
     return render_template(
         "negocios.html", 
         base_template_name=get_layout_template(),
         error=error_msg,
+        stale=stale,
         data=dashboard_data,
         # Unifica as configurações de etapas (Pré e Pós-Venda) em um único dicionário para o Jinja
         stages_config={
@@ -776,102 +718,92 @@ def negocios_page():
             **{s['id']: s for s in STAGES_CONFIG_POS_TRANSACTION}
         } 
     )
-    """Renderiza a página Central de Negócios (Dashboard)."""
-    supabase = get_supabase()
-    clientes_unificados = []
-    error_msg = None
-    
-    # 1. BUSCAR MAPA DE FUNCIONÁRIOS
-    employee_map = get_employees_map(supabase)
 
-    try:
-        # --- BUSCA 1: LEADS (clientes) ---
-        # response_leads = supabase.table('clientes').select(
-        #     "id, etapa, responsavel, nome_empresa, created_at"
-        # ).order('created_at', desc=True).neq('etapa', 'Venda Concluída - ARQUIVADO').execute()
-
-        response_leads = supabase.table('clientes').select(
-            "id, nome_empresa, nome_contato, email, telefone, responsavel, etapa, created_at, areas(nome)"
-        ).order('nome_empresa', desc=False).neq('etapa', 'Venda Concluída - ARQUIVADO').execute()
-        
-        
-        leads_raw = response_leads.data
-        
-        # --- BUSCA 2: CLIENTES PÓS-VENDA (clientes_posvenda) ---
-        response_posvenda = supabase.table('clientes_posvenda').select(
-            "id, nome_empresa, nome_contato, email, telefone, responsavel, etapa, created_at, areas(nome)"
-        ).order('nome_empresa', desc=False).execute()
+def load_dimension_names(supabase: Client) -> Dict[str, Dict[str, str]]:
+    """ Nomes dos funcionários e das áreas, para rotular as séries dos rollups. """
+    areas = supabase.table('areas').select('id, nome').execute().data
+    return {
+        'responsavel': {str(emp_id): nome for emp_id, nome in get_employees_map(supabase).items()},
+        'area': {str(area['id']): area['nome'] for area in areas},
+    }
 
-        posvenda_raw = response_posvenda.data
+@main_bp.route('/api/negocios/series')
+def negocios_series():
+    """
+    Série semanal/mensal de uma métrica (novos_leads, transicoes, pos_venda),
+    no total, por responsável ou por área. Lê só os buckets pedidos dos rollups.
+    """
+    metrica = request.args.get('metrica', METRICS[0])
+    granularidade = request.args.get('granularidade', GRANULARITIES[0])
+    dimensao = request.args.get('dimensao', DIMENSIONS[0])
+    periodos = min(max(request.args.get('periodos', 12, type=int), 1), 104)
+    if metrica not in METRICS or granularidade not in GRANULARITIES or dimensao not in DIMENSIONS:
+        return jsonify({'success': False, 'error': 'Métrica, granularidade ou dimensão inválida.'}), 400
 
-        # 2. UNIFICAÇÃO, TIPO E Mapeamento de ID
-        
-        # Processa Leads (Pré-Venda)
-        for lead in leads_raw:
-            lead['tipo'] = 'Lead'
-            # Já tem o 'id' padrão
-            clientes_unificados.append(lead)
-            
-        # Processa Clientes (Pós-Venda)
-        for client in posvenda_raw:
-            client['tipo'] = 'Pós-Venda'
-            # Renomeia o ID para 'posvenda_id' para evitar conflito no template,
-            # e mantém o 'id' original APENAS para contagem, mas isso é mais seguro.
-            client['posvenda_id'] = client['id'] # Salva o ID real de pós-venda
-            del client['id'] # Remove o 'id' para evitar o erro original no template.
-            clientes_unificados.append(client)
-        
-    except Exception as e:
-        error_msg = f"Erro ao buscar dados do dashboard: {e}"
-        # Se houver erro, garante que a lista esteja vazia para não travar o loop
-        clientes_unificados = [] 
-
-    dashboard_data = {
-        'total_leads': 0,
-        'contagem_etapas': {},
-        'contagem_responsaveis': [],
-        # Ordenamos por data (Recentes) após unificação (a busca já fez o order by)
-        'recentes_leads': clientes_unificados[:5] 
-    }
-    
-    if clientes_unificados:
-        # 3. CONTAGENS E AGRUPAMENTOS
-        
-        dashboard_data['total_leads'] = len(clientes_unificados)
-        
-        # Agrega por Etapa (incluindo Pós-Venda)
-        etapas_dos_clientes = [c.get('etapa') for c in clientes_unificados if c.get('etapa')]
-        dashboard_data['contagem_etapas'] = Counter(etapas_dos_clientes)
-        
-        # Agrega por Responsável
-        responsaveis_dos_clientes_id = [c.get('responsavel') for c in clientes_unificados if c.get('responsavel')]
-        
-        contagem_id = Counter(responsaveis_dos_clientes_id).most_common(5)
-        contagem_nome = []
-        for responsavel_id, contagem in contagem_id:
-            nome = employee_map.get(responsavel_id, f"ID {responsavel_id} Desconhecido")
-            contagem_nome.append((nome, contagem))
-            
-        dashboard_data['contagem_responsaveis'] = contagem_nome
-        
-        # 4. Formatação Final dos Leads Recentes
-        recentes_formatados = []
-        for lead in dashboard_data['recentes_leads']:
-            responsavel_id = lead.get('responsavel')
-            nome = employee_map.get(responsavel_id, 'N/A')
-            lead['responsavel_nome'] = nome
-            recentes_formatados.append(lead)
-        
-        dashboard_data['recentes_leads'] = recentes_formatados
+    dados = rollup_store.series(metrica, granularidade, dimensao, periodos)
 
+    nomes: Dict[str, str] = {}
+    if dimensao != 'total':
+        try:
+            nomes = cached_read('rollups:nomes', load_dimension_names)[0][dimensao]
+        except Exception as e:
+            print(f"Erro ao buscar nomes para os rollups: {e}")
+
+    series = [
+        {'id': valor, 'nome': nomes.get(valor) or ('Total' if dimensao == 'total' else 'Não definido'), 'valores': valores}
+        for valor, valores in dados['series'].items()
+    ]
+    series.sort(key=lambda serie: sum(serie['valores']), reverse=True)
+    return jsonify({
+        'success': True,
+        'metrica': metrica,
+        'granularidade': granularidade,
+        'dimensao': dimensao,
+        'periodos': dados['periodos'],
+        'series': series,
+    })
+
+@main_bp.route('/analytics')
+def analytics_page():
+    """ Análises do funil: permanência por etapa, conversão e ciclo até o Pós-Venda. """
+    janela = request.args.get('janela', DEFAULT_WINDOW)
+    if janela not in ANALYTICS_WINDOWS:
+        janela = DEFAULT_WINDOW
+
+    max_events = current_app.config.get('ANALYTICS_MAX_EVENTS', 300000)
+
+    def loader() -> Dict[str, Any]:
+        # Roda em segundo plano, sem contexto de requisição.
+        # Importado aqui: numpy / pandas só entram no processo no primeiro relatório
+        from .analytics import build_report
+        supabase = replica_router.read_client() or supabase_service.client()
+        return build_report(supabase, janela, STAGES_CONFIG, STAGES_CONFIG_POS_TRANSACTION, max_events)
+
+    # Um relatório por janela, recalculado em segundo plano no máximo a cada
+    # ANALYTICS_CACHE_TTL segundos; a requisição nunca espera o cálculo
+    chave = f'analytics:{janela}'
+    report, stale = analytics_cache.get_nowait(chave, loader)
+    error_msg = None
+    if report is None and analytics_cache.failed(chave):
+        error_msg = "Erro ao calcular as análises; tentando novamente em segundo plano."
 
     return render_template(
-        "negocios.html", 
-        base_template_name=get_layout_template(),
+        "analytics.html",
+        report=report,
+        janela=janela,
+        janelas=list(ANALYTICS_WINDOWS),
         error=error_msg,
-        data=dashboard_data,
-        stages_config={**{s['id']: s for s in STAGES_CONFIG}, **{s['id']: s for s in STAGES_CONFIG_POS_TRANSACTION}} 
+        stale=stale and report is not None,
+        preparing=report is None,
     )
+
+@main_bp.route('/api/templates/stats')
+def template_stats():
+    """ Tempo de renderização acumulado por template (só com TEMPLATE_PROFILING ligado). """
+    if not templating.profiling:
+        abort(404)
+    return templating.stats_response()
+
 # ----------------------------------------------------------------------------------------------------------------------------------------------------- #
 
 
@@ -884,6 +816,16 @@ def set_layout(layout_name):
         session['layout'] = layout_name
     return redirect(request.referrer or url_for('main.home'))
 
+@main_bp.route('/bloqueado')
+def blocklist():
+    """ Destino da verificação de status quando o usuário está bloqueado. """
+    return "Acesso bloqueado: este usuário está na blocklist do CRM.", 403
+
+@main_bp.route('/versao-desatualizada')
+def version_mismatch():
+    """ Destino da verificação de status quando a versão local está desatualizada. """
+    return "Versão desatualizada: atualize o CRM para continuar.", 426
+
 # --- Rotas de API ---
 @main_bp.route('/areas')
 def list_areas_page():
@@ -932,4 +874,70 @@ def create_area_action():
             return jsonify({'success': False, 'error': 'Falha ao inserir dados.'}), 500
             
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+# --- Jobs em segundo plano (operações em massa) ---
+@main_bp.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Enfileira uma operação em massa e responde na hora com o ID do job.
+    Corpo: {"tipo": "mover_pos_venda" | "atualizar_etapas" | "importar_leads" |
+            "exportar_clientes" | "arquivar_leads" | "recalcular_rollups" |
+            "encontrar_duplicados", "parametros": {...}}
+    """
+    data = request.get_json(silent=True) or {}
+    tipo = data.get('tipo')
+    parametros = data.get('parametros') or {}
+
+    if tipo not in job_runner.handlers:
+        return jsonify({'success': False, 'error': f'Tipo de job desconhecido: {tipo}'}), 404
+    if not isinstance(parametros, dict):
+        return jsonify({'success': False, 'error': 'Parâmetros inválidos.'}), 400
+
+    try:
+        job_id = job_runner.submit(tipo, parametros)
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 429
+
+    status_url = url_for('main.job_status', job_id=job_id)
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': status_url}), 202, {'Location': status_url}
+
+@main_bp.route('/api/jobs/<string:job_id>')
+def job_status(job_id):
+    """ Estado e progresso de um job (processados / total / erros). """
+    job = job_runner.store.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job não encontrado.'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@main_bp.route('/api/jobs/<string:job_id>/cancelar', methods=['POST'])
+def cancel_job(job_id):
+    if job_runner.store.get(job_id) is None:
+        return jsonify({'success': False, 'error': 'Job não encontrado.'}), 404
+    if not job_runner.cancel(job_id):
+        return jsonify({'success': False, 'error': 'O job já terminou.'}), 409
+    return jsonify({'success': True})
+
+@main_bp.route('/api/jobs/<string:job_id>/itens')
+def job_items(job_id):
+    """
+    Resultados por item em NDJSON (uma linha JSON por item), enviados à medida
+    que o job avança. `?desde=<seq>` retoma a partir do último item recebido.
+    """
+    if job_runner.store.get(job_id) is None:
+        return jsonify({'success': False, 'error': 'Job não encontrado.'}), 404
+    desde = request.args.get('desde', 0, type=int)
+    dumps = current_app.json.dumps
+
+    def generate():
+        for item in job_runner.follow_items(job_id, desde):
+            yield dumps(item) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@main_bp.route('/api/jobs/<string:job_id>/arquivo')
+def job_file(job_id):
+    """ Download do arquivo gerado por um job concluído (ex.: exportar_clientes). """
+    job = job_runner.store.get(job_id)
+    if job is None or job['status'] != JOB_DONE or not (job['resultado'] or {}).get('arquivo'):
+        return jsonify({'success': False, 'error': 'Arquivo não disponível.'}), 404
+    return send_from_directory(job_runner.files_dir, job['resultado']['arquivo'], as_attachment=True)
@@ -1,6 +1,282 @@
+from __future__ import annotations
+
 from flask import current_app
+from functools import lru_cache
 import getpass
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Optional, Tuple
+
+if TYPE_CHECKING:
+    # O pacote supabase é pesado: em tempo de execução só é importado ao criar o primeiro cliente
+    from supabase import Client
+
+# Versão local da aplicação (comparada com a tabela 'versao_aplicacao' do banco)
+APP_VERSION: str = '1.0.0'
+
+# Tabelas consultadas pelo serviço de status
+BLOCKLIST_TABLE: str = 'blocklist'
+VERSION_TABLE: str = 'versao_aplicacao'
+
+
+def supabase_client_options():
+    """
+    Opções comuns dos clientes Supabase. O timeout curto evita que uma
+    requisição fique presa esperando um banco lento (o circuit breaker do
+    cache de leitura cuida das falhas repetidas).
+    """
+    try:
+        # supabase >= 2.x: o cliente síncrono exige as opções síncronas
+        from supabase.lib.client_options import SyncClientOptions as ClientOptions
+    except ImportError:
+        from supabase.lib.client_options import ClientOptions
+
+    timeout = float(os.environ.get("SUPABASE_TIMEOUT", 5))
+    return ClientOptions(postgrest_client_timeout=timeout)
+
+
+class SupabaseService:
+    """
+    Clientes Supabase criados sob demanda.
+
+    O pacote supabase (postgrest, gotrue, realtime, storage, httpx) só é
+    importado quando o primeiro cliente é criado — na primeira requisição ou
+    numa thread de segundo plano —, e não ao importar o app.
+
+    `client()` devolve o cliente do primário, criado uma vez e reaproveitado
+    entre as requisições (o app só usa o postgrest com a chave do projeto,
+    sem sessão de auth no cliente).
+    """
+
+    def __init__(self):
+        self.url: Optional[str] = None
+        self.key: Optional[str] = None
+        self._client: Optional[Client] = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self.url = app.config.get('SUPABASE_URL')
+        self.key = app.config.get('SUPABASE_KEY')
+        if not self.configured:
+            print("Erro Crítico: Variáveis SUPABASE_URL ou SUPABASE_KEY não encontradas.")
+        app.extensions['supabase'] = self
+
+    def _credentials(self) -> Tuple[Optional[str], Optional[str]]:
+        # Antes do init_app (ex.: scripts), usa o ambiente
+        return self.url or os.environ.get("SUPABASE_URL"), self.key or os.environ.get("SUPABASE_KEY")
+
+    @property
+    def configured(self) -> bool:
+        url, key = self._credentials()
+        return bool(url and key)
+
+    def create_client(self, url: Optional[str] = None, key: Optional[str] = None) -> Optional[Client]:
+        """ Cria um cliente novo (por padrão, do primário). None se faltar URL ou chave. """
+        default_url, default_key = self._credentials()
+        url, key = url or default_url, key or default_key
+        if not url or not key:
+            return None
+        from supabase import create_client
+        return create_client(url, key, options=supabase_client_options())
+
+    def client(self) -> Optional[Client]:
+        """ Cliente compartilhado do primário. """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.create_client()
+        return self._client
+
+
+supabase_service = SupabaseService()
+
+
+def create_supabase_client() -> Optional[Client]:
+    """
+    Cria um cliente Supabase fora do contexto de requisição
+    (usado pelas threads de segundo plano).
+    """
+    return supabase_service.create_client()
+
+
+def is_connection_error(e: Exception) -> bool:
+    """ Falha de rede (o Supabase não respondeu), e não uma recusa do banco. """
+    import httpx  # já carregado junto com o cliente Supabase
+    return isinstance(e, httpx.TransportError)
+
+
+class ApplicationStatusService:
+    """
+    Mantém em memória a blocklist e a versão da aplicação cadastradas no banco.
+
+    Os dados são recarregados por uma thread em segundo plano a cada
+    `refresh_interval` segundos (ou sob demanda via `refresh()`), de modo que
+    o custo por requisição do decorator `verify_application_status` seja
+    apenas uma consulta a um dicionário.
+
+    Se o banco não puder ser consultado, o último estado válido continua
+    sendo usado até `max_stale` segundos; depois disso vale a política
+    `fail_open` (True = libera o acesso, False = bloqueia).
+
+    A primeira consulta carrega o status de forma síncrona e inicia a thread;
+    comandos `flask` que só criam o app não abrem conexões nem threads.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, max_stale: Optional[float] = None,
+                 fail_open: bool = True):
+        self.refresh_interval = refresh_interval
+        self.max_stale = max_stale if max_stale is not None else refresh_interval * 3
+        self.fail_open = fail_open
+        self.local_version = APP_VERSION
+
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._status: Dict[str, Any] = {
+            'blocklist': frozenset(),
+            'versao': None,
+            'atualizado_em': None,  # time.monotonic() do último refresh bem-sucedido
+            'erro': None,
+        }
+
+    def init_app(self, app) -> None:
+        """ Lê a configuração do app. A thread de atualização só sobe na primeira consulta. """
+        self.refresh_interval = app.config.get('APP_STATUS_REFRESH_INTERVAL', self.refresh_interval)
+        self.max_stale = app.config.get('APP_STATUS_MAX_STALE', self.refresh_interval * 3)
+        self.fail_open = app.config.get('APP_STATUS_FAIL_OPEN', self.fail_open)
+        self.local_version = app.config.get('APP_VERSION', self.local_version)
+        app.extensions['app_status'] = self
+
+    # --- Atualização ---
+
+    def fetch_status(self) -> Tuple[FrozenSet[str], Optional[str]]:
+        """ Consulta o banco e retorna (blocklist, versão esperada). """
+        supabase = create_supabase_client()
+        if supabase is None:
+            raise RuntimeError("Variáveis SUPABASE_URL ou SUPABASE_KEY não encontradas.")
+
+        blocklist_response = supabase.table(BLOCKLIST_TABLE).select("usuario").execute()
+        blocklist = frozenset(
+            str(row['usuario']).lower() for row in blocklist_response.data if row.get('usuario')
+        )
+
+        version_response = supabase.table(VERSION_TABLE).select("versao") \
+            .order('id', desc=True).limit(1).execute()
+        versao = version_response.data[0]['versao'] if version_response.data else None
+        return blocklist, versao
+
+    def refresh(self) -> bool:
+        """ Recarrega blocklist e versão. Retorna True em caso de sucesso. """
+        try:
+            blocklist, versao = self.fetch_status()
+        except Exception as e:
+            print(f"Erro ao atualizar status da aplicação: {e}")
+            with self._lock:
+                self._status = {**self._status, 'erro': str(e)}
+            return False
+
+        # Troca o dicionário inteiro: leitores nunca veem um estado parcial
+        with self._lock:
+            self._status = {
+                'blocklist': blocklist,
+                'versao': versao,
+                'atualizado_em': time.monotonic(),
+                'erro': None,
+            }
+        return True
+
+    def request_refresh(self) -> None:
+        """ Pede à thread de segundo plano uma atualização imediata. """
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.refresh_interval)
+            if self._stopped:
+                return
+            # Limpa antes de consultar: um pedido que chegue durante o refresh gera outro
+            self._wakeup.clear()
+            self.refresh()
+
+    def start(self) -> None:
+        """ Carrega o status agora e inicia a thread que o mantém atualizado. """
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self.refresh()
+            self._thread = threading.Thread(target=self._run, name='app-status-refresh', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+
+    # --- Consultas (caminho quente, sem I/O) ---
+
+    def _current(self) -> Dict[str, Any]:
+        if self._thread is None:
+            self.start()
+        return self._status
+
+    def _is_fresh(self, status: Dict[str, Any]) -> bool:
+        atualizado_em = status['atualizado_em']
+        return atualizado_em is not None and time.monotonic() - atualizado_em <= self.max_stale
+
+    def is_blocked(self, usuario: str) -> Tuple[bool, str]:
+        status = self._current()
+        if not self._is_fresh(status):
+            if self.fail_open:
+                return False, "Status indisponível; acesso liberado (fail-open)."
+            return True, "Status indisponível; acesso bloqueado (fail-closed)."
+
+        if usuario.lower() in status['blocklist']:
+            return True, f"Usuário '{usuario}' está na blocklist."
+        return False, "Usuário liberado."
+
+    def version_matches(self) -> Tuple[bool, str]:
+        status = self._current()
+        if not self._is_fresh(status):
+            if self.fail_open:
+                return True, "Status indisponível; versão aceita (fail-open)."
+            return False, "Status indisponível; versão recusada (fail-closed)."
+
+        versao = status['versao']
+        if versao is None or versao == self.local_version:
+            return True, "Versão atualizada."
+        return False, f"Versão local {self.local_version} difere da versão {versao} do banco."
+
+
+app_status = ApplicationStatusService()
+
+
+@lru_cache(maxsize=1)
+def get_current_user() -> str:
+    """
+    Usuário do sistema operacional que está rodando o CRM (não muda durante o processo).
+
+    O bloqueio é por instalação: o CRM roda na máquina de cada usuário (modo
+    desktop / run.py), então o dono do processo é quem usa o app. O app não
+    tem login, e num servidor compartilhado todos os navegadores seriam o
+    mesmo usuário (o da conta do serviço): lá a blocklist bloqueia ou libera
+    o servidor inteiro, não uma pessoa.
+    """
+    try:
+        return getpass.getuser()
+    except Exception:
+        return ''
+
+
+def verify_blocklist() -> Tuple[bool, str]:
+    """ Retorna (True, motivo) se o usuário desta instalação (ver get_current_user) estiver na blocklist. """
+    status = current_app.extensions.get('app_status', app_status)
+    return status.is_blocked(get_current_user())
 
 
-def teste():
-    pass
+def verify_application_version() -> Tuple[bool, str]:
+    """ Retorna (True, motivo) se a versão local for a mesma cadastrada no banco. """
+    status = current_app.extensions.get('app_status', app_status)
+    return status.version_matches()
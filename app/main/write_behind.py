@@ -0,0 +1,255 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .local_replica import local_replica
+from .read_cache import read_cache
+from .services import supabase_service
+
+# Tabelas cujas etapas podem ser gravadas em modo write-behind
+STAGE_TABLES = ('clientes', 'clientes_posvenda')
+
+# Entradas do cache de leitura que mostram a etapa de cada tabela
+STAGE_CACHE_KEYS: Dict[str, Tuple[str, ...]] = {
+    'clientes': ('board:leads', 'negocios:'),
+    'clientes_posvenda': ('board:posvenda', 'negocios:'),
+}
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stage_journal (
+    tabela    TEXT    NOT NULL,
+    lead_id   INTEGER NOT NULL,
+    etapa     TEXT    NOT NULL,
+    seq       INTEGER NOT NULL,
+    criado_em REAL    NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tabela, lead_id)
+)
+"""
+
+
+class StageWriteBehindQueue:
+    """
+    Fila write-behind para mudanças de etapa (drag-and-drop do Kanban).
+
+    Cada movimentação é gravada num journal SQLite local (durável) e a rota
+    responde imediatamente. Movimentações do mesmo lead são coalescidas
+    (a última vence) e, depois de `window` segundos sem novas mudanças, uma
+    thread de segundo plano envia tudo ao Supabase em lotes: um UPDATE por
+    (tabela, etapa) com todos os IDs daquela etapa.
+
+    Um lead só sai do journal quando o UPDATE o devolve, e só então a mudança
+    entra no histórico e nos rollups, com a etapa anterior lida do banco.
+    Leads que o banco não atualizou (ID inexistente, RLS) ficam para a
+    próxima passada e são descartados (com log) depois de `max_attempts`
+    passadas, sem registro no histórico.
+
+    Ao reiniciar, o que ficou no journal é reenviado na primeira passada.
+    """
+
+    def __init__(self, window: float = 2.0, flush_interval: float = 1.0, max_attempts: int = 5):
+        self.enabled = False
+        self.window = window
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.journal_path: Optional[str] = None
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._last_seq = 0
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config.get('STAGE_WRITE_BEHIND', False)
+        self.window = app.config.get('STAGE_WRITE_BEHIND_WINDOW', self.window)
+        self.flush_interval = app.config.get('STAGE_WRITE_BEHIND_FLUSH_INTERVAL', self.flush_interval)
+        self.max_attempts = app.config.get('STAGE_WRITE_BEHIND_MAX_ATTEMPTS', self.max_attempts)
+        self.journal_path = app.config.get('STAGE_JOURNAL_PATH') or \
+            os.path.join(app.instance_path, 'stage_journal.sqlite3')
+        app.extensions['stage_write_behind'] = self
+
+        if self.enabled:
+            self.open()
+            self.start()
+
+    # --- Journal ---
+
+    def open(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+        conn = sqlite3.connect(self.journal_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")  # confirmado = gravado em disco
+        conn.execute(JOURNAL_SCHEMA)
+        colunas = {row[1] for row in conn.execute("PRAGMA table_info(stage_journal)")}
+        if 'tentativas' not in colunas:
+            # Journal criado por uma versão anterior
+            conn.execute("ALTER TABLE stage_journal ADD COLUMN tentativas INTEGER NOT NULL DEFAULT 0")
+        self._conn = conn
+
+    def _next_seq(self) -> int:
+        # Monotônico mesmo se o relógio repetir o mesmo valor
+        self._last_seq = max(self._last_seq + 1, time.time_ns())
+        return self._last_seq
+
+    def enqueue(self, tabela: str, lead_id: int, etapa: str) -> None:
+        """ Registra a nova etapa no journal (sobrescreve uma pendente do mesmo lead). """
+        if tabela not in STAGE_TABLES:
+            raise ValueError(f"Tabela não suportada no write-behind: {tabela}")
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO stage_journal (tabela, lead_id, etapa, seq, criado_em) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(tabela, lead_id) DO UPDATE SET "
+                "etapa = excluded.etapa, seq = excluded.seq, criado_em = excluded.criado_em, tentativas = 0",
+                (tabela, int(lead_id), etapa, self._next_seq(), time.time()),
+            )
+
+    def discard(self, tabela: str, lead_id: int) -> None:
+        """
+        Descarta uma etapa pendente. Usado quando outra rota grava a etapa
+        diretamente (edição, transição para Pós-Venda), para que o flush
+        não sobrescreva o valor mais novo.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM stage_journal WHERE tabela = ? AND lead_id = ?",
+                (tabela, int(lead_id)),
+            )
+
+    def pending_stages(self, tabela: str) -> Dict[int, str]:
+        """ Etapas ainda não enviadas, para sobrepor às leituras do Kanban. """
+        if not self.enabled:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT lead_id, etapa FROM stage_journal WHERE tabela = ?", (tabela,)
+            ).fetchall()
+        return {lead_id: etapa for lead_id, etapa in rows}
+
+    # --- Flush ---
+
+    def _due_rows(self, force: bool) -> List[Tuple[str, int, str, int]]:
+        limite = time.time() if force else time.time() - self.window
+        with self._lock:
+            return self._conn.execute(
+                "SELECT tabela, lead_id, etapa, seq FROM stage_journal WHERE criado_em <= ?",
+                (limite,),
+            ).fetchall()
+
+    def flush(self, force: bool = False) -> int:
+        """
+        Envia ao Supabase as etapas pendentes. Retorna quantos leads foram gravados.
+        Linhas que falharem permanecem no journal para a próxima passada.
+        """
+        if self._conn is None:
+            return 0
+
+        with self._flush_lock:
+            rows = self._due_rows(force)
+            if not rows:
+                return 0
+
+            # No modo desktop o UPDATE passa pela réplica local, que aplica o
+            # resultado no SQLite (ou guarda na outbox, sem conexão): o Kanban lê
+            # de lá e voltaria à etapa antiga até a próxima sincronização
+            supabase = local_replica.client() if local_replica.ready else supabase_service.client()
+            if supabase is None:
+                print("Write-behind: Supabase não configurado; etapas mantidas no journal.")
+                return 0
+
+            # Agrupa por (tabela, etapa): um único UPDATE ... WHERE id IN (...) por grupo
+            grupos: Dict[Tuple[str, str], List[Tuple[int, int]]] = defaultdict(list)
+            for tabela, lead_id, etapa, seq in rows:
+                grupos[(tabela, etapa)].append((lead_id, seq))
+
+            # Importado aqui: operations importa este módulo
+            from .operations import record_stage_change
+
+            gravados = 0
+            for (tabela, etapa), itens in grupos.items():
+                ids = [lead_id for lead_id, _ in itens]
+                try:
+                    # Etapas atuais, para o histórico (o Kanban não é a fonte da etapa anterior)
+                    antes = supabase.table(tabela).select('id, etapa').in_('id', ids).execute()
+                    etapas_antes = {row['id']: row.get('etapa') for row in antes.data or []}
+                    response = supabase.table(tabela).update({'etapa': etapa}).in_('id', ids).execute()
+                except Exception as e:
+                    print(f"Write-behind: erro ao gravar etapa '{etapa}' em {tabela}: {e}")
+                    continue
+
+                atualizados = {row['id'] for row in response.data or []}
+                confirmados = [(lead_id, seq) for lead_id, seq in itens if lead_id in atualizados]
+                recusados = [(lead_id, seq) for lead_id, seq in itens if lead_id not in atualizados]
+                # Só remove se nenhuma mudança mais nova chegou durante o envio
+                with self._lock:
+                    self._conn.executemany(
+                        "DELETE FROM stage_journal WHERE tabela = ? AND lead_id = ? AND seq = ?",
+                        [(tabela, lead_id, seq) for lead_id, seq in confirmados],
+                    )
+                if recusados:
+                    self._reject(tabela, recusados)
+                if confirmados:
+                    # O Kanban não pode voltar a mostrar a etapa antiga quando a sobreposição sumir
+                    for prefixo in STAGE_CACHE_KEYS[tabela]:
+                        read_cache.expire(prefixo)
+                for lead_id, _ in confirmados:
+                    etapa_antes = etapas_antes.get(lead_id)
+                    if etapa_antes != etapa:
+                        record_stage_change(tabela, lead_id, etapa_antes, etapa)
+                gravados += len(confirmados)
+            return gravados
+
+    def _reject(self, tabela: str, itens: List[Tuple[int, int]]) -> None:
+        """ Conta uma passada sem efeito para leads que o UPDATE não devolveu; desiste após `max_attempts`. """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE stage_journal SET tentativas = tentativas + 1 WHERE tabela = ? AND lead_id = ? AND seq = ?",
+                [(tabela, lead_id, seq) for lead_id, seq in itens],
+            )
+            descartados = self._conn.execute(
+                "SELECT lead_id, etapa FROM stage_journal WHERE tabela = ? AND tentativas >= ?",
+                (tabela, self.max_attempts),
+            ).fetchall()
+            self._conn.execute(
+                "DELETE FROM stage_journal WHERE tabela = ? AND tentativas >= ?", (tabela, self.max_attempts)
+            )
+        ids = ', '.join(str(lead_id) for lead_id, _ in itens)
+        print(f"Write-behind: nenhuma linha atualizada em {tabela} para os leads {ids} (verifique o ID e RLS).")
+        if descartados:
+            movimentos = ', '.join(f"{lead_id} -> '{etapa}'" for lead_id, etapa in descartados)
+            print(f"Write-behind: mudanças de etapa em {tabela} descartadas após {self.max_attempts} "
+                  f"tentativas, sem registro no histórico: {movimentos}.")
+
+    def _run(self) -> None:
+        # Primeira passada: reenvia o que sobrou de uma execução anterior
+        self.flush(force=True)
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='stage-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """ Para a thread e envia tudo o que estiver pendente. """
+        self._stopped = True
+        self._wakeup.set()
+        self.flush(force=True)
+
+
+stage_queue = StageWriteBehindQueue()
@@ -0,0 +1,27 @@
+// Decodifica o payload compacto do Kanban (formato v2, gerado por
+// app/main/board_payload.py) de volta para a lista de leads usada pelos quadros:
+// [{id, nome_empresa, nome_contato, created_at, etapa, responsavel: {id, nome} | null, areas: [nome]}]
+// Listas simples (formato v1, ?formato=1) são devolvidas como estão.
+function decodeBoardPayload(payload) {
+    if (!payload || Array.isArray(payload)) return payload || [];
+    if (payload.v !== 2) {
+        console.error('Formato de payload do Kanban desconhecido:', payload.v);
+        return [];
+    }
+
+    const cols = payload.colunas;
+    const leads = new Array(payload.n);
+    for (let i = 0; i < payload.n; i++) {
+        const resp = cols.responsavel[i];
+        leads[i] = {
+            id: cols.id[i],
+            nome_empresa: cols.nome_empresa[i],
+            nome_contato: cols.nome_contato[i],
+            created_at: cols.created_at[i],
+            etapa: payload.etapas[cols.etapa[i]],
+            responsavel: resp >= 0 ? payload.responsaveis[resp] : null,
+            areas: cols.areas[i].map(idx => payload.areas[idx]),
+        };
+    }
+    return leads;
+}
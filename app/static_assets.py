@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from typing import Dict, Optional
+
+import click
+from flask import request, send_from_directory
+
+from .compression import COMPRESSIBLE_MIMETYPES, brotli, supported_encodings
+
+# Pasta (dentro de static/) com as cópias versionadas e pré-comprimidas
+DIST_DIR: str = 'dist'
+MANIFEST_NAME: str = 'manifest.json'
+
+# Um ano: os nomes mudam a cada alteração de conteúdo
+IMMUTABLE_MAX_AGE: int = 31536000
+
+ENCODING_SUFFIX = {'br': '.br', 'gzip': '.gz'}
+
+
+def build_static_assets(static_folder: str) -> Dict[str, str]:
+    """
+    Gera static/dist/ com uma cópia de cada arquivo estático cujo nome inclui
+    o hash do conteúdo (ex.: css/base.3f2a9c1d7b40.css), mais as variantes
+    .gz e .br dos tipos comprimíveis, e grava o manifest {original: versionado}.
+    """
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist_folder, ignore_errors=True)
+
+    manifest: Dict[str, str] = {}
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root).startswith(os.path.abspath(dist_folder)):
+            continue
+        for name in files:
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                content = f.read()
+
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            base, ext = os.path.splitext(relative)
+            hashed = f"{DIST_DIR}/{base}.{digest}{ext}"
+            target = os.path.join(static_folder, *hashed.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+
+            mimetype = mimetypes.guess_type(relative)[0]
+            if mimetype in COMPRESSIBLE_MIMETYPES:
+                with open(target + '.gz', 'wb') as f:
+                    f.write(gzip.compress(content, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(target + '.br', 'wb') as f:
+                        f.write(brotli.compress(content, quality=11))
+
+            manifest[relative] = hashed
+
+    with open(os.path.join(dist_folder, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class StaticAssets:
+    """
+    Serve os estáticos versionados gerados por `flask build-static`.
+
+    - `url_for('static', filename='css/base.css')` passa a apontar para o nome
+      com hash (quando o arquivo está no manifest);
+    - os arquivos versionados saem com Cache-Control de longa duração e, se o
+      navegador aceitar, direto da variante .br/.gz gerada no build.
+
+    Sem manifest (ambiente de desenvolvimento) tudo funciona como o static padrão.
+    """
+
+    def __init__(self):
+        self.manifest: Dict[str, str] = {}
+        self.static_folder: Optional[str] = None
+        self._default_view = None
+
+    def init_app(self, app) -> None:
+        self.static_folder = app.static_folder
+        self.load_manifest()
+        app.extensions['static_assets'] = self
+
+        app.url_defaults(self.fingerprint_url)
+        self._default_view = app.view_functions.get('static')
+        app.view_functions['static'] = self.send_static
+
+        @app.cli.command('build-static')
+        def build_static_command():
+            """Gera os estáticos versionados e pré-comprimidos em static/dist/."""
+            manifest = build_static_assets(self.static_folder)
+            self.manifest = manifest
+            click.echo(f"{len(manifest)} arquivos estáticos versionados em {DIST_DIR}/.")
+
+    def load_manifest(self) -> None:
+        path = os.path.join(self.static_folder, DIST_DIR, MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def fingerprint_url(self, endpoint: str, values: dict) -> None:
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = self.manifest[values['filename']]
+
+    def send_static(self, filename: str):
+        if not filename.startswith(DIST_DIR + '/'):
+            return self._default_view(filename=filename)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        if mimetype in COMPRESSIBLE_MIMETYPES:
+            # Primeira variante pré-comprimida aceita pelo navegador que exista no disco
+            full_path = os.path.join(self.static_folder, *filename.split('/'))
+            for candidate in supported_encodings():
+                if request.accept_encodings[candidate] > 0 and \
+                        os.path.exists(full_path + ENCODING_SUFFIX[candidate]):
+                    encoding = candidate
+                    break
+
+        path = filename + ENCODING_SUFFIX[encoding] if encoding else filename
+        response = send_from_directory(self.static_folder, path, mimetype=mimetype,
+                                       max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+static_assets = StaticAssets()
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import click
+from flask import g, jsonify
+from flask.signals import before_render_template, template_rendered
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+
+
+def precompile_templates(jinja_env) -> int:
+    """
+    Compila todos os templates do app (e dos blueprints). Com o cache de
+    bytecode ligado, o resultado fica em disco para os próximos workers.
+    """
+    total = 0
+    for name in jinja_env.list_templates():
+        try:
+            jinja_env.get_template(name)
+            total += 1
+        except TemplateSyntaxError as e:
+            print(f"Erro ao compilar o template {name}: {e}")
+    return total
+
+
+class Templating:
+    """
+    Custo dos templates Jinja.
+
+    - cache de bytecode em disco (instance/jinja_cache): um worker novo
+      carrega o código já compilado em vez de compilar os templates de novo
+      (o cache é invalidado pelo checksum do arquivo-fonte);
+    - pré-compilação: `flask precompile-templates` no deploy, ou
+      TEMPLATE_PRECOMPILE=1 para compilar tudo na subida do app, inclusive
+      os layouts usados pelo `{% extends base_template_name %}`, que só são
+      carregados na primeira renderização;
+    - tempo de renderização por template (sinais before_render_template /
+      template_rendered) no cabeçalho Server-Timing, ao lado do tempo total
+      da requisição, e acumulado em /api/templates/stats (rota do blueprint
+      principal, com a mesma verificação de status das demais; 404 sem o
+      profiling). As páginas em streaming entram só nas estatísticas (o
+      cabeçalho já saiu).
+    """
+
+    def __init__(self):
+        self.cache_dir: Optional[str] = None
+        self.profiling = True
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        if app.config.get('TEMPLATE_BYTECODE_CACHE', True):
+            self.cache_dir = app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+            os.makedirs(self.cache_dir, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(self.cache_dir)
+        self.profiling = app.config.get('TEMPLATE_PROFILING', self.profiling)
+        app.extensions['templating'] = self
+
+        if app.config.get('TEMPLATE_PRECOMPILE', False):
+            inicio = time.perf_counter()
+            total = precompile_templates(app.jinja_env)
+            print(f"{total} templates pré-compilados em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+        if self.profiling:
+            before_render_template.connect(self._before_render, app)
+            template_rendered.connect(self._rendered, app)
+            app.before_request(self._start_request)
+            app.after_request(self._server_timing)
+
+        @app.cli.command('precompile-templates')
+        def precompile_command():
+            """Compila todos os templates e grava o bytecode no cache em disco."""
+            total = precompile_templates(app.jinja_env)
+            click.echo(f"{total} templates compilados" + (f" em {self.cache_dir}." if self.cache_dir else "."))
+
+    # --- Medição ---
+
+    def record(self, name: str, ms: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, {'renderizacoes': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['renderizacoes'] += 1
+            stats['total_ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+
+    def _start_request(self) -> None:
+        g.request_started = time.perf_counter()
+
+    def _before_render(self, sender, template, context, **extra) -> None:
+        g.setdefault('template_starts', []).append(time.perf_counter())
+
+    def _rendered(self, sender, template, context, **extra) -> None:
+        starts: List[float] = g.get('template_starts') or []
+        if not starts:
+            return
+        ms = (time.perf_counter() - starts.pop()) * 1000
+        name = template.name or '<string>'
+        self.record(name, ms)
+        g.setdefault('template_timings', []).append((name, ms))
+
+    def timed_stream(self, name: str, chunks: Iterable[Any]) -> Iterator[Any]:
+        """ Repassa os pedaços de um template em streaming e registra o tempo total ao terminar. """
+        if not self.profiling:
+            yield from chunks
+            return
+        inicio = time.perf_counter()
+        yield from chunks
+        self.record(name, (time.perf_counter() - inicio) * 1000)
+
+    def _server_timing(self, response):
+        metricas = [
+            f'tpl{i};desc="{name}";dur={ms:.1f}'
+            for i, (name, ms) in enumerate(g.get('template_timings') or [])
+        ]
+        started = g.get('request_started')
+        if started is not None:
+            metricas.append(f'total;dur={(time.perf_counter() - started) * 1000:.1f}')
+        if metricas:
+            response.headers.add('Server-Timing', ', '.join(metricas))
+        return response
+
+    # --- Estatísticas ---
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            linhas = [
+                {'template': name, 'renderizacoes': int(s['renderizacoes']),
+                 'media_ms': round(s['total_ms'] / s['renderizacoes'], 2),
+                 'max_ms': round(s['max_ms'], 2), 'total_ms': round(s['total_ms'], 2)}
+                for name, s in self._stats.items()
+            ]
+        return sorted(linhas, key=lambda linha: linha['total_ms'], reverse=True)
+
+    def stats_response(self):
+        return jsonify({'success': True, 'templates': self.stats(), 'cache_dir': self.cache_dir})
+
+
+templating = Templating()
@@ -0,0 +1,179 @@
+"""
+Benchmark das análises do funil (app/main/analytics.py) com 1M eventos de histórico.
+
+Gera um histórico sintético (leads passando pelas etapas do Kanban até o
+Pós-Venda) e mede:
+
+- a carga: as páginas de JSON do PostgREST (servidas da memória) viram
+  DataFrames por load_stage_events / load_leads, como no relatório;
+- as métricas vetorizadas — permanência por etapa, funil de conversão e
+  ciclo por responsável — contra um cálculo linha a linha em Python puro da
+  permanência, para referência.
+
+A ida e volta de cada página ao Supabase não é medida; ela é estimada a
+partir da latência informada (ms por página, padrão 50), já que as páginas
+são lidas em sequência.
+
+Uso:
+    python benchmarks/bench_analytics.py [quantidade_de_eventos] [repeticoes] [latencia_ms]
+"""
+import os
+import statistics
+import sys
+import timeit
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.main.analytics import (
+    HISTORY_PAGE_SIZE, conversion_funnel, cycle_time_by_owner, load_leads, load_stage_events, stage_dwell,
+)
+from app.main.queries import ARCHIVED_STAGE
+
+ETAPAS = ['aguardando retorno', 'em atendimento', 'reunião', 'em proposta', 'finalizado']
+EVENTOS_POR_LEAD = 10
+FUNCIONARIOS = 6
+
+
+def make_history(n: int, seed: int = 42):
+    """ n eventos de mudança de etapa para n / EVENTOS_POR_LEAD leads. """
+    rng = np.random.default_rng(seed)
+    total_leads = max(1, n // EVENTOS_POR_LEAD)
+    inicio = np.datetime64('2024-01-01T00:00:00', 'ns')
+
+    created_at = inicio + rng.integers(0, 365 * 24 * 60, total_leads).astype('timedelta64[m]')
+    leads = pd.DataFrame({
+        'id': np.arange(total_leads),
+        'created_at': created_at.astype('datetime64[ns]'),
+        'responsavel': rng.integers(1, FUNCIONARIOS + 1, total_leads),
+        'etapa': np.array(ETAPAS)[rng.integers(0, len(ETAPAS), total_leads)],
+    })
+
+    registro_id = np.sort(rng.integers(0, total_leads, n))
+    # Posição do evento dentro do lead e tempo acumulado desde o created_at
+    primeiro = np.r_[True, registro_id[1:] != registro_id[:-1]]
+    inicio_grupo = np.maximum.accumulate(np.where(primeiro, np.arange(n), 0))
+    posicao = np.arange(n) - inicio_grupo
+    intervalos = rng.exponential(48 * 3600, n).astype('int64')
+    acumulado = np.cumsum(intervalos)
+    acumulado -= (acumulado - intervalos)[inicio_grupo]
+    data_acao = created_at[registro_id].astype('datetime64[ns]') + acumulado.astype('timedelta64[s]')
+
+    sequencia = np.array(ETAPAS + [ARCHIVED_STAGE], dtype=object)
+    etapa = posicao % len(ETAPAS)
+    events = pd.DataFrame({
+        'registro_id': registro_id,
+        'data_acao': data_acao,
+        'etapa_antes': sequencia[etapa],
+        'etapa_depois': sequencia[etapa + 1],
+    })
+    return leads, events
+
+
+class PagedTable:
+    """ Consulta do postgrest servida de uma lista de linhas já em JSON (só .range() importa aqui). """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self._faixa = (0, len(rows))
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def gte(self, *args):
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def range(self, inicio, fim):
+        self._faixa = (inicio, fim + 1)
+        return self
+
+    def execute(self):
+        return type('Response', (), {'data': self.rows[self._faixa[0]:self._faixa[1]]})
+
+
+class PagedClient:
+    """ Cliente com as tabelas do relatório; cada .table() devolve uma consulta nova. """
+
+    def __init__(self, **tabelas):
+        self.tabelas = tabelas
+
+    def table(self, nome):
+        return PagedTable(self.tabelas[nome])
+
+
+def as_json_rows(leads: pd.DataFrame, events: pd.DataFrame):
+    """ As linhas como o PostgREST devolve: dicts com timestamps ISO em texto. """
+    def iso(values):
+        return pd.Series(values).dt.strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+    lead_rows = leads.assign(created_at=iso(leads['created_at'])).to_dict('records')
+    event_rows = events.assign(data_acao=iso(events['data_acao'])).to_dict('records')
+    return lead_rows, event_rows
+
+
+def load(client: PagedClient):
+    leads = load_leads(client, ['clientes'], None)
+    events = load_stage_events(client, 'historico_acoes', 'lead_id', None)
+    return leads, events
+
+
+def dwell_per_row(leads: pd.DataFrame, events: pd.DataFrame):
+    """ Mesma permanência por etapa, linha a linha (dicts e loops em Python). """
+    created = dict(zip(leads['id'].tolist(), leads['created_at'].tolist()))
+    por_lead = defaultdict(list)
+    for row in events.to_dict('records'):
+        por_lead[row['registro_id']].append(row)
+
+    horas = defaultdict(list)
+    for lead_id, eventos in por_lead.items():
+        eventos.sort(key=lambda e: e['data_acao'])
+        etapa, entrou = eventos[0]['etapa_antes'], created.get(lead_id)
+        for evento in eventos:
+            if entrou is not None:
+                horas[etapa].append((evento['data_acao'] - entrou).total_seconds() / 3600)
+            etapa, entrou = evento['etapa_depois'], evento['data_acao']
+    return {
+        etapa: (statistics.median(valores), statistics.quantiles(valores, n=10)[-1])
+        for etapa, valores in horas.items() if len(valores) > 1
+    }
+
+
+def bench(label: str, fn, repeticoes: int) -> float:
+    melhor = min(timeit.repeat(fn, number=1, repeat=repeticoes))
+    print(f"  {label:<40} {melhor * 1000:9.1f} ms")
+    return melhor
+
+
+def run(n: int = 1_000_000, repeticoes: int = 3, latencia_ms: int = 50) -> None:
+    leads, events = make_history(n)
+    print(f"Histórico: {len(events)} eventos | {len(leads)} leads")
+
+    lead_rows, event_rows = as_json_rows(leads, events)
+    client = PagedClient(clientes=lead_rows, historico_acoes=event_rows)
+    carga = bench('carga (páginas JSON -> DataFrame)', lambda: load(client), repeticoes)
+    # Páginas de uma carga (a última, incompleta, também é uma ida ao banco)
+    paginas = len(lead_rows) // HISTORY_PAGE_SIZE + len(event_rows) // HISTORY_PAGE_SIZE + 2
+    rede = paginas * latencia_ms / 1000
+    print(f"  {'rede estimada (' + str(paginas) + ' páginas em sequência)':<40} {rede * 1000:9.1f} ms")
+    leads, events = load(client)
+
+    vetorizado = bench('permanência por etapa (vetorizado)', lambda: stage_dwell(events, leads, ETAPAS), repeticoes)
+    bench('funil de conversão (vetorizado)', lambda: conversion_funnel(leads, events, ETAPAS), repeticoes)
+    bench('ciclo por responsável (vetorizado)', lambda: cycle_time_by_owner(leads, events), repeticoes)
+    linha_a_linha = bench('permanência por etapa (linha a linha)', lambda: dwell_per_row(leads, events), 1)
+    print(f"Ganho na permanência: {linha_a_linha / vetorizado:.1f}x")
+    print(f"Carga + rede: {(carga + rede) / vetorizado:.0f}x o tempo da permanência vetorizada")
+
+    print()
+    print(stage_dwell(events, leads, ETAPAS).round(1).to_string())
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:4]]
+    run(*args)
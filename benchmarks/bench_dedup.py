@@ -0,0 +1,118 @@
+"""
+Benchmark da detecção de duplicados (app/main/dedup.py) com 100k registros.
+
+Gera leads / clientes sintéticos em que ~10% são cópias de outro registro
+digitadas de outro jeito (acentos, caixa, pontuação, sufixo "Ltda",
+telefone com +55 e máscara) e mede:
+
+- a montagem do índice de chaves de bloqueio;
+- a verificação de um lead novo (a mesma feita em /api/leads/create);
+- o agrupamento de todos os duplicados (union-find), com precisão e revocação;
+- a comparação ingênua par a par, medida numa amostra e extrapolada (O(n²)).
+
+Uso:
+    python benchmarks/bench_dedup.py [quantidade_de_registros] [amostra_par_a_par]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.main.dedup import DedupIndex, blocking_keys
+
+PALAVRAS = ['Ação', 'Comércio', 'Soluções', 'Tecnologia', 'Logística', 'Café', 'Construções',
+            'Energia', 'Saúde', 'Educação', 'Serviços', 'Alimentos', 'Indústria', 'Transportes']
+SUFIXOS = ['', ' Ltda', ' LTDA.', ' ME', ' S/A', ' EIRELI']
+
+
+def make_records(n: int, taxa_duplicados: float = 0.1, seed: int = 42):
+    """ Devolve [(tabela, registro)] e o id do original de cada registro (verdade de referência). """
+    random.seed(seed)
+    originais = int(n * (1 - taxa_duplicados))
+    records, origem = [], {}
+    for i in range(originais):
+        nome = f"{random.choice(PALAVRAS)} {random.choice(PALAVRAS)} {i}"
+        telefone = f"{random.randint(11, 99)}9{i:08d}"
+        record = {
+            'id': i,
+            'nome_empresa': nome + random.choice(SUFIXOS),
+            'email': f"contato{i}@empresa{i}.com.br",
+            'telefone': f"({telefone[:2]}) {telefone[2:7]}-{telefone[7:]}",
+        }
+        records.append((random.choice(('clientes', 'clientes_posvenda')), record))
+        origem[i] = i
+
+    for j in range(originais, n):
+        _, base = records[random.randrange(originais)]
+        copia = {'id': j, 'nome_empresa': None, 'email': None, 'telefone': None}
+        # Cada cópia repete ao menos um campo, escrito de outro jeito
+        campos = random.sample(['nome_empresa', 'email', 'telefone'], random.randint(1, 3))
+        if 'nome_empresa' in campos:
+            nome = base['nome_empresa'].split(' Ltda')[0].split(' LTDA')[0]
+            copia['nome_empresa'] = random.choice([nome.upper(), nome.lower(), nome.replace('ç', 'c').replace('ã', 'a')]) \
+                + random.choice(SUFIXOS)
+        if 'email' in campos:
+            copia['email'] = ' ' + base['email'].upper()
+        if 'telefone' in campos:
+            copia['telefone'] = '+55 ' + ''.join(ch for ch in base['telefone'] if ch.isdigit())
+        records.append((random.choice(('clientes', 'clientes_posvenda')), copia))
+        origem[j] = base['id']
+    return records, origem
+
+
+def naive_pairs(records) -> int:
+    """ Compara todos os pares com as mesmas chaves normalizadas (sem índice). """
+    keys = [set(blocking_keys(record)) for _, record in records]
+    pares = 0
+    for i in range(len(keys)):
+        for j in range(i + 1, len(keys)):
+            if keys[i] & keys[j]:
+                pares += 1
+    return pares
+
+
+def run(n: int = 100_000, amostra: int = 2_000) -> None:
+    records, origem = make_records(n)
+    print(f"Registros: {len(records)} ({sum(1 for i, o in origem.items() if i != o)} cópias)")
+
+    index = DedupIndex()
+    inicio = time.perf_counter()
+    index.build(records)
+    print(f"  montagem do índice                   {(time.perf_counter() - inicio) * 1000:9.1f} ms")
+
+    probes = [record for _, record in random.sample(records, 10_000)]
+    inicio = time.perf_counter()
+    for record in probes:
+        index.find_matches(record)
+    por_consulta = (time.perf_counter() - inicio) / len(probes)
+    print(f"  verificação de um lead novo          {por_consulta * 1e6:9.1f} µs")
+
+    inicio = time.perf_counter()
+    grupos = index.clusters()
+    print(f"  agrupamento (union-find)             {(time.perf_counter() - inicio) * 1000:9.1f} ms")
+
+    # Precisão / revocação sobre os pares (registro, original)
+    grupo_de = {}
+    for numero, grupo in enumerate(grupos):
+        for membro in grupo:
+            grupo_de[membro['id']] = numero
+    esperados = [(i, o) for i, o in origem.items() if i != o]
+    encontrados = sum(1 for i, o in esperados if i in grupo_de and grupo_de.get(o) == grupo_de[i])
+    membros = sum(len(grupo) for grupo in grupos)
+    corretos = sum(1 for grupo in grupos if len({origem[m['id']] for m in grupo}) == 1)
+    print(f"  grupos: {len(grupos)} | registros em grupos: {membros}")
+    print(f"  revocação: {encontrados / len(esperados):.1%} | grupos puros: {corretos / max(len(grupos), 1):.1%}")
+
+    inicio = time.perf_counter()
+    naive_pairs(records[:amostra])
+    tempo_amostra = time.perf_counter() - inicio
+    estimado = tempo_amostra * (n / amostra) ** 2
+    print(f"  par a par ({amostra} registros)        {tempo_amostra * 1000:9.1f} ms "
+          f"-> ~{estimado:.0f} s estimados para {n}")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
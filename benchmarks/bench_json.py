@@ -0,0 +1,77 @@
+"""
+Microbenchmark de serialização JSON do payload do Kanban (10k leads).
+
+Compara o provider padrão do Flask com o FastJSONProvider (orjson) nos dois
+caminhos usados pelo CRM: `jsonify` (app.json.response) e o filtro `tojson`
+dos templates.
+
+Uso:
+    python benchmarks/bench_json.py [quantidade_de_leads] [repeticoes]
+"""
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask, render_template_string
+from flask.json.provider import DefaultJSONProvider
+
+from app.json_provider import FastJSONProvider, orjson
+
+ETAPAS = ['aguardando retorno', 'em atendimento', 'reunião', 'em proposta', 'finalizado']
+AREAS = ['TI', 'Marketing', 'Vendas', 'Financeiro', 'RH']
+FUNCIONARIOS = [{'id': i, 'nome': nome} for i, nome in enumerate(
+    ['Arthur Paiva', 'Bruno Henrique', 'Felipe Tanko', 'Murilo Costa', 'Rafael', 'Thiago'], start=1)]
+
+
+def make_leads(n: int):
+    random.seed(42)
+    inicio = datetime(2024, 1, 1)
+    return [
+        {
+            'id': i,
+            'nome_empresa': f"Empresa Ação & Cia {i} <Ltda>",
+            'nome_contato': f"Contato Número {i}",
+            'etapa': random.choice(ETAPAS),
+            'responsavel': random.choice(FUNCIONARIOS),
+            'created_at': (inicio + timedelta(minutes=i)).isoformat() + '+00:00',
+            'areas': random.sample(AREAS, random.randint(0, 3)),
+        }
+        for i in range(n)
+    ]
+
+
+def bench(label: str, fn, repeticoes: int) -> float:
+    melhor = min(timeit.repeat(fn, number=1, repeat=repeticoes))
+    print(f"  {label:<38} {melhor * 1000:8.2f} ms")
+    return melhor
+
+
+def run(n: int = 10_000, repeticoes: int = 7) -> None:
+    leads = make_leads(n)
+    template = "const initialLeads = {{ leads | tojson }};"
+
+    print(f"Payload: {n} leads | orjson {'disponível' if orjson else 'NÃO instalado (fallback json)'}")
+    resultados = {}
+    for nome, provider_class in (('padrão (json)', DefaultJSONProvider), ('FastJSONProvider', FastJSONProvider)):
+        app = Flask(__name__)
+        app.json = provider_class(app)
+        with app.test_request_context():
+            saida = render_template_string(template, leads=leads)
+            print(f"{nome} — {len(saida.encode('utf-8')) / 1024:.0f} KiB no template")
+            resultados[nome] = (
+                bench('app.json.dumps', lambda: app.json.dumps(leads), repeticoes),
+                bench('jsonify (app.json.response)', lambda: app.json.response(leads), repeticoes),
+                bench('template | tojson', lambda: render_template_string(template, leads=leads), repeticoes),
+            )
+
+    base, rapido = resultados['padrão (json)'], resultados['FastJSONProvider']
+    print("Ganho (padrão / Fast): " + ", ".join(f"{b / r:.1f}x" for b, r in zip(base, rapido)))
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
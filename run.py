@@ -1,7 +1,6 @@
 # run.py
 
 import os
-# import webview
 from app import create_app
 from dotenv import load_dotenv
 
@@ -10,11 +9,18 @@ print(dotenv_path)
 if os.path.exists(dotenv_path):
     load_dotenv(dotenv_path)
 
+# Modo desktop (pywebview): CRM_DESKTOP=1 abre a janela e lê da réplica local em SQLite
+desktop = os.getenv('CRM_DESKTOP') == '1'
+if desktop:
+    os.environ.setdefault('LOCAL_REPLICA_ENABLED', '1')
+
 config_name = os.getenv('FLASK_CONFIG') or 'default'
 app = create_app(config_name)
 
 if __name__ == '__main__':
-    # webview.create_window("CRM - ByteVision", app, width=1200, height=800, resizable=True)
-    # webview.start()
-    app.run(debug=True)
-    
\ No newline at end of file
+    if desktop:
+        import webview
+        webview.create_window("CRM - ByteVision", app, width=1200, height=800, resizable=True)
+        webview.start()
+    else:
+        app.run(debug=True)
@@ -0,0 +1,39 @@
+-- Tabelas frias para leads arquivados ('Venda Concluída - ARQUIVADO').
+-- O job app/main/archive.py move os leads e suas áreas para cá em lotes,
+-- mantendo o mesmo id, para que o histórico (historico_acoes.lead_id)
+-- continue apontando para o registro certo.
+
+CREATE TABLE IF NOT EXISTS clientes_arquivados (
+    id            bigint PRIMARY KEY,
+    nome_empresa  text,
+    nome_contato  text,
+    email         text,
+    telefone      text,
+    responsavel   bigint REFERENCES funcionarios (id),
+    etapa         text,
+    created_at    timestamptz,
+    arquivado_em  timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS clientes_areas_arquivadas (
+    cliente_id  bigint NOT NULL REFERENCES clientes_arquivados (id) ON DELETE CASCADE,
+    area_id     bigint NOT NULL REFERENCES areas (id),
+    PRIMARY KEY (cliente_id, area_id)
+);
+
+-- O job apaga o lead só se ele ainda estiver arquivado; as áreas saem junto.
+ALTER TABLE clientes_areas DROP CONSTRAINT IF EXISTS clientes_areas_cliente_id_fkey;
+ALTER TABLE clientes_areas ADD CONSTRAINT clientes_areas_cliente_id_fkey
+    FOREIGN KEY (cliente_id) REFERENCES clientes (id) ON DELETE CASCADE;
+
+-- O histórico precisa sobreviver à remoção do lead da tabela quente.
+ALTER TABLE historico_acoes DROP CONSTRAINT IF EXISTS historico_acoes_lead_id_fkey;
+
+-- Enquanto o job não roda, as consultas quentes (etapa <> ARQUIVADO)
+-- usam índices parciais que ignoram os arquivados.
+CREATE INDEX IF NOT EXISTS clientes_ativos_created_at_idx
+    ON clientes (created_at DESC) WHERE etapa <> 'Venda Concluída - ARQUIVADO';
+CREATE INDEX IF NOT EXISTS clientes_ativos_nome_empresa_idx
+    ON clientes (nome_empresa) WHERE etapa <> 'Venda Concluída - ARQUIVADO';
+CREATE INDEX IF NOT EXISTS clientes_arquivados_pendentes_idx
+    ON clientes (id) WHERE etapa = 'Venda Concluída - ARQUIVADO';
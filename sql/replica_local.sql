@@ -0,0 +1,54 @@
+-- Coluna updated_at para a sincronização incremental da réplica local do
+-- modo desktop (app/main/local_replica.py): cada sincronização busca só as
+-- linhas com updated_at maior que a última marca.
+-- Mudanças nas áreas de um cliente tocam o cliente, para que a réplica
+-- busque as áreas dele de novo.
+
+ALTER TABLE clientes ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+ALTER TABLE clientes_posvenda ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS clientes_updated_at_idx ON clientes (updated_at, id);
+CREATE INDEX IF NOT EXISTS clientes_posvenda_updated_at_idx ON clientes_posvenda (updated_at, id);
+
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS clientes_touch_updated_at ON clientes;
+CREATE TRIGGER clientes_touch_updated_at
+    BEFORE UPDATE ON clientes
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+DROP TRIGGER IF EXISTS clientes_posvenda_touch_updated_at ON clientes_posvenda;
+CREATE TRIGGER clientes_posvenda_touch_updated_at
+    BEFORE UPDATE ON clientes_posvenda
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+-- TG_ARGV[0]: tabela do cliente ('clientes' ou 'clientes_posvenda')
+-- TG_ARGV[1]: coluna da junção que aponta para o cliente
+CREATE OR REPLACE FUNCTION touch_cliente_areas() RETURNS trigger AS $$
+DECLARE
+    alvo bigint;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        alvo := (to_jsonb(OLD) ->> TG_ARGV[1])::bigint;
+    ELSE
+        alvo := (to_jsonb(NEW) ->> TG_ARGV[1])::bigint;
+    END IF;
+    EXECUTE format('UPDATE %I SET updated_at = now() WHERE id = $1', TG_ARGV[0]) USING alvo;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS clientes_areas_touch_cliente ON clientes_areas;
+CREATE TRIGGER clientes_areas_touch_cliente
+    AFTER INSERT OR DELETE ON clientes_areas
+    FOR EACH ROW EXECUTE FUNCTION touch_cliente_areas('clientes', 'cliente_id');
+
+DROP TRIGGER IF EXISTS clientes_posvenda_areas_touch_cliente ON clientes_posvenda_areas;
+CREATE TRIGGER clientes_posvenda_areas_touch_cliente
+    AFTER INSERT OR DELETE ON clientes_posvenda_areas
+    FOR EACH ROW EXECUTE FUNCTION touch_cliente_areas('clientes_posvenda', 'cliente_posvenda_id');
@@ -0,0 +1,60 @@
+"""
+App completo (create_app) sobre o substituto em memória do Supabase, para os
+testes de rotas. Os arquivos do instance/ vão para um diretório temporário.
+"""
+import pytest
+from flask import Flask
+
+from app.main import services
+from app.main.read_cache import analytics_cache, read_cache
+
+from .fake_supabase import FakeSupabase
+
+
+def tabelas_base():
+    return dict(
+        blocklist=[], versao_aplicacao=[],
+        clientes=[
+            {'id': 1, 'nome_empresa': 'Acme', 'nome_contato': 'Ana', 'email': 'ana@acme.com', 'telefone': None,
+             'responsavel': 10, 'etapa': 'aguardando retorno', 'created_at': '2026-10-01T12:00:00+00:00'},
+            {'id': 2, 'nome_empresa': 'Globex', 'nome_contato': 'Bruno', 'email': None, 'telefone': None,
+             'responsavel': None, 'etapa': 'em atendimento', 'created_at': '2026-10-02T12:00:00+00:00'},
+        ],
+        clientes_posvenda=[], clientes_arquivados=[],
+        clientes_areas=[{'cliente_id': 1, 'area_id': 20}], clientes_posvenda_areas=[],
+        areas=[{'id': 20, 'nome': 'TI'}],
+        funcionarios=[{'id': 10, 'nome': 'Eva'}],
+        historico_acoes=[], historico_posvenda=[],
+    )
+
+
+@pytest.fixture
+def banco():
+    return FakeSupabase(**tabelas_base())
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, banco):
+    monkeypatch.setattr(Flask, 'auto_find_instance_path', lambda self: str(tmp_path / 'instance'))
+    for nome, valor in {'SUPABASE_URL': 'http://supabase.local', 'SUPABASE_KEY': 'chave', 'SECRET_KEY': 'teste',
+                        'AUDIT_ENABLED': '0', 'DEDUP_ENABLED': '0'}.items():
+        monkeypatch.setenv(nome, valor)
+    monkeypatch.setattr(services.supabase_service, 'create_client', lambda *args, **kwargs: banco)
+    monkeypatch.setattr(services.supabase_service, 'client', lambda: banco)
+
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+
+    # As extensões são singletons do módulo: nada de um teste vaza para o próximo
+    services.app_status.stop()
+    services.app_status._thread = None
+    for cache in (read_cache, analytics_cache):
+        cache._entries.clear()
+        cache._failed.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,166 @@
+"""
+Substituto em memória do cliente Supabase para os testes.
+
+Implementa só o que o app usa do builder do postgrest (select, filtros,
+order, range, single, insert/update/upsert/delete) sobre listas de dicts.
+`offline = True` faz toda chamada falhar como uma queda de rede
+(httpx.ConnectError); `rls` lista as tabelas em que UPDATE / DELETE não
+afetam nenhuma linha, como quando uma política de RLS filtra tudo, e
+`erros` associa uma tabela à exceção levantada em qualquer chamada a ela.
+Embeds (`areas(nome)`) são ignorados no select.
+"""
+import copy
+import fnmatch
+import itertools
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+class FakeResponse:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    def __init__(self, backend: 'FakeSupabase', tabela: str):
+        self._backend = backend
+        self._tabela = tabela
+        self._metodo = 'select'
+        self._payload: Any = None
+        self._filtros = []
+        self._ordem = []
+        self._faixa = None
+        self._single = False
+        self._colunas: Optional[List[str]] = None
+
+    def select(self, *colunas, **kwargs):
+        campos = [c.strip() for c in ','.join(colunas).split(',') if c.strip()]
+        if campos and '*' not in campos:
+            self._colunas = [c for c in campos if '(' not in c and ')' not in c]
+        return self
+
+    def insert(self, payload, **kwargs):
+        self._metodo, self._payload = 'insert', payload
+        return self
+
+    def upsert(self, payload, **kwargs):
+        self._metodo, self._payload = 'upsert', payload
+        return self
+
+    def update(self, payload, **kwargs):
+        self._metodo, self._payload = 'update', payload
+        return self
+
+    def delete(self, **kwargs):
+        self._metodo = 'delete'
+        return self
+
+    def _filtro(self, coluna, teste):
+        self._filtros.append(lambda row: teste(row.get(coluna)))
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v == valor)
+
+    def neq(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v != valor)
+
+    def gt(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v > valor)
+
+    def gte(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v >= valor)
+
+    def lt(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v < valor)
+
+    def lte(self, coluna, valor):
+        return self._filtro(coluna, lambda v: v is not None and v <= valor)
+
+    def ilike(self, coluna, padrao):
+        padrao = padrao.replace('%', '*').lower()
+        return self._filtro(coluna, lambda v: v is not None and fnmatch.fnmatch(str(v).lower(), padrao))
+
+    def in_(self, coluna, valores):
+        valores = list(valores)
+        return self._filtro(coluna, lambda v: v in valores)
+
+    def order(self, coluna, desc=False, **kwargs):
+        self._ordem.append((coluna, desc))
+        return self
+
+    def range(self, inicio, fim):
+        self._faixa = (inicio, fim + 1)
+        return self
+
+    def limit(self, n):
+        self._faixa = (0, n)
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def execute(self) -> FakeResponse:
+        backend = self._backend
+        if backend.offline:
+            raise httpx.ConnectError(f"{backend.nome} fora do ar")
+        if self._tabela in backend.erros:
+            raise backend.erros[self._tabela]
+        backend.chamadas.append((self._tabela, self._metodo))
+        rows = backend.tabelas.setdefault(self._tabela, [])
+        alvo = [row for row in rows if all(filtro(row) for filtro in self._filtros)]
+
+        if self._metodo in ('insert', 'upsert'):
+            novos = self._payload if isinstance(self._payload, list) else [self._payload]
+            criados = []
+            for novo in novos:
+                novo = dict(novo)
+                if 'id' not in novo and self._tabela not in backend.sem_id:
+                    novo['id'] = next(backend._ids)
+                rows.append(novo)
+                criados.append(copy.deepcopy(novo))
+            return FakeResponse(criados)
+        if self._metodo in ('update', 'delete'):
+            if self._tabela in backend.rls:
+                return FakeResponse([])
+            for row in alvo:
+                if self._metodo == 'update':
+                    row.update(self._payload)
+                else:
+                    rows.remove(row)
+            return FakeResponse(copy.deepcopy(alvo))
+
+        # Mesma ordem de nulos do Postgres: por último no ASC, primeiro no DESC
+        for coluna, desc in reversed(self._ordem):
+            alvo.sort(key=lambda row: (row.get(coluna) is None, row.get(coluna)) if not desc
+                      else (row.get(coluna) is not None, row.get(coluna)), reverse=desc)
+        if self._faixa:
+            alvo = alvo[self._faixa[0]:self._faixa[1]]
+        alvo = copy.deepcopy(alvo)
+        if self._colunas is not None:
+            alvo = [{coluna: row.get(coluna) for coluna in self._colunas} for row in alvo]
+        if self._single:
+            if len(alvo) != 1:
+                raise RuntimeError("JSON object requested, multiple (or no) rows returned")
+            return FakeResponse(alvo[0])
+        return FakeResponse(alvo, count=len(alvo))
+
+
+class FakeSupabase:
+    def __init__(self, nome: str = 'supabase', **tabelas: List[Dict[str, Any]]):
+        self.nome = nome
+        self.tabelas = {tabela: [dict(row) for row in rows] for tabela, rows in tabelas.items()}
+        self.offline = False
+        self.rls: set = set()
+        self.erros: Dict[str, Exception] = {}
+        self.sem_id = {'clientes_areas', 'clientes_posvenda_areas'}
+        self.chamadas: List[tuple] = []
+        self._ids = itertools.count(1000)
+
+    def table(self, tabela: str) -> FakeQuery:
+        return FakeQuery(self, tabela)
+
+    from_ = table
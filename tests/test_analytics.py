@@ -0,0 +1,86 @@
+"""
+Relatórios de /analytics: limite de eventos e cálculo em segundo plano.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import render_template
+
+from app.main import analytics
+from app.main.analytics import build_report, history_cutoff
+from app.main.read_cache import AnalyticsCache
+
+from .fake_supabase import FakeSupabase
+
+
+def test_janela_encolhe_para_caber_no_limite():
+    banco = FakeSupabase(historico_acoes=[
+        {'id': i, 'data_acao': f'2024-01-{i:02d}T12:00:00+00:00'} for i in range(1, 11)
+    ])
+    assert history_cutoff(banco, 'historico_acoes', None, 3) == datetime(2024, 1, 8, 12, tzinfo=timezone.utc)
+    assert history_cutoff(banco, 'historico_acoes', None, 10) == datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    assert history_cutoff(banco, 'historico_acoes', None, 11) is None
+
+
+def test_limite_vale_para_os_dois_historicos(monkeypatch):
+    banco = FakeSupabase(
+        clientes=[], clientes_arquivados=[], clientes_posvenda=[], funcionarios=[],
+        historico_acoes=[{'id': i, 'data_acao': f'2024-01-{i:02d}T12:00:00+00:00'} for i in range(1, 4)],
+        historico_posvenda=[{'id': i, 'data_acao': f'2024-02-{i:02d}T12:00:00+00:00'} for i in range(1, 11)],
+    )
+    lidos = {}
+    carregar = analytics.load_stage_events
+    monkeypatch.setattr(analytics, 'load_stage_events', lambda supabase, historico, coluna, desde: (
+        lidos.__setitem__(historico, desde) or carregar(supabase, historico, coluna, desde)))
+
+    etapas = [{'id': 'novo', 'title': 'Novo'}]
+    relatorio = build_report(banco, 'tudo', etapas, etapas, max_events=5)
+    # historico_acoes cabe no limite, mas historico_posvenda não: vale o corte mais recente
+    corte = datetime(2024, 2, 6, 12, tzinfo=timezone.utc)
+    assert relatorio['limitado_desde'] == corte.isoformat()
+    assert lidos == {'historico_acoes': corte, 'historico_posvenda': corte}
+
+    relatorio = build_report(banco, 'tudo', etapas, etapas, max_events=11)
+    assert relatorio['limitado_desde'] is None and lidos['historico_posvenda'] is None
+
+
+def test_relatorio_e_calculado_fora_da_requisicao():
+    cache = AnalyticsCache(ttl=60, stale_ttl=600, retry_attempts=1)
+    liberado, pronto = threading.Event(), threading.Event()
+
+    def loader():
+        liberado.wait(2)
+        pronto.set()
+        return {'total_leads': 1}
+
+    # Primeiro acesso: nada calculado ainda, a requisição volta na hora
+    assert cache.get_nowait('analytics:90d', loader) == (None, True)
+    liberado.set()
+    assert pronto.wait(2)
+    for _ in range(100):
+        if cache.peek('analytics:90d'):
+            break
+        time.sleep(0.01)
+    assert cache.get_nowait('analytics:90d', loader) == ({'total_leads': 1}, False)
+
+
+def test_falha_em_segundo_plano_fica_registrada():
+    cache = AnalyticsCache(ttl=60, stale_ttl=600, retry_attempts=1)
+
+    def loader():
+        raise RuntimeError('timeout')
+
+    assert cache.get_nowait('analytics:tudo', loader) == (None, True)
+    for _ in range(100):
+        if cache.failed('analytics:tudo'):
+            break
+        time.sleep(0.01)
+    assert cache.failed('analytics:tudo')
+
+
+def test_link_para_analises_nos_dois_layouts(app):
+    for layout in ('layout_topbar.html', 'layout_sidebar.html'):
+        with app.test_request_context('/analytics'):
+            html = render_template(layout)
+        assert 'href="/analytics"' in html and 'Análises do Funil' in html
@@ -0,0 +1,100 @@
+"""
+Verificação de blocklist / versão (app/decorators.py e ApplicationStatusService).
+"""
+import pytest
+from flask import Blueprint, Flask
+
+from app.decorators import application_status_response, verify_application_status
+from app.main import services
+from app.main.services import ApplicationStatusService
+
+from .fake_supabase import FakeSupabase
+
+USUARIO_DO_PROCESSO = services.get_current_user
+
+
+@pytest.fixture
+def banco(monkeypatch):
+    banco = FakeSupabase(blocklist=[], versao_aplicacao=[{'id': 1, 'versao': '1.0.0'}])
+    monkeypatch.setattr(services, 'create_supabase_client', lambda: banco)
+    monkeypatch.setattr(services, 'get_current_user', lambda: 'maria')
+    return banco
+
+
+@pytest.fixture
+def status(banco):
+    status = ApplicationStatusService(refresh_interval=3600)
+    status.local_version = '1.0.0'
+    yield status
+    status.stop()
+
+
+@pytest.fixture
+def client(status):
+    app = Flask(__name__)
+    app.extensions['app_status'] = status
+    bp = Blueprint('main', __name__)
+    bp.before_request(application_status_response)
+    bp.add_url_rule('/', 'index', lambda: 'ok')
+    bp.add_url_rule('/api/dados', 'dados', lambda: {'success': True})
+    bp.add_url_rule('/bloqueado', 'blocklist', lambda: ('bloqueado', 403))
+    bp.add_url_rule('/versao-desatualizada', 'version_mismatch', lambda: ('desatualizada', 426))
+    app.register_blueprint(bp)
+    app.add_url_rule('/fora', 'fora', verify_application_status(lambda: 'ok'))
+    return app.test_client()
+
+
+def test_so_carrega_na_primeira_consulta(status, banco):
+    assert status._thread is None and banco.chamadas == []
+    assert status.is_blocked('maria') == (False, 'Usuário liberado.')
+    assert status._thread is not None and ('blocklist', 'select') in banco.chamadas
+
+
+def test_usuario_bloqueado(client, banco):
+    banco.tabelas['blocklist'].append({'usuario': 'Maria'})
+    resposta = client.get('/')
+    assert resposta.status_code == 302 and resposta.headers['Location'].endswith('/bloqueado')
+    assert client.get('/api/dados').status_code == 403
+    assert client.get('/bloqueado').status_code == 403
+    assert client.get('/fora').status_code == 302
+
+
+def test_versao_desatualizada(client, banco):
+    banco.tabelas['versao_aplicacao'].append({'id': 2, 'versao': '2.0.0'})
+    assert client.get('/').headers['Location'].endswith('/versao-desatualizada')
+    assert client.get('/api/dados').get_json()['success'] is False
+
+
+def test_liberado(client):
+    assert client.get('/').data == b'ok'
+    assert client.get('/fora').data == b'ok'
+
+
+def test_refresh_pedido_durante_refresh_nao_se_perde(status, banco):
+    status.is_blocked('maria')
+    consultas = []
+
+    def fetch():
+        consultas.append(1)
+        if len(consultas) == 1:
+            # Pedido que chega enquanto o refresh está em andamento
+            status.request_refresh()
+        return frozenset(), '1.0.0'
+
+    status.fetch_status = fetch
+    status.request_refresh()
+    status._thread.join(timeout=0.5)
+    assert len(consultas) >= 2
+
+
+def test_bloqueio_e_por_instalacao(client, banco, monkeypatch):
+    # Identidade = dono do processo, não a requisição: qualquer navegador recebe a mesma resposta
+    monkeypatch.setattr(services, 'get_current_user', USUARIO_DO_PROCESSO)
+    monkeypatch.setattr(services.getpass, 'getuser', lambda: 'joao')
+    USUARIO_DO_PROCESSO.cache_clear()
+    banco.tabelas['blocklist'].append({'usuario': 'JOAO'})
+    try:
+        for kwargs in ({'headers': {'Cookie': 'session=outra'}}, {'environ_base': {'REMOTE_USER': 'maria'}}):
+            assert client.get('/', **kwargs).headers['Location'].endswith('/bloqueado')
+    finally:
+        USUARIO_DO_PROCESSO.cache_clear()
@@ -0,0 +1,105 @@
+"""
+Job de arquivamento (app/main/archive.py): só move o que ainda está arquivado,
+e o job 'arquivar_leads' passa pelo mesmo lock da thread.
+"""
+import threading
+
+import pytest
+
+from app.main import bulk_jobs
+from app.main.archive import LeadArchiver, lead_archiver
+from app.main.jobs import JobCancelled
+from app.main.queries import ARCHIVED_STAGE
+
+from .fake_supabase import FakeSupabase
+
+
+def _banco(cls=FakeSupabase):
+    return cls(
+        clientes=[{'id': i, 'nome_empresa': f'Empresa {i}', 'etapa': ARCHIVED_STAGE} for i in (1, 2, 3)],
+        clientes_areas=[{'cliente_id': i, 'area_id': 7} for i in (1, 2, 3)],
+        clientes_arquivados=[],
+        clientes_areas_arquivadas=[],
+    )
+
+
+class DesarquivaNoMeio(FakeSupabase):
+    """ Tira o lead 2 do arquivo depois da cópia fria e antes do DELETE. """
+
+    def table(self, tabela):
+        if tabela == 'clientes' and self.chamadas[-1:] == [('clientes_areas_arquivadas', 'upsert')]:
+            lead = next(row for row in self.tabelas['clientes'] if row['id'] == 2)
+            lead['etapa'] = 'Negociação'
+        return super().table(tabela)
+
+
+def test_lead_desarquivado_no_meio_do_lote_fica_na_tabela_quente():
+    banco = _banco(DesarquivaNoMeio)
+    assert LeadArchiver(batch_size=10).archive_batch(banco) == 2
+
+    assert [row['id'] for row in banco.tabelas['clientes']] == [2]
+    assert [row['id'] for row in banco.tabelas['clientes_arquivados']] == [1, 3]
+    # A junção do lead que ficou não é tocada pelo job
+    assert {'cliente_id': 2, 'area_id': 7} in banco.tabelas['clientes_areas']
+    assert ('clientes_areas', 'delete') not in banco.chamadas
+
+
+def test_delete_sem_efeito_nao_repete_o_lote():
+    banco = _banco()
+    banco.rls.add('clientes')
+    archiver = LeadArchiver(batch_size=3)
+
+    assert archiver.run_once(banco) == 0
+    assert banco.chamadas.count(('clientes', 'delete')) == 1
+    assert len(banco.tabelas['clientes']) == 3 and banco.tabelas['clientes_arquivados'] == []
+
+
+def test_run_once_informa_cada_lote():
+    lotes = []
+    assert LeadArchiver(batch_size=2).run_once(_banco(), on_batch=lotes.append) == 3
+    assert lotes == [2, 1]
+
+
+class Contexto:
+    """ O que o job usa do JobContext. """
+
+    def __init__(self, cancelar_apos: int = None):
+        self.itens = []
+        self.cancelar_apos = cancelar_apos
+
+    def item_done(self, item, sucesso=True, resultado=None):
+        self.itens.append((item, resultado))
+
+    def check_cancelled(self):
+        if self.cancelar_apos is not None and len(self.itens) >= self.cancelar_apos:
+            raise JobCancelled()
+
+
+def test_job_espera_a_passada_da_thread(monkeypatch):
+    banco = _banco()
+    monkeypatch.setattr(bulk_jobs, 'create_supabase_client', lambda: banco)
+    monkeypatch.setattr(lead_archiver, 'batch_size', 2)
+    ctx, resultado = Contexto(), {}
+
+    with lead_archiver._run_lock:  # a thread de arquivamento no meio de uma passada
+        job = threading.Thread(target=lambda: resultado.update(bulk_jobs.archive_leads(ctx)))
+        job.start()
+        job.join(0.2)
+        assert job.is_alive() and banco.chamadas == []
+    job.join(5)
+
+    assert resultado == {'movidos': 3}
+    assert ctx.itens == [('lote 1', {'movidos': 2}), ('lote 2', {'movidos': 1})]
+    assert banco.tabelas['clientes'] == []
+
+
+def test_job_cancelado_entre_lotes(monkeypatch):
+    banco = _banco()
+    monkeypatch.setattr(bulk_jobs, 'create_supabase_client', lambda: banco)
+    monkeypatch.setattr(lead_archiver, 'batch_size', 2)
+
+    with pytest.raises(JobCancelled):
+        bulk_jobs.archive_leads(Contexto(cancelar_apos=1))
+    assert [row['id'] for row in banco.tabelas['clientes']] == [3]
+    # O lock é liberado: a próxima passada move o resto
+    assert lead_archiver.run_once(banco) == 1
@@ -0,0 +1,86 @@
+"""
+Auditoria (app/main/audit.py): campos alterados e política de retentativas.
+"""
+import json
+
+import pytest
+
+from app.main import audit
+from app.main.audit import ACTION_UPDATE, AuditWriter, changed_fields
+
+from .fake_supabase import FakeSupabase
+
+
+def test_changed_fields_normaliza_valores_do_formulario():
+    antes = {'responsavel': 5, 'valor': 100.0, 'telefone': None, 'nome_empresa': 'ACME'}
+    depois = {'responsavel': '5', 'valor': '100', 'telefone': '', 'nome_empresa': 'ACME '}
+    assert changed_fields(antes, depois) == {}
+    assert changed_fields(antes, {'responsavel': '6', 'nome_empresa': 'Acme'}) == \
+        {'responsavel': '6', 'nome_empresa': 'Acme'}
+    assert changed_fields(None, {'etapa': 'Contato'}) == {'etapa': 'Contato'}
+
+
+class RecusaEvento(FakeSupabase):
+    """ Recusa (como um erro de schema) qualquer INSERT que contenha o evento envenenado. """
+
+    def table(self, tabela):
+        query = super().table(tabela)
+        insert = query.insert
+
+        def insert_recusando(payload, **kwargs):
+            linhas = payload if isinstance(payload, list) else [payload]
+            if any(linha['detalhes'] == 'veneno' for linha in linhas):
+                self.erros[tabela] = RuntimeError('column "x" does not exist')
+            else:
+                self.erros.pop(tabela, None)
+            return insert(payload, **kwargs)
+        query.insert = insert_recusando
+        return query
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    banco = RecusaEvento()
+    monkeypatch.setattr(audit, 'create_supabase_client', lambda: banco)
+    writer = AuditWriter(max_attempts=2)
+    writer.dead_letter_path = str(tmp_path / 'dead_letter.jsonl')
+    writer.banco = banco
+    return writer
+
+
+def test_evento_recusado_nao_trava_os_demais(writer):
+    for detalhes in ('a', 'veneno', 'b'):
+        writer.record('clientes', 1, ACTION_UPDATE, detalhes)
+    writer.flush()
+    assert [linha['detalhes'] for linha in writer.banco.tabelas['historico_acoes']] == ['a', 'b']
+
+    # Depois de `max_attempts` recusas o evento vai para o dead-letter e a fila esvazia
+    writer.record('clientes', 1, ACTION_UPDATE, 'c')
+    writer.flush()
+    assert writer._queue.empty()
+    assert [linha['detalhes'] for linha in writer.banco.tabelas['historico_acoes']] == ['a', 'b', 'c']
+    with open(writer.dead_letter_path, encoding='utf-8') as arquivo:
+        mortos = [json.loads(linha) for linha in arquivo]
+    assert [morto['linha']['detalhes'] for morto in mortos] == ['veneno']
+
+
+def test_queda_de_rede_nao_conta_tentativa(writer):
+    writer.banco.offline = True
+    writer.record('clientes', 1, ACTION_UPDATE, 'a')
+    for _ in range(5):
+        writer.flush()
+    assert writer._queue.qsize() == 1
+
+    writer.banco.offline = False
+    writer.flush()
+    assert [linha['detalhes'] for linha in writer.banco.tabelas['historico_acoes']] == ['a']
+
+
+def test_backpressure_sem_banco_vai_para_o_dead_letter(writer):
+    writer._queue.maxsize = 1
+    writer.put_timeout = 0
+    writer.banco.offline = True
+    writer.record('clientes', 1, ACTION_UPDATE, 'na fila')
+    writer.record('clientes', 1, ACTION_UPDATE, 'sem espaco')
+    with open(writer.dead_letter_path, encoding='utf-8') as arquivo:
+        assert [json.loads(linha)['linha']['detalhes'] for linha in arquivo] == ['sem espaco']
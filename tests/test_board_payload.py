@@ -0,0 +1,88 @@
+"""
+Payload compacto do Kanban (app/main/board_payload.py): codificar no formato
+v2 e decodificar como o static/js/board_payload.js devolve a lista original.
+"""
+import json
+import re
+
+from app.main.board_payload import BOARD_PAYLOAD_VERSION, board_payload, encode_board_payload
+from app.main.read_cache import read_cache
+
+
+def decode_board_payload(payload):
+    """ Mesmo algoritmo de decodeBoardPayload (static/js/board_payload.js). """
+    if not payload or isinstance(payload, list):
+        return payload or []
+    colunas = payload['colunas']
+    return [
+        {
+            'id': colunas['id'][i],
+            'nome_empresa': colunas['nome_empresa'][i],
+            'nome_contato': colunas['nome_contato'][i],
+            'created_at': colunas['created_at'][i],
+            'etapa': payload['etapas'][colunas['etapa'][i]],
+            'responsavel': payload['responsaveis'][colunas['responsavel'][i]] if colunas['responsavel'][i] >= 0 else None,
+            'areas': [payload['areas'][idx] for idx in colunas['areas'][i]],
+        }
+        for i in range(payload['n'])
+    ]
+
+
+def lead(id, etapa, responsavel=None, areas=()):
+    return {'id': id, 'nome_empresa': f'Empresa {id}', 'nome_contato': None if id % 2 else f'Contato {id}',
+            'created_at': f'2026-10-{id:02d}T12:00:00+00:00', 'etapa': etapa,
+            'responsavel': responsavel, 'areas': list(areas)}
+
+
+EVA = {'id': 10, 'nome': 'Eva'}
+JOAO = {'id': 11, 'nome': 'João'}
+
+LEADS = [
+    lead(1, 'aguardando retorno', EVA, ['TI', 'RH']),
+    lead(2, 'em atendimento', None, []),
+    lead(3, 'aguardando retorno', JOAO, ['RH']),
+    lead(4, 'em proposta', EVA, ['Manutenção', 'TI']),
+    lead(5, None, None, ['TI']),
+]
+
+
+def test_ida_e_volta_devolve_a_lista_original():
+    payload = encode_board_payload(LEADS)
+    assert decode_board_payload(payload) == LEADS
+    # O payload vai para o HTML como JSON: a volta também vale depois de serializar
+    assert decode_board_payload(json.loads(json.dumps(payload))) == LEADS
+
+
+def test_tabelas_de_consulta_sem_repeticao():
+    payload = encode_board_payload(LEADS)
+    assert payload['v'] == BOARD_PAYLOAD_VERSION and payload['n'] == len(LEADS)
+    assert payload['responsaveis'] == [EVA, JOAO]
+    assert payload['areas'] == ['TI', 'RH', 'Manutenção']
+    assert payload['etapas'] == ['aguardando retorno', 'em atendimento', 'em proposta', None]
+    assert payload['colunas']['responsavel'] == [0, -1, 1, 0, -1]
+
+
+def test_lista_vazia():
+    payload = encode_board_payload([])
+    assert payload['n'] == 0 and decode_board_payload(payload) == []
+
+
+def test_formato_1_mantem_a_lista():
+    assert board_payload(LEADS, '1') is LEADS
+    assert board_payload(LEADS, None) == encode_board_payload(LEADS)
+    assert board_payload(LEADS, '9') == encode_board_payload(LEADS)
+
+
+def payload_embutido(client, caminho):
+    html = client.get(caminho).get_data(as_text=True)
+    return json.loads(re.search(r'decodeBoardPayload\((.*?)\);', html).group(1))
+
+
+def test_quadros_nos_dois_formatos(client):
+    # Leads como o Supabase devolve (com os embeds), direto no cache de leitura do quadro
+    for chave, caminho in (('board:leads', '/leads'), ('board:posvenda', '/posvenda')):
+        read_cache.put(chave, LEADS)
+        assert payload_embutido(client, caminho + '?formato=1') == LEADS
+        novo = payload_embutido(client, caminho)
+        assert novo['v'] == BOARD_PAYLOAD_VERSION
+        assert decode_board_payload(novo) == LEADS
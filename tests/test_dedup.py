@@ -0,0 +1,61 @@
+"""
+Índice de duplicados (app/main/dedup.py): carga sob demanda e alterações
+feitas durante a recarga.
+"""
+import pytest
+
+from app.main import dedup
+from app.main.dedup import DedupIndex
+
+from .fake_supabase import FakeSupabase
+
+
+def _lead(registro_id, empresa, email):
+    return {'id': registro_id, 'nome_empresa': empresa, 'email': email, 'telefone': None}
+
+
+def test_alteracoes_durante_o_build_nao_se_perdem():
+    index = DedupIndex()
+    index.build([('clientes', _lead(1, 'Acme', 'contato@acme.com'))])
+
+    def records():
+        # A leitura já passou por estes registros quando as rotas os alteram
+        yield 'clientes', _lead(1, 'Acme', 'contato@acme.com')
+        yield 'clientes', _lead(2, 'Globex', 'vendas@globex.com')
+        index.add('clientes', _lead(3, 'Initech', 'oi@initech.com'))
+        index.remove('clientes', 2)
+
+    assert index.build(records()) == 2
+    assert [m['id'] for m in index.find_matches(_lead(None, 'Initech', None))] == [3]
+    assert index.find_matches(_lead(None, 'Globex', None)) == []
+    assert [m['id'] for m in index.find_matches(_lead(None, 'Acme', None))] == [1]
+    assert index._pending is None
+
+
+def test_build_com_erro_mantem_o_indice_atual():
+    index = DedupIndex()
+    index.build([('clientes', _lead(1, 'Acme', 'contato@acme.com'))])
+
+    def records():
+        yield 'clientes', _lead(2, 'Globex', 'vendas@globex.com')
+        raise ConnectionError('queda no meio da leitura')
+
+    with pytest.raises(ConnectionError):
+        index.build(records())
+    assert [m['id'] for m in index.find_matches(_lead(None, 'Acme', None))] == [1]
+    assert index._pending is None
+
+
+def test_carga_so_no_primeiro_uso(monkeypatch):
+    banco = FakeSupabase(clientes=[_lead(1, 'Acme', 'contato@acme.com')], clientes_posvenda=[])
+    monkeypatch.setattr(dedup, 'create_supabase_client', lambda: banco)
+    index = DedupIndex(refresh_interval=600)
+    assert index._thread is None and banco.chamadas == []
+
+    index.ensure_loaded()
+    index._thread.join(timeout=2)
+    assert index.loaded and [m['id'] for m in index.find_matches(_lead(None, 'Acme', None))] == [1]
+
+    # Dentro do refresh_interval, novos usos não recarregam
+    index.ensure_loaded()
+    assert banco.chamadas.count(('clientes', 'select')) == 1
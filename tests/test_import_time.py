@@ -0,0 +1,82 @@
+"""
+Orçamento de subida do app (python -X importtime), num processo novo e com
+SUPABASE_URL / SUPABASE_KEY definidos, como em produção.
+
+Falha se a importação de `app` ou o create_app() passarem do limite, ou se
+algum módulo pesado (supabase, postgrest, httpx, numpy, pandas...) for
+importado na subida — inclusive por threads iniciadas pelo create_app, que
+ganham um instante para rodar antes da verificação.
+"""
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Limites em ms (melhor de REPETICOES rodadas); hoje a subida fica perto de 200 ms
+MAX_IMPORT_MS = int(os.environ.get('MAX_IMPORT_MS', 600))
+MAX_CREATE_MS = int(os.environ.get('MAX_CREATE_MS', 400))
+REPETICOES = 3
+
+MODULOS_PESADOS = ('supabase', 'postgrest', 'supabase_auth', 'gotrue', 'realtime', 'storage3',
+                   'httpx', 'numpy', 'pandas')
+
+FILHO = f"""
+import json, sys, threading, time
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+app.create_app()
+criado = time.perf_counter()
+time.sleep(0.3)  # deixa as threads da subida fazerem o que fariam
+pesados = sorted({{nome.split('.')[0] for nome in sys.modules}} & set({MODULOS_PESADOS!r}))
+print(json.dumps({{'import_ms': (importado - inicio) * 1000, 'create_ms': (criado - importado) * 1000,
+                  'pesados': pesados, 'threads': sorted(t.name for t in threading.enumerate())}}))
+"""
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """ Linhas 'import time: self | cumulative | nome' -> [(nome com indentação, self_us, cumulative_us)] """
+    linhas = []
+    for linha in stderr.splitlines():
+        if not linha.startswith('import time:') or 'self [us]' in linha:
+            continue
+        self_us, cumulativo, nome = linha[len('import time:'):].split('|', 2)
+        linhas.append((nome.rstrip()[1:], int(self_us), int(cumulativo)))
+    return linhas
+
+
+def measure() -> Dict:
+    env = dict(os.environ, SUPABASE_URL='http://127.0.0.1:9', SUPABASE_KEY='chave-de-teste',
+               PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', FILHO], cwd=RAIZ, env=env,
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+
+    # O app e as threads de segundo plano também escrevem no stdout
+    resultado = json.loads(next(l for l in reversed(proc.stdout.splitlines()) if l.startswith('{"import_ms"')))
+    linhas = parse_importtime(proc.stderr)
+    # Módulo de primeiro nível (sem indentação): o `app` acumula toda a importação do pacote
+    resultado['importtime_ms'] = next(c for nome, _, c in linhas if nome == 'app') / 1000
+    resultado['mais_lentos'] = sorted(
+        ((nome.strip(), s / 1000) for nome, s, _ in linhas), key=lambda item: item[1], reverse=True)[:8]
+    return resultado
+
+
+def test_subida_dentro_do_orcamento():
+    rodadas = [measure() for _ in range(REPETICOES)]
+    melhor = min(rodadas, key=lambda r: r['importtime_ms'] + r['create_ms'])
+    lentos = ', '.join(f"{nome} {ms:.0f} ms" for nome, ms in melhor['mais_lentos'])
+
+    assert melhor['importtime_ms'] <= MAX_IMPORT_MS, f"importação: {melhor['importtime_ms']:.0f} ms ({lentos})"
+    assert melhor['create_ms'] <= MAX_CREATE_MS, f"create_app(): {melhor['create_ms']:.0f} ms ({lentos})"
+
+
+def test_subida_nao_carrega_clientes_nem_dados():
+    resultado = measure()
+    assert resultado['pesados'] == []
+    # Índice de duplicados e status só carregam no primeiro uso
+    assert 'dedup-index' not in resultado['threads']
+    assert 'app-status-refresh' not in resultado['threads']
@@ -0,0 +1,46 @@
+"""
+Tabela de jobs (app/main/jobs.py): jobs órfãos e transação dos itens.
+"""
+import sqlite3
+import time
+
+import pytest
+
+from app.main.jobs import JOB_FAILED, JOB_RUNNING, JobStore, process_owner
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def test_recolhe_so_jobs_de_donos_mortos(store):
+    eu = process_owner()
+    vivo = process_owner().rsplit(':', 2)[0] + ':1:outro'  # pid 1 existe nesta máquina
+    store.create('meu', 'exportar', {}, eu)
+    store.create('outro_worker', 'exportar', {}, vivo)
+    store.create('morto', 'exportar', {}, 'host-antigo:4242:abc')
+    store.execute("UPDATE jobs SET status = ?", (JOB_RUNNING,))
+    store.execute("UPDATE jobs SET heartbeat = ? WHERE id = 'morto'", (time.time() - 3600,))
+
+    assert store.reclaim_orphans(eu, stale_after=60) == 1
+    assert store.get('meu')['status'] == JOB_RUNNING
+    assert store.get('outro_worker')['status'] == JOB_RUNNING
+    assert store.get('morto')['status'] == JOB_FAILED
+
+    # Mesmo host e pid, token diferente: processo anterior (ex.: contêiner reiniciado)
+    anterior = eu.rsplit(':', 1)[0] + ':antigo'
+    store.create('anterior', 'exportar', {}, anterior)
+    assert store.reclaim_orphans(eu, stale_after=60) == 1
+    assert store.get('anterior')['status'] == JOB_FAILED
+
+
+def test_add_item_desfaz_a_transacao_com_erro(store):
+    store.create('job', 'exportar', {}, process_owner())
+    store.add_item('job', 1, 10, True, None)
+    with pytest.raises(sqlite3.IntegrityError):
+        store.add_item('job', 1, 11, True, None)  # seq repetido
+    # A conexão compartilhada continua utilizável
+    store.add_item('job', 2, 12, False, {'error': 'x'})
+    job = store.get('job')
+    assert (job['processados'], job['erros']) == (2, 1)
@@ -0,0 +1,109 @@
+"""
+Provider JSON do app (app/json_provider.py): mesma saída do provider padrão
+do Flask, pelo orjson ou pelo fallback do json da biblioteca padrão.
+"""
+import datetime
+import json
+import re
+from decimal import Decimal
+
+import pytest
+from flask import Flask, jsonify, render_template_string
+from flask.json.provider import DefaultJSONProvider
+from markupsafe import Markup
+
+from app.json_provider import FastJSONProvider
+from app.main.board_payload import board_payload
+from app.main.read_cache import read_cache
+
+AMOSTRAS = [
+    {'etapa': 'Pós-Venda', 'nome': 'Ação & Cia', 'emoji': '🚀', 'del': '\x7f', 'nada': None},
+    {2: 'b', 1: 'a'},                                   # chaves não str
+    {'valor': Decimal('10.50'), 'quando': datetime.datetime(2026, 10, 1, 12, 30)},
+    {'dia': datetime.date(2026, 10, 1), 'html': Markup('<b>x</b>')},
+    {'grande': 2 ** 70},                                # acima de 64 bits: fallback
+    [1, 2.5, True, [], {}],
+]
+
+
+@pytest.fixture
+def mini_app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+
+@pytest.mark.parametrize('obj', AMOSTRAS)
+def test_jsonify_igual_ao_provider_padrao(mini_app, obj):
+    padrao = DefaultJSONProvider(mini_app)
+    with mini_app.app_context():
+        assert jsonify(obj).get_data() == padrao.response(obj).get_data()
+    assert mini_app.json.dumps(obj, indent=2) == padrao.dumps(obj, indent=2)
+    assert mini_app.json.loads(mini_app.json.dumps(obj)) == padrao.loads(padrao.dumps(obj))
+
+
+def test_fallback_so_quando_o_orjson_recusa(mini_app, monkeypatch):
+    from app import json_provider
+    chamadas = []
+    dumps = json_provider.json.dumps
+    monkeypatch.setattr(json_provider.json, 'dumps', lambda obj, **kw: chamadas.append(obj) or dumps(obj, **kw))
+
+    for obj in AMOSTRAS:
+        mini_app.json.dumps(obj)
+    assert chamadas == [{'grande': 2 ** 70}]
+    # Argumentos que o orjson não reproduz também vão para o json padrão
+    assert mini_app.json.dumps({'a': 1}, indent=4) == '{\n    "a": 1\n}'
+    assert len(chamadas) == 2
+
+
+def test_sem_ensure_ascii(mini_app):
+    mini_app.json.ensure_ascii = False
+    assert mini_app.json.dumps({'etapa': 'Pós-Venda', 'del': '\x7f'}) == '{"del":"\x7f","etapa":"Pós-Venda"}'
+
+
+def test_tojson_seguro_para_html(mini_app):
+    valor = {'nome': "</script><script>alert('x')</script> & Cia", 'etapa': 'Pós-Venda'}
+    with mini_app.app_context():
+        saida = render_template_string('{{ valor | tojson }}', valor=valor)
+    for caractere in '<>&\'':
+        assert caractere not in saida
+    assert saida == '{"etapa":"P\\u00f3s-Venda","nome":"\\u003c/script\\u003e\\u003cscript\\u003ealert(' \
+                    '\\u0027x\\u0027)\\u003c/script\\u003e \\u0026 Cia"}'
+
+
+def respostas_com_cada_provider(app, client, requisicao):
+    """ Faz a mesma requisição com o provider do app e com o padrão do Flask. """
+    rapido = client.open(**requisicao).get_data()
+    app.json, original = DefaultJSONProvider(app), app.json
+    try:
+        padrao = client.open(**requisicao).get_data()
+    finally:
+        app.json = original
+    return rapido, padrao
+
+
+@pytest.mark.parametrize('requisicao', [
+    dict(path='/api/update_stage', method='POST', json={'lead_id': 1, 'new_stage': 'em atendimento'}),
+    dict(path='/api/update_stage', method='POST', json={}),
+    dict(path='/api/negocios/series?dimensao=area'),
+    dict(path='/api/posvenda/update_stage', method='POST', json={'lead_id': 99, 'new_stage': 'Pós-Venda'}),
+])
+def test_jsonify_das_rotas_dos_quadros(app, client, banco, requisicao):
+    banco.tabelas['areas'][0]['nome'] = 'Manutenção'
+    rapido, padrao = respostas_com_cada_provider(app, client, requisicao)
+    assert rapido == padrao
+
+
+@pytest.mark.parametrize('caminho, chave', [('/leads', 'board:leads'), ('/posvenda', 'board:posvenda')])
+@pytest.mark.parametrize('formato', ['1', '2'])
+def test_payload_dos_quadros(app, client, banco, caminho, chave, formato):
+    banco.tabelas['clientes'][0]['nome_empresa'] = "Ação & <Cia> d'Ouro"
+    banco.tabelas['clientes_posvenda'].append(dict(banco.tabelas['clientes'][0], id=7, etapa='Pós-Venda'))
+
+    html = client.get(f'{caminho}?formato={formato}').get_data(as_text=True)
+    embutido = re.search(r'decodeBoardPayload\((.*?)\);', html).group(1)
+    assert '<' not in embutido and "'" not in embutido
+
+    leads = read_cache.peek(chave)[0]
+    assert leads
+    assert json.loads(embutido) == json.loads(DefaultJSONProvider(app).dumps(board_payload(leads, formato)))
@@ -0,0 +1,180 @@
+"""
+Réplica local do modo desktop (app/main/local_replica.py) contra um arquivo
+SQLite temporário: tradução das consultas do postgrest (filtros, ordem dos
+nulos, single, in_, embeds), escritas, outbox e as junções de áreas.
+"""
+import sqlite3
+
+import pytest
+
+from app.main.local_replica import LocalReplica, UnsupportedQuery, parse_select
+from app.main.operations import move_lead_to_post_sale
+from app.main.write_behind import StageWriteBehindQueue
+
+from .fake_supabase import FakeSupabase
+
+
+@pytest.fixture
+def remoto():
+    return FakeSupabase(
+        clientes=[
+            {'id': 1, 'nome': 'Ana', 'etapa': 'Contato', 'valor': 300, 'responsavel': 10},
+            {'id': 2, 'nome': 'Bruno', 'etapa': 'Proposta', 'valor': None, 'responsavel': 11},
+            {'id': 3, 'nome': 'Carla', 'etapa': 'Contato', 'valor': 100, 'responsavel': None},
+        ],
+        clientes_posvenda=[{'id': 7, 'nome': 'Davi', 'etapa': 'Onboarding'}],
+        clientes_areas=[{'cliente_id': 1, 'area_id': 20}, {'cliente_id': 1, 'area_id': 21},
+                        {'cliente_id': 2, 'area_id': 21}],
+        clientes_posvenda_areas=[],
+        areas=[{'id': 20, 'nome': 'TI'}, {'id': 21, 'nome': 'RH'}],
+        funcionarios=[{'id': 10, 'nome': 'Eva', 'email': 'eva@x'}, {'id': 11, 'nome': 'Fabio', 'email': 'f@x'}],
+    )
+
+
+@pytest.fixture
+def replica(tmp_path, remoto):
+    replica = LocalReplica()
+    replica.enabled = True
+    replica.path = str(tmp_path / 'replica.sqlite3')
+    replica.open()
+    replica._remote = remoto
+    replica.pull(remoto)
+    assert replica.ready
+    remoto.chamadas.clear()
+    return replica
+
+
+def test_parse_select():
+    assert parse_select('*, responsavel(id, nome), areas(nome)') == \
+        (['*'], {'responsavel': ['id', 'nome'], 'areas': ['nome']})
+    assert parse_select('id,nome') == (['id', 'nome'], {})
+    assert parse_select('areas(nome)') == ([], {'areas': ['nome']})
+    assert parse_select('') == (['*'], {})
+    with pytest.raises(UnsupportedQuery):
+        parse_select('nome:nome_completo')
+
+
+def test_filtros_e_ordem_dos_nulos(replica, remoto):
+    db = replica.client()
+    asc = db.table('clientes').select('id').order('valor').execute().data
+    desc = db.table('clientes').select('id').order('valor', desc=True).execute().data
+    # Postgres: nulos por último no ASC e primeiro no DESC
+    assert [row['id'] for row in asc] == [3, 1, 2]
+    assert [row['id'] for row in desc] == [2, 1, 3]
+
+    contato = db.table('clientes').select('id, nome').eq('etapa', 'Contato').order('id').execute().data
+    assert contato == [{'id': 1, 'nome': 'Ana'}, {'id': 3, 'nome': 'Carla'}]
+    assert [row['id'] for row in db.table('clientes').select('id').in_('id', [3, 2]).execute().data] == [2, 3]
+    assert db.table('clientes').select('id').in_('id', []).execute().data == []
+    assert [row['id'] for row in db.table('clientes').select('id').order('id').range(1, 2).execute().data] == [2, 3]
+    assert remoto.chamadas == []
+
+
+def test_single(replica, remoto):
+    db = replica.client()
+    assert db.table('clientes').select('nome').eq('id', 2).single().execute().data == {'nome': 'Bruno'}
+
+    # Lead criado depois da última sincronização: o Supabase responde
+    remoto.tabelas['clientes'].append({'id': 4, 'nome': 'Gil', 'etapa': 'Contato'})
+    assert db.table('clientes').select('*').eq('id', 4).single().execute().data['nome'] == 'Gil'
+    assert remoto.chamadas == [('clientes', 'select')]
+
+
+def test_embeds(replica):
+    rows = replica.client().table('clientes') \
+        .select('id, responsavel(id, nome), areas(nome)').order('id').execute().data
+    assert rows == [
+        {'id': 1, 'responsavel': {'id': 10, 'nome': 'Eva'}, 'areas': [{'nome': 'TI'}, {'nome': 'RH'}]},
+        {'id': 2, 'responsavel': {'id': 11, 'nome': 'Fabio'}, 'areas': [{'nome': 'RH'}]},
+        {'id': 3, 'responsavel': None, 'areas': []},
+    ]
+
+
+def test_consulta_nao_suportada_vai_ao_supabase(replica, remoto):
+    data = replica.client().table('clientes').select('id').ilike('nome', 'a%').execute().data
+    assert data == [{'id': 1}]
+    assert remoto.chamadas == [('clientes', 'select')]
+
+
+def test_escrita_aplicada_na_replica(replica, remoto):
+    db = replica.client()
+    db.table('clientes').update({'etapa': 'Fechado'}).eq('id', 1).execute()
+    assert next(row for row in remoto.tabelas['clientes'] if row['id'] == 1)['etapa'] == 'Fechado'
+    assert db.table('clientes').select('etapa').eq('id', 1).single().execute().data == {'etapa': 'Fechado'}
+
+
+def test_outbox_sem_conexao(replica, remoto):
+    db = replica.client()
+    remoto.offline = True
+    db.table('clientes').update({'etapa': 'Perdido'}).eq('id', 2).execute()
+    db.table('clientes_areas').insert({'cliente_id': 3, 'area_id': 20}).execute()
+    with pytest.raises(Exception):
+        # Lead novo precisa do id gerado pelo banco
+        db.table('clientes').insert({'nome': 'Hugo'}).execute()
+
+    # Aplicadas localmente e guardadas para envio
+    assert db.table('clientes').select('etapa').eq('id', 2).single().execute().data == {'etapa': 'Perdido'}
+    assert db.table('clientes').select('areas(nome)').eq('id', 3).single().execute().data == \
+        {'areas': [{'nome': 'TI'}]}
+    assert replica.pending_writes() == 2
+
+    remoto.offline = False
+    enviadas, _ = replica.sync()
+    assert enviadas == 2 and replica.pending_writes() == 0
+    assert next(row for row in remoto.tabelas['clientes'] if row['id'] == 2)['etapa'] == 'Perdido'
+    assert {'cliente_id': 3, 'area_id': 20} in remoto.tabelas['clientes_areas']
+
+
+def test_outbox_descarta_escrita_recusada(replica, remoto):
+    remoto.offline = True
+    replica.client().table('clientes').delete().eq('id', 3).execute()
+    remoto.offline = False
+    # Recusada pelo banco (não é falha de rede): descartada em vez de bloquear a outbox
+    remoto.erros['clientes'] = RuntimeError('permission denied for table clientes')
+    assert replica.push(remoto) == 0
+    assert replica.pending_writes() == 0
+
+
+def test_write_behind_aplica_etapa_na_replica(replica, remoto, tmp_path, monkeypatch):
+    monkeypatch.setattr('app.main.write_behind.local_replica', replica)
+    fila = StageWriteBehindQueue()
+    fila.journal_path = str(tmp_path / 'journal.sqlite3')
+    fila.open()
+    fila.enqueue('clientes', 3, 'Proposta')
+
+    assert fila.flush(force=True) == 1
+    assert fila.pending_stages('clientes') == {}
+    assert next(row for row in remoto.tabelas['clientes'] if row['id'] == 3)['etapa'] == 'Proposta'
+    assert replica.client().table('clientes').select('etapa').eq('id', 3).single().execute().data == \
+        {'etapa': 'Proposta'}
+
+
+def test_transicao_para_pos_venda_mantem_as_areas(replica, remoto):
+    novo_id = move_lead_to_post_sale(replica.client(), 1)
+
+    assert {(row['cliente_posvenda_id'], row['area_id']) for row in remoto.tabelas['clientes_posvenda_areas']} == \
+        {(novo_id, 20), (novo_id, 21)}
+    # A cópia local recebeu as ligações e resolve o embed sem ir ao Supabase
+    remoto.chamadas.clear()
+    cliente = replica.client().table('clientes_posvenda').select('id, areas(nome)') \
+        .eq('id', novo_id).single().execute().data
+    assert sorted(area['nome'] for area in cliente['areas']) == ['RH', 'TI']
+    assert remoto.chamadas == []
+
+
+def test_copia_com_chave_antiga_e_refeita(tmp_path, remoto):
+    path = str(tmp_path / 'replica.sqlite3')
+    antigo = sqlite3.connect(path)
+    antigo.execute('CREATE TABLE "clientes_posvenda_areas" (cliente_id INTEGER NOT NULL, area_id INTEGER NOT NULL, '
+                   'dados TEXT NOT NULL, PRIMARY KEY (cliente_id, area_id))')
+    antigo.commit()
+    antigo.close()
+
+    replica = LocalReplica()
+    replica.enabled = True
+    replica.path = path
+    replica.open()
+    colunas = {row[1] for row in replica._conn.execute('PRAGMA table_info("clientes_posvenda_areas")')}
+    assert 'cliente_posvenda_id' in colunas and not replica.ready
+    replica.pull(remoto)
+    assert replica.ready
@@ -0,0 +1,171 @@
+"""
+Circuit breaker e cache de leitura (app/main/read_cache.py), com um relógio
+controlado pelo teste.
+"""
+import threading
+
+import pytest
+
+from app.main import read_cache as modulo
+from app.main.read_cache import CircuitBreaker, CircuitOpenError, ReadThroughCache
+
+
+class Relogio:
+    """ Substitui o módulo `time` do read_cache: o tempo só anda quando o teste manda. """
+
+    def __init__(self):
+        self.agora = 1000.0
+
+    def monotonic(self) -> float:
+        return self.agora
+
+    def sleep(self, segundos: float) -> None:
+        self.agora += segundos
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(modulo, 'time', relogio)
+    return relogio
+
+
+def falha():
+    raise RuntimeError('Supabase fora')
+
+
+def aguarda_revalidacoes():
+    for thread in threading.enumerate():
+        if thread.name.startswith('revalidate-'):
+            thread.join(5)
+
+
+# --- CircuitBreaker ---
+
+def test_circuito_abre_apos_falhas_seguidas(relogio):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    for _ in range(2):
+        assert breaker.state == 'fechado'
+        with pytest.raises(RuntimeError):
+            breaker.call(falha)
+    assert breaker.state == 'aberto'
+
+    chamadas = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: chamadas.append(1))
+    assert chamadas == []  # aberto: a chamada nem é tentada
+
+
+def test_sucesso_zera_as_falhas(relogio):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    with pytest.raises(RuntimeError):
+        breaker.call(falha)
+    assert breaker.call(lambda: 'ok') == 'ok'
+    with pytest.raises(RuntimeError):
+        breaker.call(falha)
+    assert breaker.state == 'fechado'
+
+
+def test_meio_aberto_libera_uma_unica_chamada_de_teste(relogio):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    with pytest.raises(RuntimeError):
+        breaker.call(falha)
+    relogio.agora += 30
+    assert breaker.state == 'meio-aberto'
+
+    concorrentes = []
+
+    def sonda():
+        # Outra chamada durante a sonda falha na hora
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: concorrentes.append(1))
+        return 'ok'
+
+    assert breaker.call(sonda) == 'ok'
+    assert concorrentes == []
+    assert breaker.state == 'fechado'
+
+
+def test_sonda_que_falha_reabre_o_circuito(relogio):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            breaker.call(falha)
+    relogio.agora += 30
+    # Uma única falha na sonda basta, mesmo abaixo do limite de falhas
+    with pytest.raises(RuntimeError):
+        breaker.call(falha)
+    assert breaker.state == 'aberto'
+    relogio.agora += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'ok')
+    relogio.agora += 1
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == 'fechado'
+
+
+# --- ReadThroughCache.get ---
+
+@pytest.fixture
+def cache(relogio):
+    return ReadThroughCache(ttl=10, stale_ttl=100, breaker=CircuitBreaker(failure_threshold=5),
+                            retry_attempts=1)
+
+
+def test_dado_fresco_nao_vai_ao_banco(cache, relogio):
+    cargas = []
+    loader = lambda: cargas.append(1) or len(cargas)
+    assert cache.get('k', loader) == (1, False)
+    relogio.agora += 10
+    assert cache.get('k', loader) == (1, False)
+    assert cargas == [1]
+
+
+def test_revalidacao_em_segundo_plano(cache, relogio):
+    cache.get('k', lambda: 'v1')
+    relogio.agora += 11
+    # Dado antigo na hora, sem marcar como stale; a recarga roda por fora
+    assert cache.get('k', lambda: 'v2') == ('v1', False)
+    aguarda_revalidacoes()
+    assert cache.get('k', falha) == ('v2', False)
+
+
+def test_revalidacao_que_falha_marca_stale(cache, relogio):
+    cache.get('k', lambda: 'v1')
+    relogio.agora += 11
+    assert cache.get('k', falha)[0] == 'v1'
+    aguarda_revalidacoes()
+    assert cache.get('k', falha) == ('v1', True)
+    aguarda_revalidacoes()
+
+    # Uma recarga que dá certo tira a marca
+    assert cache.get('k', lambda: 'v2')[0] == 'v1'
+    aguarda_revalidacoes()
+    assert cache.get('k', falha) == ('v2', False)
+
+
+def test_circuito_aberto_marca_stale(cache, relogio):
+    cache.get('k', lambda: 'v1')
+    cache.breaker._opened_at = relogio.agora
+    relogio.agora += 11
+    assert cache.get('k', lambda: 'v2') == ('v1', True)
+    aguarda_revalidacoes()
+
+
+def test_fallback_para_o_ultimo_valor_valido(cache, relogio):
+    cache.get('k', lambda: 'v1')
+    relogio.agora += 101
+    # Velho demais para servir direto: carga síncrona, e se falhar volta o último valor
+    assert cache.get('k', falha) == ('v1', True)
+    assert cache.get('k', lambda: 'v2') == ('v2', False)
+
+
+def test_expire_mantem_o_ultimo_valor_valido(cache, relogio):
+    cache.get('board:leads', lambda: 'v1')
+    cache.expire('board:')
+    assert cache.get('board:leads', falha) == ('v1', True)
+
+
+def test_sem_valor_anterior_o_erro_sobe(cache):
+    with pytest.raises(RuntimeError):
+        cache.get('k', falha)
@@ -0,0 +1,81 @@
+"""
+Roteamento de leituras para réplicas (app/main/replicas.py) com dois
+backends substitutos: uma réplica e o primário.
+"""
+import time
+
+import pytest
+
+from app.main import replicas
+from app.main.read_cache import CircuitBreaker, ReadThroughCache
+from app.main.replicas import ReplicaRouter
+
+from .fake_supabase import FakeSupabase
+
+REPLICA_URL = 'http://replica.local'
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    dados = {'funcionarios': [{'id': 1, 'nome': 'Eva'}], 'clientes': [{'id': 1, 'etapa': 'Contato'}]}
+    replica = FakeSupabase('replica', **dados)
+    primario = FakeSupabase('primario', **dados)
+    monkeypatch.setattr(replicas.supabase_service, 'create_client', lambda url=None, key=None: replica)
+    monkeypatch.setattr(replicas.supabase_service, 'client', lambda: primario)
+    return replica, primario
+
+
+@pytest.fixture
+def router(backends):
+    router = ReplicaRouter(health_interval=3600)
+    router.replica_urls = [REPLICA_URL]
+    router._healthy = {REPLICA_URL: True}
+    router._breakers = {REPLICA_URL: CircuitBreaker(failure_threshold=2)}
+    router._cycle = iter(lambda: REPLICA_URL, None)
+    return router
+
+
+def test_leituras_vao_para_a_replica(router, backends):
+    replica, primario = backends
+    data = router.read_client().table('clientes').select('id, etapa').eq('id', 1).execute().data
+    assert data == [{'id': 1, 'etapa': 'Contato'}]
+    assert replica.chamadas == [('clientes', 'select')] and primario.chamadas == []
+
+
+def test_replica_fora_cai_para_o_primario(router, backends):
+    replica, primario = backends
+    replica.offline = True
+    client = router.read_client()
+    assert client.table('clientes').select('etapa').execute().data == [{'etapa': 'Contato'}]
+    assert primario.chamadas == [('clientes', 'select')]
+
+    # A réplica sai do rodízio até a próxima verificação de saúde
+    assert router.read_client() is None
+    replica.offline = False
+    router.check_health()
+    assert router.read_client() is not None
+
+
+def test_falha_da_replica_nao_abre_o_circuito_do_primario(router, backends):
+    replica, primario = backends
+    cache = ReadThroughCache(ttl=0, stale_ttl=0, retry_attempts=1)
+    replica.erros['clientes'] = RuntimeError('503 Service Unavailable')
+
+    # Mesmo loader das rotas: réplica do rodízio ou, sem nenhuma, o primário
+    def loader():
+        return (router.read_client() or primario).table('clientes').select('id').execute().data
+
+    for chave in range(5):
+        data, stale = cache.get(f'board:{chave}', loader)
+        assert (data, stale) == ([{'id': 1}], False)
+    assert cache.breaker.state == 'fechado'
+    assert router._breakers[REPLICA_URL].state == 'aberto'
+    assert router.read_client() is None
+
+
+def test_stop_interrompe_a_verificacao(router):
+    router.start()
+    inicio = time.monotonic()
+    router.stop()
+    router._thread.join(timeout=2)
+    assert not router._thread.is_alive() and time.monotonic() - inicio < 2
@@ -0,0 +1,51 @@
+"""
+Rollups (app/main/rollups.py): recálculo com vários workers e falhas no SQLite.
+"""
+from collections import Counter
+
+import pytest
+
+from app.main.rollups import METRIC_NEW_LEADS, RollupStore
+
+
+def _store(path) -> RollupStore:
+    store = RollupStore()
+    store.path = str(path)
+    store.open()
+    return store
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / 'rollups.sqlite3'
+
+
+def _total(store: RollupStore) -> int:
+    return sum(store.series(METRIC_NEW_LEADS, 'mes', 'total', periodos=1)['series'].get('', [0]))
+
+
+def test_incremento_de_outro_worker_durante_o_recalculo(path):
+    job, outro_worker = _store(path), _store(path)
+    job.begin_backfill()
+    outro_worker.record(METRIC_NEW_LEADS, 1, [])
+    job.finish_backfill(Counter(), {})
+
+    assert _total(job) == 1
+    assert outro_worker._conn.execute("SELECT COUNT(*) FROM rollup_pendentes").fetchone()[0] == 0
+    # Sem recálculo em andamento, nada vai para os pendentes
+    outro_worker.record(METRIC_NEW_LEADS, 1, [])
+    assert outro_worker._conn.execute("SELECT COUNT(*) FROM rollup_pendentes").fetchone()[0] == 0
+
+
+def test_erro_no_sqlite_nao_propaga_e_desfaz_a_transacao(path):
+    store = _store(path)
+    store.begin_backfill()
+    store._conn.execute(
+        "CREATE TRIGGER falha BEFORE INSERT ON rollup_pendentes BEGIN SELECT RAISE(ABORT, 'disco cheio'); END"
+    )
+    store.record(METRIC_NEW_LEADS, 1, [7])
+    assert _total(store) == 0  # o UPSERT da mesma transação foi desfeito
+
+    store._conn.execute("DROP TRIGGER falha")
+    store.record(METRIC_NEW_LEADS, 1, [7])
+    assert _total(store) == 1
@@ -0,0 +1,156 @@
+"""
+Estáticos versionados (app/static_assets.py) e compressão das respostas
+(app/compression.py), num app mínimo com uma pasta static/ temporária.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+import pytest
+from flask import Flask, Response, request, stream_with_context, url_for
+
+from app.compression import Compress
+from app.static_assets import DIST_DIR, IMMUTABLE_MAX_AGE, MANIFEST_NAME, StaticAssets
+
+CSS = b'body { color: #333; }\n' * 200
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+PAGINA = '<p>Lead</p>' * 500
+PAGINA_GZ = gzip.compress(PAGINA.encode(), mtime=0)
+
+
+@pytest.fixture
+def pasta_static(tmp_path):
+    pasta = tmp_path / 'static'
+    (pasta / 'css').mkdir(parents=True)
+    (pasta / 'images').mkdir()
+    (pasta / 'css' / 'base.css').write_bytes(CSS)
+    (pasta / 'images' / 'logo.png').write_bytes(PNG)
+    return pasta
+
+
+@pytest.fixture
+def mini_app(pasta_static):
+    app = Flask(__name__, static_folder=str(pasta_static))
+    Compress().init_app(app)
+    StaticAssets().init_app(app)
+
+    app.add_url_rule('/pagina', 'pagina', lambda: PAGINA)
+    app.add_url_rule('/curta', 'curta', lambda: 'ok')
+    app.add_url_rule('/ja-comprimida', 'ja_comprimida', lambda: Response(
+        PAGINA_GZ, headers={'Content-Encoding': 'gzip'}, mimetype='text/html'))
+    app.add_url_rule('/parcial', 'parcial', lambda: Response(PAGINA, mimetype='text/plain')
+                     .make_conditional(request, accept_ranges=True, complete_length=len(PAGINA)))
+    app.add_url_rule('/stream', 'stream', lambda: Response(
+        stream_with_context(iter(['<p>Lead</p>'] * 10)), mimetype='text/html'))
+    return app
+
+
+def build(app):
+    saida = app.test_cli_runner().invoke(args=['build-static']).output
+    with open(os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+        return saida, json.load(f)
+
+
+def versionado(nome, conteudo):
+    base, ext = os.path.splitext(nome)
+    return f"{DIST_DIR}/{base}.{hashlib.sha256(conteudo).hexdigest()[:12]}{ext}"
+
+
+# --- build-static ---
+
+def test_build_gera_manifest_e_variantes(mini_app, pasta_static):
+    saida, manifest = build(mini_app)
+    assert saida.strip() == f"2 arquivos estáticos versionados em {DIST_DIR}/."
+    assert manifest == {'css/base.css': versionado('css/base.css', CSS),
+                        'images/logo.png': versionado('images/logo.png', PNG)}
+
+    css = pasta_static / manifest['css/base.css']
+    assert css.read_bytes() == CSS
+    assert gzip.decompress(css.with_name(css.name + '.gz').read_bytes()) == CSS
+    # Imagens não são comprimidas de novo
+    png = pasta_static / manifest['images/logo.png']
+    assert not png.with_name(png.name + '.gz').exists()
+
+
+def test_build_de_novo_nao_versiona_o_dist(mini_app, pasta_static):
+    _, antes = build(mini_app)
+    (pasta_static / 'css' / 'base.css').write_bytes(CSS + b'a { }\n')
+    _, depois = build(mini_app)
+    assert set(depois) == set(antes)
+    assert depois['css/base.css'] != antes['css/base.css']
+    # O arquivo da versão anterior some junto com o dist/ antigo
+    assert not (pasta_static / antes['css/base.css']).exists()
+
+
+# --- url_for('static') ---
+
+def test_url_for_aponta_para_o_versionado(mini_app):
+    _, manifest = build(mini_app)
+    with mini_app.test_request_context():
+        assert url_for('static', filename='css/base.css') == '/static/' + manifest['css/base.css']
+        assert url_for('static', filename='js/fora_do_manifest.js') == '/static/js/fora_do_manifest.js'
+
+
+def test_sem_manifest_funciona_como_o_static_padrao(mini_app):
+    with mini_app.test_request_context():
+        assert url_for('static', filename='css/base.css') == '/static/css/base.css'
+    assert mini_app.test_client().get('/static/css/base.css').data == CSS
+
+
+# --- Cabeçalhos dos estáticos ---
+
+def test_versionado_imutavel_e_pre_comprimido(mini_app):
+    _, manifest = build(mini_app)
+    client = mini_app.test_client()
+    url = '/static/' + manifest['css/base.css']
+
+    resposta = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert resposta.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(resposta.data) == CSS
+    assert resposta.cache_control.immutable and resposta.cache_control.public
+    assert resposta.cache_control.max_age == IMMUTABLE_MAX_AGE
+    assert 'Accept-Encoding' in resposta.vary
+
+    sem_gzip = client.get(url)
+    assert 'Content-Encoding' not in sem_gzip.headers and sem_gzip.data == CSS
+    assert 'Accept-Encoding' in sem_gzip.vary
+
+
+def test_original_revalida_sempre(mini_app):
+    build(mini_app)
+    resposta = mini_app.test_client().get('/static/css/base.css')
+    assert resposta.cache_control.no_cache and not resposta.cache_control.immutable
+
+
+# --- Compressão das respostas ---
+
+def test_comprime_respostas_grandes(mini_app):
+    resposta = mini_app.test_client().get('/pagina', headers={'Accept-Encoding': 'gzip'})
+    assert resposta.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(resposta.data) == PAGINA.encode()
+    assert 'Accept-Encoding' in resposta.vary
+
+
+def test_respeita_q_zero(mini_app):
+    resposta = mini_app.test_client().get('/pagina', headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in resposta.headers and 'Accept-Encoding' in resposta.vary
+
+
+def test_streaming_comprimido_por_pedacos(mini_app):
+    resposta = mini_app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert resposta.headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in resposta.headers
+    assert gzip.decompress(resposta.data) == b'<p>Lead</p>' * 10
+
+
+@pytest.mark.parametrize('caminho, cabecalhos, corpo', [
+    ('/curta', {}, b'ok'),                                              # abaixo de COMPRESS_MIN_SIZE
+    ('/ja-comprimida', {}, PAGINA_GZ),                                  # já tem Content-Encoding
+    ('/parcial', {'Range': 'bytes=0-10'}, PAGINA.encode()[:11]),          # 206 de um Range
+    ('/static/css/base.css', {'Range': 'bytes=0-10'}, CSS[:11]),          # arquivo direto do disco
+])
+def test_casos_que_nao_sao_comprimidos(mini_app, caminho, cabecalhos, corpo):
+    resposta = mini_app.test_client().get(caminho, headers={'Accept-Encoding': 'gzip', **cabecalhos})
+    assert resposta.headers.get('Content-Encoding') == ('gzip' if caminho == '/ja-comprimida' else None)
+    assert resposta.data == corpo
+    assert 'Accept-Encoding' in resposta.vary
@@ -0,0 +1,97 @@
+"""
+Páginas enviadas em streaming (stream_page): /clientes e /historico. As listas
+chegam ao template como geradores, então o estado vazio vem do for/else.
+"""
+import pytest
+
+from app.main import routes
+from app.main.read_cache import read_cache
+
+
+@pytest.fixture(autouse=True)
+def paginas_pequenas(monkeypatch):
+    # Uma linha por página do Supabase e sem esperas entre as tentativas
+    monkeypatch.setattr(routes, 'STREAM_PAGE_SIZE', 1)
+    monkeypatch.setattr(read_cache, 'retry_attempts', 1)
+
+
+def pedacos(client, banco, caminho):
+    """ Corpo da resposta pedaço a pedaço, junto com as consultas feitas até cada pedaço. """
+    resposta = client.get(caminho, buffered=False)
+    assert resposta.status_code == 200 and resposta.is_streamed
+    partes = []
+    for pedaco in resposta.response:
+        partes.append((pedaco.decode('utf-8') if isinstance(pedaco, bytes) else pedaco, len(banco.chamadas)))
+    resposta.close()
+    return partes
+
+
+def corpo(client, banco, caminho):
+    return ''.join(parte for parte, _ in pedacos(client, banco, caminho))
+
+
+# --- /clientes ---
+
+def test_lista_de_clientes_em_streaming(client, banco):
+    partes = pedacos(client, banco, '/clientes')
+    html = ''.join(parte for parte, _ in partes)
+    assert 'Acme' in html and 'Globex' in html and 'Nenhum cliente encontrado.' not in html
+    # O cabeçalho da página sai antes de as páginas do Supabase serem lidas
+    assert partes[0][1] < partes[-1][1]
+    # Ao terminar, a lista completa vai para o cache de leitura
+    assert [c['nome_empresa'] for c in read_cache.peek(routes.CLIENT_LIST_CACHE_KEY)[0]] == ['Acme', 'Globex']
+
+
+def test_lista_de_clientes_vazia(client, banco):
+    banco.tabelas['clientes'].clear()
+    html = corpo(client, banco, '/clientes')
+    assert 'Nenhum cliente encontrado.' in html
+    assert read_cache.peek(routes.CLIENT_LIST_CACHE_KEY)[0] == []
+
+
+def test_erro_no_meio_do_streaming(client, banco):
+    banco.erros['clientes_posvenda'] = RuntimeError('timeout')
+    html = corpo(client, banco, '/clientes')
+    # As linhas já enviadas ficam; o erro aparece depois da tabela
+    assert html.index('Acme') < html.index('Erro ao carregar dados')
+    assert 'Nenhum cliente encontrado.' not in html
+    assert read_cache.peek(routes.CLIENT_LIST_CACHE_KEY) is None
+
+
+def test_banco_fora_usa_a_ultima_lista(client, banco):
+    corpo(client, banco, '/clientes')
+    read_cache.expire(routes.CLIENT_LIST_CACHE_KEY)
+    banco.offline = True
+    html = corpo(client, banco, '/clientes')
+    assert 'Acme' in html and 'Banco de dados indisponível' in html
+
+
+# --- /historico ---
+
+def test_historico_em_streaming(client, banco):
+    banco.tabelas['historico_acoes'] += [
+        {'id': i, 'lead_id': 1, 'data_acao': f'2026-10-0{i}T10:00:00+00:00', 'tipo_acao': 'UPDATE',
+         'detalhes': f'Evento {i}', 'dados_antes': {'etapa': 'a'}, 'dados_depois': {'etapa': 'b'}}
+        for i in (1, 2, 3)
+    ]
+    html = corpo(client, banco, '/historico/lead/1')
+    assert 'Histórico de Ações: Acme' in html
+    # Mais recente primeiro, numa única timeline
+    assert html.index('Evento 3') < html.index('Evento 2') < html.index('Evento 1')
+    assert html.count('<!-- TIMELINE -->') == 1
+    assert 'Sem Histórico de Auditoria' not in html
+
+
+@pytest.mark.parametrize('caminho', ['/historico/lead/1', '/historico/posvenda/5'])
+def test_historico_vazio(client, banco, caminho):
+    html = corpo(client, banco, caminho)
+    assert 'Sem Histórico de Auditoria' in html and '<!-- TIMELINE -->' not in html
+
+
+def test_historico_com_erro_mostra_estado_vazio(client, banco):
+    banco.erros['historico_acoes'] = RuntimeError('timeout')
+    assert 'Sem Histórico de Auditoria' in corpo(client, banco, '/historico/lead/1')
+
+
+def test_historico_tipo_invalido(client):
+    assert client.get('/historico/outro/1').status_code == 404
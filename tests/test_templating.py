@@ -0,0 +1,54 @@
+"""
+Templates (app/templating.py): cache de bytecode, pré-compilação e Server-Timing.
+"""
+import os
+
+import pytest
+from flask import Flask, render_template
+
+from app.templating import Templating, precompile_templates
+
+
+@pytest.fixture
+def mini_app(tmp_path):
+    pasta = tmp_path / 'templates'
+    pasta.mkdir()
+    (pasta / 'base.html').write_text('<main>{% block corpo %}{% endblock %}</main>')
+    (pasta / 'pagina.html').write_text('{% extends "base.html" %}{% block corpo %}{{ nome }}{% endblock %}')
+    app = Flask(__name__, template_folder=str(pasta))
+    app.config['TEMPLATE_CACHE_DIR'] = str(tmp_path / 'jinja_cache')
+    Templating().init_app(app)
+    app.add_url_rule('/', 'pagina', lambda: render_template('pagina.html', nome='Ana'))
+    return app
+
+
+def test_cache_de_bytecode_em_disco(mini_app, tmp_path):
+    assert mini_app.test_client().get('/').data == b'<main>Ana</main>'
+    # Um arquivo de bytecode por template compilado (a página e o layout)
+    assert len(os.listdir(tmp_path / 'jinja_cache')) == 2
+
+
+def test_precompile_conta_os_templates(mini_app, tmp_path):
+    (tmp_path / 'templates' / 'quebrado.html').write_text('{% if %}')
+    assert precompile_templates(mini_app.jinja_env) == 2
+    saida = mini_app.test_cli_runner().invoke(args=['precompile-templates']).output
+    assert saida.splitlines()[-1].startswith('2 templates compilados')
+
+
+def test_server_timing(mini_app):
+    timing = mini_app.test_client().get('/').headers['Server-Timing']
+    assert 'tpl0;desc="pagina.html";dur=' in timing and 'total;dur=' in timing
+
+
+def test_estatisticas_passam_pela_verificacao_de_status(client, banco, monkeypatch):
+    monkeypatch.setattr('app.decorators.verify_blocklist', lambda: (True, 'bloqueado'))
+    assert client.get('/api/templates/stats').status_code == 403
+
+    monkeypatch.setattr('app.decorators.verify_blocklist', lambda: (False, 'liberado'))
+    resposta = client.get('/api/templates/stats')
+    assert resposta.status_code == 200 and resposta.get_json()['success'] is True
+
+
+def test_estatisticas_sem_profiling(app, client, monkeypatch):
+    monkeypatch.setattr(app.extensions['templating'], 'profiling', False)
+    assert client.get('/api/templates/stats').status_code == 404
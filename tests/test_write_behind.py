@@ -0,0 +1,81 @@
+"""
+Write-behind das mudanças de etapa (app/main/write_behind.py): coalescência,
+journal após reinício e confirmação parcial / descarte no flush.
+"""
+import pytest
+
+from app.main import operations, write_behind
+from app.main.write_behind import StageWriteBehindQueue
+
+from .fake_supabase import FakeSupabase
+
+
+@pytest.fixture
+def banco(monkeypatch):
+    banco = FakeSupabase(clientes=[{'id': 1, 'etapa': 'Contato'}, {'id': 2, 'etapa': 'Contato'}])
+    monkeypatch.setattr(write_behind.supabase_service, 'client', lambda: banco)
+    return banco
+
+
+@pytest.fixture
+def historico(monkeypatch):
+    registros = []
+    monkeypatch.setattr(operations, 'record_stage_change',
+                        lambda tabela, lead_id, antes, depois: registros.append((tabela, lead_id, antes, depois)))
+    return registros
+
+
+def _fila(path, **kwargs) -> StageWriteBehindQueue:
+    fila = StageWriteBehindQueue(**kwargs)
+    fila.enabled = True
+    fila.journal_path = str(path)
+    fila.open()
+    return fila
+
+
+def test_movimentos_do_mesmo_lead_sao_coalescidos(tmp_path, banco, historico):
+    fila = _fila(tmp_path / 'journal.sqlite3')
+    fila.enqueue('clientes', 1, 'Proposta')
+    fila.enqueue('clientes', 1, 'Negociação')
+    assert fila.pending_stages('clientes') == {1: 'Negociação'}
+
+    assert fila.flush(force=True) == 1
+    assert banco.chamadas.count(('clientes', 'update')) == 1
+    assert banco.tabelas['clientes'][0]['etapa'] == 'Negociação'
+    # Histórico só depois da confirmação, com a etapa anterior lida do banco
+    assert historico == [('clientes', 1, 'Contato', 'Negociação')]
+
+
+def test_journal_e_reenviado_depois_de_reiniciar(tmp_path, banco, historico):
+    path = tmp_path / 'journal.sqlite3'
+    _fila(path).enqueue('clientes', 2, 'Proposta')
+
+    # Novo processo, mesmo journal
+    fila = _fila(path)
+    assert fila.pending_stages('clientes') == {2: 'Proposta'}
+    assert fila.flush(force=True) == 1
+    assert banco.tabelas['clientes'][1]['etapa'] == 'Proposta'
+    assert fila.pending_stages('clientes') == {}
+
+
+def test_confirmacao_parcial_e_descarte(tmp_path, banco, historico):
+    fila = _fila(tmp_path / 'journal.sqlite3', max_attempts=2)
+    fila.enqueue('clientes', 1, 'Proposta')
+    fila.enqueue('clientes', 99, 'Proposta')  # não existe: o UPDATE não o devolve
+
+    assert fila.flush(force=True) == 1
+    assert fila.pending_stages('clientes') == {99: 'Proposta'}
+    assert historico == [('clientes', 1, 'Contato', 'Proposta')]
+
+    assert fila.flush(force=True) == 0
+    assert fila.pending_stages('clientes') == {}
+    # O movimento descartado não entra no histórico
+    assert historico == [('clientes', 1, 'Contato', 'Proposta')]
+
+
+def test_falha_de_rede_mantem_no_journal_sem_historico(tmp_path, banco, historico):
+    fila = _fila(tmp_path / 'journal.sqlite3')
+    fila.enqueue('clientes', 1, 'Proposta')
+    banco.offline = True
+    assert fila.flush(force=True) == 0
+    assert fila.pending_stages('clientes') == {1: 'Proposta'} and historico == []